@@ -0,0 +1,192 @@
+import asyncio
+import contextlib
+import datetime
+from pathlib import Path
+
+import interactions as ipy
+import orjson
+import typing_extensions as typing
+
+from common.sketches import CountMinSketch, HyperLogLog
+
+__all__ = ("DailyUsage", "UsageAnalytics", "usage_key")
+
+# keys past this only get use counts, not their own distinct user counts, so
+# a day's sketches never grow past a fixed size
+MAX_TRACKED_KEYS = 100
+
+
+def today() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+
+def usage_key(ctx: ipy.BaseContext) -> str | None:
+    """Works out what a command or component use should be counted under."""
+    if isinstance(ctx, ipy.ComponentContext):
+        prefix, _, rest = ctx.custom_id.partition("|")
+        # every role button shares a prefix, but each role is counted apart
+        if prefix == "rolebutton":
+            return f"role:{rest}"
+        return f"component:{prefix}"
+    if isinstance(ctx, ipy.ModalContext):
+        return f"modal:{ctx.custom_id.partition('|')[0]}"
+
+    if command := getattr(ctx, "command", None):
+        name = getattr(command, "qualified_name", None) or command.resolved_name
+        return f"command:{name}"
+    return None
+
+
+class DailyUsage:
+    """
+    One day's usage, kept as sketches instead of per-user rows.
+
+    Each tracked key gets a HyperLogLog of who used it, and every key shares
+    one count-min sketch for how often it was used.
+    """
+
+    __slots__ = ("counts", "day", "keys", "users")
+
+    def __init__(
+        self,
+        day: str,
+        users: HyperLogLog | None = None,
+        keys: dict[str, HyperLogLog] | None = None,
+        counts: CountMinSketch | None = None,
+    ) -> None:
+        self.day = day
+        self.users = users or HyperLogLog(12)
+        self.keys = keys or {}
+        self.counts = counts or CountMinSketch(512, 4)
+
+    def add(self, key: str, user_id: int) -> None:
+        self.users.add(user_id)
+        self.counts.add(key)
+
+        if (key_users := self.keys.get(key)) is None:
+            if len(self.keys) >= MAX_TRACKED_KEYS:
+                return
+            key_users = self.keys[key] = HyperLogLog(10)
+        key_users.add(user_id)
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "day": self.day,
+            "users": self.users.to_dict(),
+            "keys": {key: users.to_dict() for key, users in self.keys.items()},
+            "counts": self.counts.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, typing.Any]) -> "typing.Self":
+        return cls(
+            data["day"],
+            HyperLogLog.from_dict(data["users"]),
+            {key: HyperLogLog.from_dict(users) for key, users in data["keys"].items()},
+            CountMinSketch.from_dict(data["counts"]),
+        )
+
+
+class UsageAnalytics:
+    """
+    Counts uses and distinct users of each command and role button per day.
+
+    Today's sketches are saved every so often and rolled over at midnight
+    UTC, leaving one file per day behind.
+    """
+
+    def __init__(
+        self, bot: ipy.Client, directory: Path, *, save_interval: float = 15 * 60
+    ) -> None:
+        self.bot = bot
+        self.directory = directory
+        self.save_interval = save_interval
+        self.current = DailyUsage(today())
+        self.dirty = False
+        self._task: asyncio.Task | None = None
+
+    def path_for(self, day: str) -> Path:
+        return self.directory / f"{day}.json"
+
+    def record(self, ctx: ipy.BaseContext) -> None:
+        if not (key := usage_key(ctx)):
+            return
+
+        if self.current.day != (day := today()):
+            finished = self._rollover(day)
+            self.bot.create_task(
+                self._write(finished),
+                name=f"save usage {finished.day}",
+                group="analytics",
+            )
+        self.current.add(key, int(ctx.author_id))
+        self.dirty = True
+
+    def _rollover(self, day: str) -> DailyUsage:
+        finished, self.current = self.current, DailyUsage(day)
+        self.dirty = False
+        return finished
+
+    def _write_sync(self, usage: DailyUsage) -> None:
+        self.directory.mkdir(exist_ok=True)
+        self.path_for(usage.day).write_bytes(orjson.dumps(usage.to_dict()))
+
+    async def _write(self, usage: DailyUsage) -> None:
+        await asyncio.to_thread(self._write_sync, usage)
+
+    def _read_sync(self, day: str) -> DailyUsage | None:
+        path = self.path_for(day)
+        if not path.exists():
+            return None
+        return DailyUsage.from_dict(orjson.loads(path.read_bytes()))
+
+    async def load(self) -> None:
+        """Picks today's counts back up, in case of a restart partway through."""
+        if usage := await asyncio.to_thread(self._read_sync, today()):
+            self.current = usage
+
+    async def save(self) -> None:
+        if not self.dirty:
+            return
+        self.dirty = False
+        await self._write(self.current)
+
+    async def get(self, day: str) -> DailyUsage | None:
+        if day == self.current.day:
+            return self.current
+        return await asyncio.to_thread(self._read_sync, day)
+
+    def start(self) -> None:
+        if not self._task or self._task.done():
+            self._task = self.bot.create_task(
+                self._run(), name="usage analytics", group="analytics", daemon=True
+            )
+
+    async def _run(self) -> None:
+        while True:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            midnight = datetime.datetime.combine(
+                now.date() + datetime.timedelta(days=1),
+                datetime.time(),
+                datetime.timezone.utc,
+            )
+            # a quiet night shouldn't leave yesterday unsaved until someone
+            # next uses something
+            await asyncio.sleep(
+                min(self.save_interval, (midnight - now).total_seconds() + 1)
+            )
+
+            try:
+                if self.current.day != (day := today()):
+                    await self._write(self._rollover(day))
+                else:
+                    await self.save()
+            except Exception as e:
+                self.bot.dispatch(ipy.events.Error(source="usage analytics", error=e))
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        await self.save()
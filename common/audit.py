@@ -0,0 +1,277 @@
+import asyncio
+import collections
+import contextlib
+import time
+
+import interactions as ipy
+import typing_extensions as typing
+
+if typing.TYPE_CHECKING:
+    from common.db import Database
+
+__all__ = ("AuditEvent", "AuditJournal")
+
+INSERT_QUERY = (
+    "INSERT INTO audit_log (created_at, action, user_id, guild_id, channel_id,"
+    " message_id, detail) VALUES ($1, $2, $3, $4, $5, $6, $7)"
+)
+# the casts let one prepared statement serve every combination of filters
+SELECT_QUERY = (
+    "SELECT * FROM audit_log"
+    " WHERE (CAST($1 AS BIGINT) IS NULL OR user_id = $1)"
+    " AND (CAST($2 AS BIGINT) IS NULL OR channel_id = $2)"
+    " AND (CAST($3 AS DOUBLE PRECISION) IS NULL OR created_at >= $3)"
+    " AND created_at < $4"
+    " ORDER BY created_at DESC LIMIT $5"
+)
+
+
+class AuditEvent:
+    __slots__ = (
+        "action",
+        "channel_id",
+        "created_at",
+        "detail",
+        "guild_id",
+        "message_id",
+        "user_id",
+    )
+
+    def __init__(
+        self,
+        created_at: float,
+        action: str,
+        user_id: int,
+        guild_id: int | None = None,
+        channel_id: int | None = None,
+        message_id: int | None = None,
+        detail: str | None = None,
+    ) -> None:
+        self.created_at = created_at
+        self.action = action
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.detail = detail
+
+    @classmethod
+    def from_row(cls, row: typing.Any) -> "typing.Self":
+        return cls(
+            row["created_at"],
+            row["action"],
+            row["user_id"],
+            row["guild_id"],
+            row["channel_id"],
+            row["message_id"],
+            row["detail"],
+        )
+
+    def to_row(self) -> tuple:
+        return (
+            self.created_at,
+            self.action,
+            self.user_id,
+            self.guild_id,
+            self.channel_id,
+            self.message_id,
+            self.detail,
+        )
+
+    def matches(
+        self,
+        user_id: int | None,
+        channel_id: int | None,
+        since: float | None,
+        until: float,
+    ) -> bool:
+        return (
+            (user_id is None or self.user_id == user_id)
+            and (channel_id is None or self.channel_id == channel_id)
+            and (since is None or self.created_at >= since)
+            and self.created_at < until
+        )
+
+
+class AuditJournal:
+    """
+    A write-behind journal of actions taken through the bot.
+
+    Recording an event only appends it to a ring buffer of recent events and
+    a queue, so handlers never wait on the database. A background task
+    drains the queue in batches. If the queue fills up (say, the database is
+    slow), recording waits for room instead of dropping events - once the
+    journal is closed there's nothing left to make room, so events recorded
+    after that are only kept in the ring buffer, and counted as dropped.
+    """
+
+    def __init__(
+        self,
+        bot: ipy.Client,
+        *,
+        buffer_size: int = 1000,
+        queue_size: int = 500,
+        batch_size: int = 100,
+        flush_interval: float = 2.0,
+    ) -> None:
+        self.bot = bot
+        self.recent: collections.deque[AuditEvent] = collections.deque(
+            maxlen=buffer_size
+        )
+        self.queue: asyncio.Queue[AuditEvent] = asyncio.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.closed = False
+        self._task: asyncio.Task | None = None
+        self._writing: asyncio.Future | None = None
+        # events taken off the queue for the next batch - kept here so they
+        # can still be written if the task is cancelled while collecting
+        self._collected: list[AuditEvent] = []
+
+    @property
+    def db(self) -> "Database":
+        return self.bot.db
+
+    def start(self) -> None:
+        if not self._task or self._task.done():
+            self._task = self.bot.create_task(
+                self._run(), name="audit journal", group="audit", daemon=True
+            )
+
+    async def record(
+        self,
+        action: str,
+        ctx: ipy.BaseContext,
+        *,
+        channel_id: int | None = None,
+        message_id: int | None = None,
+        detail: str | None = None,
+    ) -> None:
+        event = AuditEvent(
+            time.time(),
+            action,
+            int(ctx.author_id),
+            int(ctx.guild_id) if ctx.guild_id else None,
+            channel_id,
+            message_id,
+            detail,
+        )
+        self.recent.append(event)
+
+        if self.closed:
+            self.dropped += 1
+            return
+
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            await self.queue.put(event)
+
+    async def record_message(
+        self,
+        action: str,
+        ctx: ipy.BaseContext,
+        msg: ipy.Message,
+        *,
+        detail: str | None = None,
+    ) -> None:
+        await self.record(
+            action,
+            ctx,
+            channel_id=int(msg._channel_id),
+            message_id=int(msg.id),
+            detail=detail,
+        )
+
+    async def _next_batch(self) -> list[AuditEvent]:
+        batch = self._collected
+        batch.append(await self.queue.get())
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            # whatever's already queued is taken without waiting
+            while not self.queue.empty() and len(batch) < self.batch_size:
+                batch.append(self.queue.get_nowait())
+            if len(batch) >= self.batch_size:
+                break
+
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        self._collected = []
+        return batch
+
+    async def _write(self, batch: list[AuditEvent]) -> None:
+        await self.db.executemany(INSERT_QUERY, [event.to_row() for event in batch])
+        self.written += len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                # shielded, so cancelling the task at shutdown can't cut a
+                # write off partway
+                self._writing = asyncio.ensure_future(self._write(batch))
+                await asyncio.shield(self._writing)
+            except Exception as e:
+                # the events are still in the ring buffer, but won't be kept
+                self.bot.dispatch(ipy.events.Error(source="audit journal", error=e))
+
+    async def close(self) -> None:
+        """Stops the background task and writes out everything still queued."""
+        self.closed = True
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        if self._writing:
+            with contextlib.suppress(Exception):
+                await self._writing
+
+        batch, self._collected = self._collected, []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if batch:
+            await self._write(batch)
+
+    async def query(
+        self,
+        *,
+        user_id: int | None = None,
+        channel_id: int | None = None,
+        since: float | None = None,
+        until: float | None = None,
+        limit: int = 15,
+    ) -> list[AuditEvent]:
+        """Finds the newest matching events, checking the ring buffer first."""
+        until = until or time.time()
+        found = [
+            event
+            for event in reversed(self.recent)
+            if event.matches(user_id, channel_id, since, until)
+        ][:limit]
+
+        # anything older than the buffer (from before a restart, say) is only
+        # in the database - the bound keeps buffered events, written or not,
+        # from being counted twice
+        if len(found) < limit:
+            before = min(until, self.recent[0].created_at) if self.recent else until
+            if since is None or since < before:
+                rows = await self.db.fetch(
+                    SELECT_QUERY,
+                    user_id,
+                    channel_id,
+                    since,
+                    before,
+                    limit - len(found),
+                )
+                found.extend(AuditEvent.from_row(row) for row in rows)
+
+        return found
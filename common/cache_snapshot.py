@@ -0,0 +1,567 @@
+import asyncio
+import collections
+import contextlib
+import functools
+import logging
+import mmap
+import struct
+import time
+from pathlib import Path
+
+import attrs
+import interactions as ipy
+import orjson
+import typing_extensions as typing
+from interactions.client.smart_cache import GlobalCache
+
+__all__ = ("CacheSnapshot", "SnapshotCache")
+
+logger = logging.getLogger("oscbot")
+
+_MAGIC = b"OSCSNAP1"
+_HEADER = struct.Struct("<8sQ")
+# the big or fast-changing parts of a guild - members and presences come back
+# with chunking anyway, and channels and roles are stored on their own
+_GUILD_SKIP_KEYS = frozenset(
+    {
+        "channels",
+        "threads",
+        "members",
+        "presences",
+        "voice_states",
+        "roles",
+        "stage_instances",
+        "guild_scheduled_events",
+    }
+)
+_THREAD_TYPES = frozenset({10, 11, 12})
+
+
+def _dumps(data: typing.Any) -> bytes:
+    # payloads are raw gateway/rest json, but anything odd is stringified
+    # rather than failing the placement it's captured from
+    return orjson.dumps(data, default=str)
+
+
+class CacheSnapshot:
+    """
+    Saves selected client caches on shutdown and serves them on the next start.
+
+    Raw payloads are captured as they're placed in the cache. On stop, they're
+    written to one file: a small json index of offsets, followed by every
+    payload. On start, only the index is read - the file is memory-mapped and
+    a payload is only decoded when a fetch misses the cache, instead of going
+    to the API.
+
+    The gateway sends every guild on this process's shards in full, with its
+    roles and channels, so those are never captured - once ready, one missing
+    from the cache has been deleted (or left), and goes to the API. What's
+    captured is only what the gateway won't send again: threads, DMs, the
+    bot's own messages, and guilds (with their roles and channels) this
+    process gets no events for, like ones an interactions worker fetched for
+    another worker's shards. So with a single gateway process, the snapshot
+    doesn't make connecting any faster - it saves the fetches that follow.
+
+    Entries older than max_age are ignored, and an entry is dropped for good
+    as soon as the gateway sends fresher data for it. Cold fetches (ones that
+    had to use the API) are counted either way, so they can be compared with
+    the snapshot turned off.
+    """
+
+    def __init__(
+        self,
+        bot: ipy.Client,
+        path: Path,
+        *,
+        enabled: bool = True,
+        max_age: float = 12 * 3600,
+        max_messages: int = 1000,
+        warmup: float = 300,
+    ) -> None:
+        self.bot = bot
+        self.path = path
+        self.enabled = enabled
+        self.max_age = max_age
+        self.max_messages = max_messages
+        self.warmup = warmup
+
+        # captured as [time captured, payload]
+        self._guilds: dict[int, tuple[float, bytes]] = {}
+        self._roles: collections.defaultdict[int, dict[int, tuple[float, bytes]]] = (
+            collections.defaultdict(dict)
+        )
+        self._channels: dict[int, tuple[float, bytes]] = {}
+        self._channel_guilds: dict[int, int] = {}
+        self._messages: collections.OrderedDict[
+            tuple[int, int], tuple[float, bytes]
+        ] = collections.OrderedDict()
+
+        self._map: mmap.mmap | None = None
+        self._base = 0
+        # key -> [offset, length, time captured]
+        self.entries: dict[str, list[typing.Any]] = {}
+        self.user_id: int | None = None
+        # channel and role ids each restored guild came with
+        self._restored_guilds: dict[int, tuple[set[int], set[int]]] = {}
+        self._restoring = False
+
+        self.created = time.perf_counter()
+        self.startup_time: float | None = None
+        self._ready_at: float | None = None
+        self.load_time = 0.0
+        self.loaded = 0
+        self.restored: collections.Counter[str] = collections.Counter()
+        self.cold: collections.Counter[str] = collections.Counter()
+        self.cold_warmup = 0
+        self.stale = 0
+        self.superseded = 0
+
+        self._install()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    # region hooks
+
+    def _install(self) -> None:
+        # the cache is slotted, so its methods can't be swapped out on the
+        # instance - instead it's moved over to a subclass that calls back here
+        cache = self.bot.cache
+        hooked = object.__new__(SnapshotCache)
+        for field in attrs.fields(GlobalCache):
+            setattr(hooked, field.name, getattr(cache, field.name))
+        hooked.snapshot = self
+        self.bot.cache = hooked
+
+        self._place_guild = functools.partial(GlobalCache.place_guild_data, hooked)
+        self._place_role = functools.partial(GlobalCache.place_role_data, hooked)
+        self._place_channel = functools.partial(GlobalCache.place_channel_data, hooked)
+        self._place_message = functools.partial(GlobalCache.place_message_data, hooked)
+        self._delete_guild = functools.partial(GlobalCache.delete_guild, hooked)
+        self._delete_role = functools.partial(GlobalCache.delete_role, hooked)
+        self._delete_channel = functools.partial(GlobalCache.delete_channel, hooked)
+        self._delete_message = functools.partial(GlobalCache.delete_message, hooked)
+        self._fetch_guild = functools.partial(GlobalCache.fetch_guild, hooked)
+        self._fetch_role = functools.partial(GlobalCache.fetch_role, hooked)
+        self._fetch_channel = functools.partial(GlobalCache.fetch_channel, hooked)
+        self._fetch_message = functools.partial(GlobalCache.fetch_message, hooked)
+
+    def _supersede(self, key: str) -> None:
+        if self.entries.pop(key, None) is not None:
+            self.superseded += 1
+
+    def place_guild_data(self, data: dict) -> ipy.Guild:
+        if self._restoring or not self.enabled:
+            return self._place_guild(data)
+
+        guild_id = int(data["id"])
+        self._supersede(f"guild:{guild_id}")
+        # the gateway sends these again on every start, so they're never
+        # restored and aren't worth encoding
+        if self._gateway_sends(guild_id):
+            return self._place_guild(data)
+
+        self._guilds[guild_id] = (
+            time.time(),
+            _dumps({k: v for k, v in data.items() if k not in _GUILD_SKIP_KEYS}),
+        )
+
+        # only a full guild payload says what's been deleted - and placing it
+        # pops its channels and roles out of the data
+        if "channels" not in data or not (
+            restored := self._restored_guilds.pop(guild_id, None)
+        ):
+            return self._place_guild(data)
+
+        channel_ids, role_ids = restored
+        channel_ids -= {int(c["id"]) for c in data["channels"]}
+        role_ids -= {int(r["id"]) for r in data.get("roles", ())}
+        guild = self._place_guild(data)
+        for channel_id in channel_ids:
+            self.bot.cache.delete_channel(channel_id)
+        for role_id in role_ids:
+            self.bot.cache.delete_role(role_id)
+        return guild
+
+    def place_role_data(
+        self, guild_id: ipy.Snowflake_Type, data: list[dict]
+    ) -> dict[ipy.Snowflake, ipy.Role]:
+        if (
+            not self._restoring
+            and self.enabled
+            and not self._gateway_sends(int(guild_id))
+        ):
+            now = time.time()
+            roles = self._roles[int(guild_id)]
+            for role in data:
+                roles[int(role["id"])] = (now, _dumps(role))
+        return self._place_role(guild_id, data)
+
+    def place_channel_data(self, data: dict) -> ipy.BaseChannel:
+        if self._restoring or not self.enabled:
+            return self._place_channel(data)
+
+        channel_id = int(data["id"])
+        self._supersede(f"channel:{channel_id}")
+        if not self._restorable_channel(data):
+            return self._place_channel(data)
+
+        self._channels[channel_id] = (time.time(), _dumps(data))
+        if guild_id := data.get("guild_id"):
+            self._channel_guilds[channel_id] = int(guild_id)
+        return self._place_channel(data)
+
+    def place_message_data(self, data: dict) -> ipy.Message:
+        if self._restoring or not self.enabled:
+            return self._place_message(data)
+
+        key = (int(data["channel_id"]), int(data["id"]))
+        self._supersede(f"message:{key[0]}:{key[1]}")
+
+        author_id = (data.get("author") or {}).get("id")
+        if self.bot.user and author_id and int(author_id) == int(self.bot.user.id):
+            self._messages[key] = (time.time(), _dumps(data))
+            self._messages.move_to_end(key)
+            while len(self._messages) > self.max_messages:
+                self._messages.popitem(last=False)
+        elif data.get("author"):
+            # an update from someone else's message never needs saving
+            self._messages.pop(key, None)
+        return self._place_message(data)
+
+    def delete_guild(self, guild_id: ipy.Snowflake_Type) -> None:
+        self._guilds.pop(int(guild_id), None)
+        self._roles.pop(int(guild_id), None)
+        self._supersede(f"guild:{int(guild_id)}")
+        self._delete_guild(guild_id)
+
+    def delete_role(self, role_id: ipy.Snowflake_Type) -> None:
+        if role := self.bot.cache.get_role(role_id):
+            self._roles.get(int(role._guild_id), {}).pop(int(role_id), None)
+        self._delete_role(role_id)
+
+    def delete_channel(self, channel_id: ipy.Snowflake_Type) -> None:
+        self._channels.pop(int(channel_id), None)
+        self._channel_guilds.pop(int(channel_id), None)
+        self._supersede(f"channel:{int(channel_id)}")
+        self._delete_channel(channel_id)
+
+    def delete_message(
+        self, channel_id: ipy.Snowflake_Type, message_id: ipy.Snowflake_Type
+    ) -> None:
+        self._messages.pop((int(channel_id), int(message_id)), None)
+        self._supersede(f"message:{int(channel_id)}:{int(message_id)}")
+        self._delete_message(channel_id, message_id)
+
+    def _cold(self, kind: str) -> None:
+        self.cold[kind] += 1
+        if self._ready_at is None or time.perf_counter() - self._ready_at < self.warmup:
+            self.cold_warmup += 1
+
+    def _gateway_sends(self, guild_id: int) -> bool:
+        # interactions workers and other workers' guilds get no gateway events
+        return self.bot.sharding.owns(guild_id)
+
+    def _restorable_channel(self, data: dict) -> bool:
+        # archived threads and dms (which have no guild) aren't sent on ready
+        return (
+            data.get("type") in _THREAD_TYPES
+            or not data.get("guild_id")
+            or not self._gateway_sends(int(data["guild_id"]))
+        )
+
+    def _restore_guild(self, guild_id: int) -> bool:
+        # restoring a guild before ready would make the client think its
+        # GUILD_CREATE already came in, and after it one that isn't cached
+        # is gone
+        if (
+            not self.bot.is_ready
+            or self._gateway_sends(guild_id)
+            or not (data := self._read(f"guild:{guild_id}", "guild"))
+        ):
+            return False
+
+        with self._restoring_data():
+            guild = self._place_guild(data)
+        self._restored_guilds[guild_id] = (
+            {int(c) for c in guild._channel_ids},
+            {int(r) for r in guild._role_ids},
+        )
+        return True
+
+    async def fetch_guild(
+        self, guild_id: ipy.Snowflake_Type, *, force: bool = False
+    ) -> ipy.Guild:
+        if (
+            not force
+            and not self.bot.cache.get_guild(guild_id)
+            and not self._restore_guild(int(guild_id))
+        ):
+            self._cold("guild")
+        return await self._fetch_guild(guild_id, force=force)
+
+    async def fetch_role(
+        self,
+        guild_id: ipy.Snowflake_Type,
+        role_id: ipy.Snowflake_Type,
+        *,
+        force: bool = False,
+    ) -> ipy.Role:
+        # roles only come with their guild - if that's already cached, the
+        # snapshot can't know about a role it doesn't have
+        if (
+            not force
+            and not self.bot.cache.get_role(role_id)
+            and (
+                self.bot.cache.get_guild(guild_id)
+                or not self._restore_guild(int(guild_id))
+            )
+        ):
+            self._cold("role")
+        return await self._fetch_role(guild_id, role_id, force=force)
+
+    async def fetch_channel(
+        self, channel_id: ipy.Snowflake_Type, *, force: bool = False
+    ) -> ipy.BaseChannel:
+        if not force and not self.bot.cache.get_channel(channel_id):
+            if data := self._read(
+                f"channel:{int(channel_id)}", "channel", self._restorable_channel
+            ):
+                with self._restoring_data():
+                    self._place_channel(data)
+            else:
+                self._cold("channel")
+        return await self._fetch_channel(channel_id, force=force)
+
+    async def fetch_message(
+        self,
+        channel_id: ipy.Snowflake_Type,
+        message_id: ipy.Snowflake_Type,
+        *,
+        force: bool = False,
+    ) -> ipy.Message:
+        if not force and not self.bot.cache.get_message(channel_id, message_id):
+            if data := self._read(
+                f"message:{int(channel_id)}:{int(message_id)}", "message"
+            ):
+                with self._restoring_data():
+                    self._place_message(data)
+            else:
+                self._cold("message")
+        return await self._fetch_message(channel_id, message_id, force=force)
+
+    # endregion hooks
+
+    @contextlib.contextmanager
+    def _restoring_data(self) -> typing.Iterator[None]:
+        # placing a guild places its channels and roles through the hooks too,
+        # which shouldn't mistake them for fresh gateway data
+        self._restoring = True
+        try:
+            yield
+        finally:
+            self._restoring = False
+
+    def _read(
+        self,
+        key: str,
+        kind: str,
+        restorable: typing.Callable[[dict], bool] | None = None,
+    ) -> dict | None:
+        if not self._map or not (entry := self.entries.get(key)):
+            return None
+
+        offset, length, _ = entry
+        start = self._base + offset
+        try:
+            data = orjson.loads(self._map[start : start + length])
+        except orjson.JSONDecodeError:
+            logger.warning("Dropping unreadable cache snapshot entry %s.", key)
+            del self.entries[key]
+            self.stale += 1
+            return None
+
+        if restorable and not restorable(data):
+            return None
+        self.restored[kind] += 1
+        return data
+
+    def _load(self) -> None:
+        if not self.path.exists() or self.path.stat().st_size < _HEADER.size:
+            return
+
+        with self.path.open("rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, index_length = _HEADER.unpack_from(mapped)
+        try:
+            if magic != _MAGIC:
+                raise ValueError("bad header")
+            index = orjson.loads(mapped[_HEADER.size : _HEADER.size + index_length])
+        except ValueError:
+            # orjson's decode error is a ValueError too
+            logger.warning("Cache snapshot is unreadable, starting cold.")
+            mapped.close()
+            return
+
+        cutoff = time.time() - self.max_age
+        for key, entry in index["entries"].items():
+            if entry[2] >= cutoff:
+                self.entries[key] = entry
+            else:
+                self.stale += 1
+
+        self.user_id = index.get("user_id")
+        self._map = mapped
+        self._base = _HEADER.size + index_length
+        self.loaded = len(self.entries)
+
+    async def load(self) -> None:
+        if not self.enabled:
+            return
+
+        start = time.perf_counter()
+        await asyncio.to_thread(self._load)
+        self.load_time = time.perf_counter() - start
+
+    def ready(self) -> None:
+        """Marks startup as finished, and checks the snapshot is for this bot."""
+        if self.startup_time is not None:
+            return
+
+        self._ready_at = time.perf_counter()
+        self.startup_time = self._ready_at - self.created
+        if self.user_id and self.user_id != int(self.bot.user.id):
+            logger.warning("Cache snapshot is from another bot user, ignoring it.")
+            self.entries.clear()
+
+        logger.info(
+            "Ready after %.2fs - cache snapshot %s, %d entries indexed in %.1fms,"
+            " %d stale.",
+            self.startup_time,
+            "enabled" if self.enabled else "disabled",
+            self.loaded,
+            self.load_time * 1000,
+            self.stale,
+        )
+
+    def _guild_payload(self, guild_id: int, base: bytes) -> bytes:
+        data = orjson.loads(base)
+        data["roles"] = [
+            orjson.loads(role) for _, role in self._roles[guild_id].values()
+        ]
+        data["channels"] = []
+        for channel_id, (_, channel) in self._channels.items():
+            if self._channel_guilds.get(channel_id) != guild_id:
+                continue
+            # threads come and go, so they're only ever restored on their own
+            if (channel_data := orjson.loads(channel)).get("type") not in _THREAD_TYPES:
+                data["channels"].append(channel_data)
+        return orjson.dumps(data)
+
+    def _save(self, user_id: int | None) -> None:
+        blobs: dict[str, tuple[float, bytes]] = {}
+
+        # entries from the last snapshot nothing fresher has replaced are
+        # carried over, still aging from when they were first captured
+        if self._map:
+            for key, (offset, length, captured) in self.entries.items():
+                start = self._base + offset
+                blobs[key] = (captured, self._map[start : start + length])
+            self._map.close()
+            self._map = None
+
+        for guild_id, (captured, base) in self._guilds.items():
+            blobs[f"guild:{guild_id}"] = (
+                captured,
+                self._guild_payload(guild_id, base),
+            )
+        for channel_id, (captured, data) in self._channels.items():
+            blobs[f"channel:{channel_id}"] = (captured, data)
+        for (channel_id, message_id), (captured, data) in self._messages.items():
+            blobs[f"message:{channel_id}:{message_id}"] = (captured, data)
+
+        entries: dict[str, list[typing.Any]] = {}
+        offset = 0
+        for key, (captured, data) in blobs.items():
+            entries[key] = [offset, len(data), captured]
+            offset += len(data)
+
+        index = orjson.dumps(
+            {"saved_at": time.time(), "user_id": user_id, "entries": entries}
+        )
+        temp_path = self.path.with_suffix(f"{self.path.suffix}.tmp")
+        with temp_path.open("wb") as f:
+            f.write(_HEADER.pack(_MAGIC, len(index)))
+            f.write(index)
+            f.writelines(data for _, data in blobs.values())
+        temp_path.replace(self.path)
+
+    async def save(self) -> None:
+        if not self.enabled:
+            return
+
+        user_id = int(self.bot.user.id) if self.bot.user else self.user_id
+        await asyncio.to_thread(self._save, user_id)
+
+
+class SnapshotCache(GlobalCache):
+    """The client's cache, with its placing, deleting and fetching hooked."""
+
+    snapshot: CacheSnapshot
+
+    def place_guild_data(self, data: dict) -> ipy.Guild:
+        return self.snapshot.place_guild_data(data)
+
+    def place_role_data(
+        self, guild_id: ipy.Snowflake_Type, data: list[dict]
+    ) -> dict[ipy.Snowflake, ipy.Role]:
+        return self.snapshot.place_role_data(guild_id, data)
+
+    def place_channel_data(self, data: dict) -> ipy.BaseChannel:
+        return self.snapshot.place_channel_data(data)
+
+    def place_message_data(self, data: dict) -> ipy.Message:
+        return self.snapshot.place_message_data(data)
+
+    def delete_guild(self, guild_id: ipy.Snowflake_Type) -> None:
+        self.snapshot.delete_guild(guild_id)
+
+    def delete_role(self, role_id: ipy.Snowflake_Type) -> None:
+        self.snapshot.delete_role(role_id)
+
+    def delete_channel(self, channel_id: ipy.Snowflake_Type) -> None:
+        self.snapshot.delete_channel(channel_id)
+
+    def delete_message(
+        self, channel_id: ipy.Snowflake_Type, message_id: ipy.Snowflake_Type
+    ) -> None:
+        self.snapshot.delete_message(channel_id, message_id)
+
+    async def fetch_guild(
+        self, guild_id: ipy.Snowflake_Type, *, force: bool = False
+    ) -> ipy.Guild:
+        return await self.snapshot.fetch_guild(guild_id, force=force)
+
+    async def fetch_role(
+        self,
+        guild_id: ipy.Snowflake_Type,
+        role_id: ipy.Snowflake_Type,
+        *,
+        force: bool = False,
+    ) -> ipy.Role:
+        return await self.snapshot.fetch_role(guild_id, role_id, force=force)
+
+    async def fetch_channel(
+        self, channel_id: ipy.Snowflake_Type, *, force: bool = False
+    ) -> ipy.BaseChannel:
+        return await self.snapshot.fetch_channel(channel_id, force=force)
+
+    async def fetch_message(
+        self,
+        channel_id: ipy.Snowflake_Type,
+        message_id: ipy.Snowflake_Type,
+        *,
+        force: bool = False,
+    ) -> ipy.Message:
+        return await self.snapshot.fetch_message(channel_id, message_id, force=force)
@@ -0,0 +1,237 @@
+import asyncio
+import contextlib
+import functools
+import hashlib
+import logging
+from pathlib import Path
+
+import interactions as ipy
+import orjson
+import typing_extensions as typing
+
+__all__ = ("CommandSync", "SyncOperation", "command_hash", "command_key")
+
+logger = logging.getLogger("oscbot")
+
+# manifests from before commands were keyed by type can't be matched up, so
+# they're treated like a missing one
+MANIFEST_VERSION = 2
+
+
+def command_key(payload: dict) -> str:
+    # a slash command and a context menu can share a name, so the type is part
+    # of the key - slash command payloads leave it out
+    command_type = payload.get("type", ipy.CommandType.CHAT_INPUT)
+    return f"{int(command_type)}:{payload['name']}"
+
+
+def command_hash(payload: dict) -> str:
+    # sorted keys make the hash independent of how the payload was built up
+    return hashlib.sha256(
+        orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    ).hexdigest()
+
+
+class SyncOperation(typing.NamedTuple):
+    action: typing.Literal["create", "update", "delete"]
+    key: str
+    payload: dict | None = None
+    command_id: int | None = None
+
+    @property
+    def command_type(self) -> ipy.CommandType:
+        return ipy.CommandType(int(self.key.partition(":")[0]))
+
+    @property
+    def name(self) -> str:
+        return self.key.partition(":")[2]
+
+
+class CommandSync:
+    """
+    Syncs application commands by only sending what changed.
+
+    Each command pushed is hashed and recorded in a manifest on disk. Later
+    syncs compare against that, so unchanged commands aren't sent at all and
+    nothing has to be fetched. When the manifest can't be trusted (it's
+    missing, or was made by another application), the remote commands are
+    fetched once and compared instead.
+    """
+
+    def __init__(self, bot: ipy.Client, path: Path) -> None:
+        self.bot = bot
+        self.path = path
+        self.manifest: dict[str, typing.Any] = {}
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+
+        # an unreadable manifest is treated like a missing one, which just
+        # means the next sync compares against the remote commands
+        try:
+            manifest = orjson.loads(self.path.read_bytes())
+        except orjson.JSONDecodeError:
+            manifest = None
+        if not isinstance(manifest, dict):
+            logger.warning("Could not read the command manifest, ignoring it.")
+            manifest = {}
+        self.manifest = manifest
+
+    def _write(self, data: bytes) -> None:
+        temp_path = self.path.with_suffix(".tmp")
+        temp_path.write_bytes(data)
+        temp_path.replace(self.path)
+
+    async def load(self) -> None:
+        await asyncio.to_thread(self._load)
+
+    async def save(self) -> None:
+        data = orjson.dumps(self.manifest, option=orjson.OPT_INDENT_2)
+        await asyncio.to_thread(self._write, data)
+
+    def local_payloads(self, scope: int) -> dict[str, dict]:
+        payloads = ipy.application_commands_to_dict(
+            self.bot.interactions_by_scope, self.bot
+        )
+        return {command_key(payload): payload for payload in payloads.get(scope, [])}
+
+    async def plan(self, scope: int, *, verify: bool = False) -> list[SyncOperation]:
+        """Works out which commands need to be created, updated or deleted."""
+        await self.load()
+        # ids from another application (say, a test bot) mean nothing here
+        if (
+            self.manifest.get("application_id") != str(self.bot.app.id)
+            or self.manifest.get("version") != MANIFEST_VERSION
+        ):
+            self.manifest = {
+                "application_id": str(self.bot.app.id),
+                "version": MANIFEST_VERSION,
+                "scopes": {},
+            }
+
+        local = self.local_payloads(scope)
+        known = self.manifest["scopes"].get(str(scope))
+
+        if verify or known is None:
+            return await self._plan_from_remote(scope, local)
+
+        operations: list[SyncOperation] = []
+        for key, payload in local.items():
+            if key not in known:
+                operations.append(SyncOperation("create", key, payload))
+            elif known[key]["hash"] != command_hash(payload):
+                operations.append(SyncOperation("update", key, payload))
+
+        operations.extend(
+            SyncOperation("delete", key, command_id=int(entry["id"]))
+            for key, entry in known.items()
+            if key not in local
+        )
+        return operations
+
+    async def _plan_from_remote(
+        self, scope: int, local: dict[str, dict]
+    ) -> list[SyncOperation]:
+        remote = {
+            command_key(data): data
+            for data in await self.bot.http.get_application_commands(
+                self.bot.app.id, scope
+            )
+        }
+
+        # the manifest is rebuilt from what's actually there, with anything
+        # about to be sent filled in once it has been
+        known: dict[str, dict[str, str]] = {}
+        operations: list[SyncOperation] = []
+
+        for key, payload in local.items():
+            if not (data := remote.get(key)):
+                operations.append(SyncOperation("create", key, payload))
+            elif ipy.sync_needed(payload, data):
+                operations.append(SyncOperation("update", key, payload))
+            else:
+                known[key] = {"id": str(data["id"]), "hash": command_hash(payload)}
+
+        operations.extend(
+            SyncOperation("delete", key, command_id=int(data["id"]))
+            for key, data in remote.items()
+            if key not in local
+        )
+
+        self.manifest["scopes"][str(scope)] = known
+        return operations
+
+    def cache_command_id(self, data: dict, scope: int) -> None:
+        """Tells the client the id of a command that was just created."""
+        command_type = data.get("type", ipy.CommandType.CHAT_INPUT)
+        command_id = ipy.Snowflake(data["id"])
+
+        # the client knows commands by their full name, subcommands included
+        names = [data["name"]]
+        for option in data.get("options", []):
+            if option["type"] == ipy.OptionType.SUB_COMMAND:
+                names.append(f"{data['name']} {option['name']}")
+            elif option["type"] == ipy.OptionType.SUB_COMMAND_GROUP:
+                names.extend(
+                    f"{data['name']} {option['name']} {sub_option['name']}"
+                    for sub_option in option.get("options", [])
+                )
+
+        scope_commands = self.bot.interactions_by_scope.get(scope, {})
+        for name in names:
+            # a command of the other type with the same name isn't this one
+            command = scope_commands.get(name)
+            if (
+                command
+                and (
+                    command.type
+                    if isinstance(command, ipy.ContextMenu)
+                    else ipy.CommandType.CHAT_INPUT
+                )
+                == command_type
+            ):
+                self.bot.update_command_cache(scope, name, command_id)
+
+    async def apply(self, scope: int, operations: list[SyncOperation]) -> None:
+        """Sends the planned operations, recording each in the manifest."""
+        known = self.manifest["scopes"].setdefault(str(scope), {})
+
+        try:
+            # one at a time - these share a rate limit, and there's rarely
+            # more than a couple
+            for operation in operations:
+                if operation.action == "delete":
+                    # already gone is as good as deleted
+                    with contextlib.suppress(ipy.errors.NotFound):
+                        await self.bot.retry.run(
+                            "command-sync",
+                            functools.partial(
+                                self.bot.http.delete_application_command,
+                                self.bot.app.id,
+                                scope,
+                                operation.command_id,
+                            ),
+                        )
+                    known.pop(operation.key, None)
+                    continue
+
+                # creating a command with an existing name replaces it, so
+                # updates are sent the same way
+                data = await self.bot.retry.run(
+                    "command-sync",
+                    functools.partial(
+                        self.bot.http.create_application_command,
+                        self.bot.app.id,
+                        operation.payload,
+                        scope,
+                    ),
+                )
+                known[operation.key] = {
+                    "id": str(data["id"]),
+                    "hash": command_hash(operation.payload),
+                }
+                self.cache_command_id(data, scope)
+        finally:
+            # whatever did go through is kept, even if something failed
+            await self.save()
@@ -0,0 +1,445 @@
+import abc
+import asyncio
+import concurrent.futures
+import contextlib
+import logging
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+import typing_extensions as typing
+
+__all__ = (
+    "Database",
+    "PostgresDatabase",
+    "SQLiteDatabase",
+    "Statement",
+    "WriteBatch",
+    "connect",
+)
+
+logger = logging.getLogger("oscbot")
+
+# queries are written with postgres' $1 placeholders - sqlite understands the
+# same numbered parameters spelled as ?1
+_placeholder_reg = re.compile(r"\$(\d+)")
+_migration_reg = re.compile(r"(\d+)_(\w+)\.sql")
+
+MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at DOUBLE PRECISION NOT NULL
+)
+"""
+
+
+class Statement:
+    """
+    A query prepared once and run many times.
+
+    Both backends keep a per-connection cache of prepared statements keyed by
+    query text, so a statement is only parsed and planned the first time each
+    connection runs it. This does the rest of the per-query work up front.
+    """
+
+    __slots__ = ("db", "query", "sqlite_query")
+
+    def __init__(self, db: "_DatabaseBase", query: str) -> None:
+        self.db = db
+        self.query = query
+        self.sqlite_query = _placeholder_reg.sub(r"?\1", query)
+
+    async def execute(self, *args: typing.Any) -> None:
+        await self.db.execute(self, *args)
+
+    async def executemany(self, args: typing.Iterable[typing.Sequence]) -> None:
+        await self.db.executemany(self, args)
+
+    async def execute_returning(self, *args: typing.Any) -> list[typing.Any]:
+        return await self.db.execute_returning(self, *args)
+
+    async def fetch(self, *args: typing.Any) -> list[typing.Any]:
+        return await self.db.fetch(self, *args)
+
+    async def fetchrow(self, *args: typing.Any) -> typing.Any | None:
+        return await self.db.fetchrow(self, *args)
+
+    async def fetchval(self, *args: typing.Any) -> typing.Any:
+        return await self.db.fetchval(self, *args)
+
+
+QueryT = str | Statement
+ErrorHandler = typing.Callable[[Exception], typing.Any]
+
+
+class WriteBatch:
+    """
+    Collects rows for one write statement and runs them together.
+
+    Rows are flushed once enough have built up or the oldest has waited long
+    enough, so a burst of writes becomes one executemany call. Nothing awaits
+    those flushes, so their errors go to the database's error handler.
+    """
+
+    def __init__(
+        self,
+        statement: Statement,
+        *,
+        max_size: int = 100,
+        max_delay: float = 1.0,
+    ) -> None:
+        self.statement = statement
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.rows: list[typing.Sequence] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushing: set[asyncio.Task] = set()
+        statement.db.batches.add(self)
+
+    def _schedule_flush(self) -> None:
+        self._timer = None
+        task = asyncio.create_task(self.flush())
+        self._flushing.add(task)
+        task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task: asyncio.Task) -> None:
+        self._flushing.discard(task)
+        if task.cancelled() or not (error := task.exception()):
+            return
+
+        if self.statement.db.on_error:
+            self.statement.db.on_error(error)
+        else:
+            logger.error("Batched write failed.", exc_info=error)
+
+    def add(self, *args: typing.Any) -> None:
+        self.rows.append(args)
+
+        if len(self.rows) >= self.max_size:
+            if self._timer:
+                self._timer.cancel()
+            self._schedule_flush()
+        elif not self._timer:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.max_delay, self._schedule_flush
+            )
+
+    async def flush(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if not self.rows:
+            return
+
+        rows, self.rows = self.rows, []
+        await self.statement.executemany(rows)
+
+    async def close(self) -> None:
+        if self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+        await self.flush()
+
+
+class _DatabaseBase(abc.ABC):
+    def __init__(self, *, on_error: ErrorHandler | None = None) -> None:
+        self.batches: set[WriteBatch] = set()
+        self.on_error = on_error
+
+    # implemented by each backend
+    @abc.abstractmethod
+    async def connect(self) -> None: ...
+
+    @abc.abstractmethod
+    async def close(self) -> None: ...
+
+    @abc.abstractmethod
+    async def execute(self, query: QueryT, *args: typing.Any) -> None: ...
+
+    @abc.abstractmethod
+    async def executemany(
+        self, query: QueryT, args: typing.Iterable[typing.Sequence]
+    ) -> None: ...
+
+    @abc.abstractmethod
+    async def execute_returning(
+        self, query: QueryT, *args: typing.Any
+    ) -> list[typing.Any]: ...
+
+    @abc.abstractmethod
+    async def fetch(self, query: QueryT, *args: typing.Any) -> list[typing.Any]: ...
+
+    @abc.abstractmethod
+    async def fetchrow(self, query: QueryT, *args: typing.Any) -> typing.Any | None: ...
+
+    @abc.abstractmethod
+    async def fetchval(self, query: QueryT, *args: typing.Any) -> typing.Any: ...
+
+    @abc.abstractmethod
+    async def _apply_migration(self, version: int, name: str, sql: str) -> None: ...
+
+    def prepare(self, query: str) -> Statement:
+        return Statement(self, query)
+
+    def batch(
+        self, query: str, *, max_size: int = 100, max_delay: float = 1.0
+    ) -> WriteBatch:
+        return WriteBatch(self.prepare(query), max_size=max_size, max_delay=max_delay)
+
+    async def applied_migrations(self) -> set[int]:
+        await self.execute(MIGRATIONS_TABLE)
+        rows = await self.fetch("SELECT version FROM schema_migrations")
+        return {row["version"] for row in rows}
+
+    async def migrate(self, directory: Path) -> list[str]:
+        """Applies each migration in the directory that hasn't been applied yet."""
+        applied = await self.applied_migrations()
+        ran: list[str] = []
+
+        paths = await asyncio.to_thread(lambda: sorted(directory.glob("*.sql")))
+        for path in paths:
+            if not (match := _migration_reg.fullmatch(path.name)):
+                continue
+            if (version := int(match[1])) in applied:
+                continue
+
+            # every migration runs in its own transaction, so a failed one
+            # leaves nothing half-applied
+            sql = await asyncio.to_thread(path.read_text)
+            await self._apply_migration(version, match[2], sql)
+            logger.info("Applied migration %s.", path.name)
+            ran.append(path.name)
+
+        return ran
+
+    async def close_batches(self) -> None:
+        for batch in self.batches:
+            await batch.close()
+
+
+class SQLiteDatabase(_DatabaseBase):
+    """
+    An embedded database for local and test runs, with the same API as postgres.
+
+    sqlite calls block, so they run on worker threads. Writes go through one
+    connection, since sqlite only allows one writer anyway, while reads are
+    spread over a small pool of connections that can run alongside it.
+    """
+
+    def __init__(
+        self,
+        path: Path | str,
+        *,
+        readers: int = 3,
+        on_error: ErrorHandler | None = None,
+    ) -> None:
+        super().__init__(on_error=on_error)
+        self.path = path
+        # every connection to an in-memory database gets its own database
+        self.reader_count = 0 if str(path) == ":memory:" else readers
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.reader_count + 1, thread_name_prefix="sqlite"
+        )
+        self._writer: sqlite3.Connection | None = None
+        self._write_lock = asyncio.Lock()
+        self._readers: asyncio.Queue[sqlite3.Connection] = asyncio.Queue()
+
+    async def _run(
+        self, func: typing.Callable[..., typing.Any], *args: typing.Any
+    ) -> typing.Any:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, func, *args
+        )
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    async def connect(self) -> None:
+        self._writer = await self._run(self._open)
+        for _ in range(self.reader_count):
+            self._readers.put_nowait(await self._run(self._open))
+
+    @staticmethod
+    def _query(query: QueryT) -> str:
+        if isinstance(query, Statement):
+            return query.sqlite_query
+        return _placeholder_reg.sub(r"?\1", query)
+
+    @staticmethod
+    def _write(
+        conn: sqlite3.Connection, query: str, args: typing.Iterable[typing.Sequence]
+    ) -> None:
+        with contextlib.closing(conn.cursor()) as cursor:
+            cursor.execute("BEGIN")
+            try:
+                cursor.executemany(query, args)
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+
+    @staticmethod
+    def _read(conn: sqlite3.Connection, query: str, args: tuple) -> list[sqlite3.Row]:
+        return conn.execute(query, args).fetchall()
+
+    async def execute(self, query: QueryT, *args: typing.Any) -> None:
+        async with self._write_lock:
+            await self._run(self._write, self._writer, self._query(query), [args])
+
+    async def executemany(
+        self, query: QueryT, args: typing.Iterable[typing.Sequence]
+    ) -> None:
+        async with self._write_lock:
+            await self._run(self._write, self._writer, self._query(query), args)
+
+    async def execute_returning(
+        self, query: QueryT, *args: typing.Any
+    ) -> list[sqlite3.Row]:
+        # a write with a RETURNING clause still goes through the writer - it
+        # runs as one statement, so it commits on its own
+        async with self._write_lock:
+            return await self._run(self._read, self._writer, self._query(query), args)
+
+    async def fetch(self, query: QueryT, *args: typing.Any) -> list[sqlite3.Row]:
+        if not self.reader_count:
+            async with self._write_lock:
+                return await self._run(
+                    self._read, self._writer, self._query(query), args
+                )
+
+        conn = await self._readers.get()
+        try:
+            return await self._run(self._read, conn, self._query(query), args)
+        finally:
+            self._readers.put_nowait(conn)
+
+    async def fetchrow(self, query: QueryT, *args: typing.Any) -> sqlite3.Row | None:
+        rows = await self.fetch(query, *args)
+        return rows[0] if rows else None
+
+    async def fetchval(self, query: QueryT, *args: typing.Any) -> typing.Any:
+        row = await self.fetchrow(query, *args)
+        return row[0] if row else None
+
+    def _migrate(self, version: int, name: str, sql: str) -> None:
+        # executescript commits before it runs, so the transaction is opened
+        # inside the script itself and left open for the bookkeeping row
+        try:
+            self._writer.executescript(f"BEGIN;\n{sql}")
+            self._writer.execute(
+                "INSERT INTO schema_migrations (version, name, applied_at) VALUES"
+                " (?, ?, ?)",
+                (version, name, time.time()),
+            )
+            self._writer.execute("COMMIT")
+        except BaseException:
+            if self._writer.in_transaction:
+                self._writer.execute("ROLLBACK")
+            raise
+
+    async def _apply_migration(self, version: int, name: str, sql: str) -> None:
+        async with self._write_lock:
+            await self._run(self._migrate, version, name, sql)
+
+    async def close(self) -> None:
+        await self.close_batches()
+        if self._writer:
+            await self._run(self._writer.close)
+        while not self._readers.empty():
+            await self._run(self._readers.get_nowait().close)
+        self._executor.shutdown()
+
+
+class PostgresDatabase(_DatabaseBase):
+    def __init__(
+        self,
+        url: str,
+        *,
+        min_size: int = 1,
+        max_size: int = 5,
+        on_error: ErrorHandler | None = None,
+    ) -> None:
+        super().__init__(on_error=on_error)
+        self.url = url
+        self.min_size = min_size
+        self.max_size = max_size
+        self._pool: typing.Any = None
+
+    async def connect(self) -> None:
+        # only needed when a database url is set, so it's imported here
+        import asyncpg
+
+        self._pool = await asyncpg.create_pool(
+            self.url,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            statement_cache_size=256,
+        )
+
+    @staticmethod
+    def _query(query: QueryT) -> str:
+        return query.query if isinstance(query, Statement) else query
+
+    async def execute(self, query: QueryT, *args: typing.Any) -> None:
+        await self._pool.execute(self._query(query), *args)
+
+    async def executemany(
+        self, query: QueryT, args: typing.Iterable[typing.Sequence]
+    ) -> None:
+        # asyncpg runs these in one transaction, like the sqlite backend
+        await self._pool.executemany(self._query(query), args)
+
+    async def execute_returning(
+        self, query: QueryT, *args: typing.Any
+    ) -> list[typing.Any]:
+        return await self._pool.fetch(self._query(query), *args)
+
+    async def fetch(self, query: QueryT, *args: typing.Any) -> list[typing.Any]:
+        return await self._pool.fetch(self._query(query), *args)
+
+    async def fetchrow(self, query: QueryT, *args: typing.Any) -> typing.Any | None:
+        return await self._pool.fetchrow(self._query(query), *args)
+
+    async def fetchval(self, query: QueryT, *args: typing.Any) -> typing.Any:
+        return await self._pool.fetchval(self._query(query), *args)
+
+    async def _apply_migration(self, version: int, name: str, sql: str) -> None:
+        async with self._pool.acquire() as conn, conn.transaction():
+            await conn.execute(sql)
+            await conn.execute(
+                "INSERT INTO schema_migrations (version, name, applied_at) VALUES"
+                " ($1, $2, $3)",
+                version,
+                name,
+                time.time(),
+            )
+
+    async def close(self) -> None:
+        await self.close_batches()
+        if self._pool:
+            await self._pool.close()
+
+
+Database = SQLiteDatabase | PostgresDatabase
+
+
+async def connect(
+    url: str | None,
+    sqlite_path: Path,
+    *,
+    pool_size: int = 5,
+    on_error: ErrorHandler | None = None,
+) -> Database:
+    """Connects to postgres if a url is given, or the local sqlite file otherwise."""
+    db = (
+        PostgresDatabase(url, max_size=pool_size, on_error=on_error)
+        if url
+        else SQLiteDatabase(sqlite_path, on_error=on_error)
+    )
+    await db.connect()
+    return db
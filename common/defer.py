@@ -0,0 +1,250 @@
+import asyncio
+import contextlib
+import functools
+import time
+
+import interactions as ipy
+import typing_extensions as typing
+
+import common.retry as retry
+import common.tracing as tracing
+import common.utils as utils
+
+if typing.TYPE_CHECKING:
+    from common.tracing import Tracer
+
+__all__ = ("AdaptiveAutoDefer", "DeferStats", "DeferTracker")
+
+
+class DeferStats:
+    __slots__ = ("deadline_defers", "direct", "estimate", "predicted_defers", "samples")
+
+    def __init__(self) -> None:
+        self.estimate = 0.0
+        self.samples = 0
+        self.direct = 0
+        self.predicted_defers = 0
+        self.deadline_defers = 0
+
+
+class _ResponseGuard:
+    """
+    Makes a context's initial response and its deadline defer take turns.
+
+    Both decide between an initial response and a followup from the context's
+    flags, so if they ran at once the loser would try a second initial
+    response and fail. Whichever goes second waits, then sees what the first
+    did.
+    """
+
+    __slots__ = ("holder", "lock")
+
+    # everything on a context that can send the initial response
+    METHODS = ("defer", "_send_http_request", "send_modal", "edit_origin")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.holder: asyncio.Task | None = None
+
+    @contextlib.asynccontextmanager
+    async def hold(self) -> typing.AsyncGenerator[None, None]:
+        # responses call each other (a send with files defers first), so the
+        # task that already has the lock just carries on
+        if self.holder is asyncio.current_task():
+            yield
+            return
+
+        async with self.lock:
+            self.holder = asyncio.current_task()
+            try:
+                yield
+            finally:
+                self.holder = None
+
+    def wrap(self, method: typing.Callable) -> typing.Callable:
+        @functools.wraps(method)
+        async def wrapper(*args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+            async with self.hold():
+                return await method(*args, **kwargs)
+
+        return wrapper
+
+    def install(self, ctx: ipy.InteractionContext) -> None:
+        for name in self.METHODS:
+            if method := getattr(ctx, name, None):
+                setattr(ctx, name, self.wrap(method))
+
+
+class DeferTracker:
+    """
+    Records how long each interaction handler takes and only defers when needed.
+
+    Handlers whose average latency is near the deadline are deferred right away.
+    Everything else gets a timer that defers only if the deadline actually comes
+    close, so fast handlers answer with the initial response and skip the
+    separate defer request entirely. The timer and the handler's own response
+    never send at the same time, so the handler can't be beaten to it.
+    """
+
+    def __init__(
+        self, *, deadline: float = 2.0, smoothing: float = 0.2, enabled: bool = True
+    ) -> None:
+        # discord gives us 3 seconds to respond - the deadline leaves room for
+        # the defer request itself
+        self.deadline = deadline
+        self.smoothing = smoothing
+        self.enabled = enabled
+        self.stats: dict[str, DeferStats] = {}
+        self._pending: dict[int, tuple[str, float, asyncio.TimerHandle | None]] = {}
+        self._defer_tasks: set[asyncio.Task] = set()
+        # set once the bot has one, to trace handlers that don't have a trace
+        self.tracer: Tracer | None = None
+
+    def predicts_slow(self, key: str) -> bool:
+        stats = self.stats.get(key)
+        # 80% of the deadline leaves margin for jitter in the handler's runtime
+        return bool(stats and stats.samples and stats.estimate >= self.deadline * 0.8)
+
+    def time_left(self, ctx: ipy.InteractionContext) -> float:
+        # measured from when discord created the interaction, not when we got it
+        age = time.time() - ctx.id.created_at.timestamp()
+        return min(max(self.deadline - age, 0.0), self.deadline)
+
+    def record(self, key: str, latency: float) -> None:
+        stats = self.stats.setdefault(key, DeferStats())
+        if stats.samples:
+            stats.estimate += self.smoothing * (latency - stats.estimate)
+        else:
+            stats.estimate = latency
+        stats.samples += 1
+
+    async def _defer(
+        self,
+        ctx: ipy.InteractionContext,
+        key: str,
+        guard: _ResponseGuard,
+        *,
+        ephemeral: bool,
+    ) -> None:
+        async with guard.hold():
+            if ctx.responded or ctx.deferred:
+                return
+
+            with (
+                contextlib.suppress(ipy.errors.HTTPException),
+                tracing.span("deadline defer", "defer"),
+            ):
+                await ctx.defer(ephemeral=ephemeral)
+                self.stats.setdefault(key, DeferStats()).deadline_defers += 1
+
+    def _schedule_defer(
+        self, ctx: ipy.InteractionContext, key: str, *, ephemeral: bool
+    ) -> asyncio.TimerHandle:
+        guard = _ResponseGuard()
+        guard.install(ctx)
+
+        def create_defer_task() -> None:
+            task = asyncio.create_task(
+                self._defer(ctx, key, guard, ephemeral=ephemeral)
+            )
+            self._defer_tasks.add(task)
+            task.add_done_callback(self._defer_tasks.discard)
+
+        return asyncio.get_running_loop().call_later(
+            self.time_left(ctx), create_defer_task
+        )
+
+    async def start(
+        self, ctx: ipy.InteractionContext, key: str, *, ephemeral: bool = False
+    ) -> None:
+        stats = self.stats.setdefault(key, DeferStats())
+        timer = None
+
+        if not self.enabled or self.predicts_slow(key):
+            with tracing.span("defer", "defer"):
+                await ctx.defer(ephemeral=ephemeral)
+            stats.predicted_defers += 1
+        else:
+            timer = self._schedule_defer(ctx, key, ephemeral=ephemeral)
+
+        # the clock starts after any defer so its round trip isn't counted as
+        # part of the handler
+        self._pending[int(ctx.id)] = (key, time.perf_counter(), timer)
+
+    def finish(self, ctx: ipy.BaseContext) -> None:
+        # prefixed commands complete through the same listener, but are never
+        # deferred (and have no interaction id)
+        if not isinstance(ctx, ipy.InteractionContext):
+            return
+        if not (pending := self._pending.pop(int(ctx.id), None)):
+            return
+
+        key, start, timer = pending
+        if timer:
+            timer.cancel()
+            if not ctx.deferred:
+                self.stats[key].direct += 1
+
+        self.record(key, time.perf_counter() - start)
+
+    @staticmethod
+    async def _send_error(ctx: ipy.InteractionContext, message: str) -> None:
+        # discord may well not take this either
+        with contextlib.suppress(Exception):
+            await ctx.send(embeds=utils.error_embed_generate(message), ephemeral=True)
+
+    @contextlib.asynccontextmanager
+    async def guard(
+        self, ctx: ipy.InteractionContext, key: str, *, ephemeral: bool = False
+    ) -> typing.AsyncGenerator[None, None]:
+        """
+        Wraps a handler body, deferring only if it's likely to be slow.
+
+        If Discord has issues while it runs (or the retry breaker is open), the
+        user is told so.
+        """
+        # modal and component listeners get their trace here, since nothing
+        # else would end it
+        if self.tracer and (
+            not (trace := tracing.current()) or trace.finished is not None
+        ):
+            self.tracer.begin(key, ctx.id)
+
+        await self.start(ctx, key, ephemeral=ephemeral)
+        try:
+            yield
+        except Exception as e:
+            tracing.fail(e)
+            # errors in listeners never reach a handler that could answer, so
+            # discord having issues is answered here rather than leaving the
+            # interaction waiting
+            if isinstance(e, retry.CircuitOpenError):
+                await self._send_error(ctx, str(e))
+                return
+            if retry.classify(e) != retry.PERMANENT:
+                await self._send_error(
+                    ctx,
+                    "Discord had trouble with that request. Please try again in a bit.",
+                )
+            raise
+        finally:
+            self.finish(ctx)
+            # the guard wraps the whole handler, so its trace ends here
+            tracing.end_trace()
+
+
+class AdaptiveAutoDefer(ipy.AutoDefer):
+    """An auto defer for commands that lets a DeferTracker decide when to defer."""
+
+    def __init__(self, tracker: DeferTracker, *, ephemeral: bool = False) -> None:
+        super().__init__(
+            enabled=True, ephemeral=ephemeral, time_until_defer=tracker.deadline
+        )
+        self.tracker = tracker
+
+    async def __call__(self, ctx: ipy.InteractionContext) -> None:
+        # finished by the command completion listener on the bot
+        if self.enabled:
+            await self.tracker.start(
+                ctx, f"/{ctx.command.resolved_name}", ephemeral=self.ephemeral
+            )
@@ -0,0 +1,353 @@
+import datetime
+import re
+import time
+
+import interactions as ipy
+import orjson
+import typing_extensions as typing
+
+__all__ = (
+    "EMBED_FOOTER_TEXT_LENGTH",
+    "EMBED_URL_LENGTH",
+    "INVALID_SAMPLE_EMBED",
+    "SAMPLE_EMBED",
+    "EmbedTemplate",
+    "benchmark",
+    "format_errors",
+    "validate_embed",
+)
+
+# discord's limits that interactions.py doesn't already expose as constants
+EMBED_FOOTER_TEXT_LENGTH = 2048
+EMBED_URL_LENGTH = 2048
+EMBED_COLOR_MAX = 0xFFFFFF
+
+# paths are only turned into strings when an error happens, as building them
+# eagerly for every key was most of the validator's runtime
+Path = typing.Union[str, tuple["Path", str | int]]
+
+# a validator takes the value, its path in the payload and the list to put errors
+# into, and returns how many characters the value adds to the embed's total size
+Validator = typing.Callable[[typing.Any, Path, list[str]], int]
+
+_HTTP_URL = re.compile(r"https?://[^\s/?#]+[^\s]*")
+_ATTACHMENT_URL = re.compile(r"attachment://[^\s/]+")
+
+
+def _format_path(path: Path) -> str:
+    parts: list[str] = []
+    while isinstance(path, tuple):
+        path, key = path
+        parts.append(f"[{key}]" if isinstance(key, int) else f".{key}")
+    return path + "".join(reversed(parts))
+
+
+def _string(max_length: int, *, counted: bool = False) -> Validator:
+    def validate(value: typing.Any, path: Path, errors: list[str]) -> int:
+        if not isinstance(value, str):
+            errors.append(f"`{_format_path(path)}` must be a string.")
+            return 0
+        if len(value) > max_length:
+            errors.append(
+                f"`{_format_path(path)}` must be at most {max_length} characters long"
+                f" (got {len(value)})."
+            )
+        return len(value) if counted else 0
+
+    return validate
+
+
+def _required_string(max_length: int, *, counted: bool = False) -> Validator:
+    base = _string(max_length, counted=counted)
+
+    def validate(value: typing.Any, path: Path, errors: list[str]) -> int:
+        if isinstance(value, str) and (not value or value.isspace()):
+            errors.append(f"`{_format_path(path)}` must not be empty.")
+        return base(value, path, errors)
+
+    return validate
+
+
+def _url(*, allow_attachment: bool = False) -> Validator:
+    def validate(value: typing.Any, path: Path, errors: list[str]) -> int:
+        if not isinstance(value, str):
+            errors.append(f"`{_format_path(path)}` must be a string.")
+            return 0
+        if len(value) > EMBED_URL_LENGTH:
+            errors.append(
+                f"`{_format_path(path)}` must be at most {EMBED_URL_LENGTH} characters"
+                " long."
+            )
+        elif not _HTTP_URL.fullmatch(value) and not (
+            allow_attachment and _ATTACHMENT_URL.fullmatch(value)
+        ):
+            errors.append(
+                f"`{_format_path(path)}` must be an http(s)"
+                + (" or attachment://" if allow_attachment else "")
+                + " URL."
+            )
+        return 0
+
+    return validate
+
+
+def _integer(minimum: int, maximum: int) -> Validator:
+    def validate(value: typing.Any, path: Path, errors: list[str]) -> int:
+        # bools are ints in python, but not in json
+        if not isinstance(value, int) or isinstance(value, bool):
+            errors.append(f"`{_format_path(path)}` must be an integer.")
+        elif not minimum <= value <= maximum:
+            errors.append(
+                f"`{_format_path(path)}` must be between {minimum} and {maximum}."
+            )
+        return 0
+
+    return validate
+
+
+def _boolean(value: typing.Any, path: Path, errors: list[str]) -> int:
+    if not isinstance(value, bool):
+        errors.append(f"`{_format_path(path)}` must be true or false.")
+    return 0
+
+
+def _timestamp(value: typing.Any, path: Path, errors: list[str]) -> int:
+    if not isinstance(value, str):
+        errors.append(f"`{_format_path(path)}` must be an ISO8601 timestamp string.")
+        return 0
+
+    # fromisoformat doesn't understand the Z suffix until 3.11
+    try:
+        datetime.datetime.fromisoformat(value.removesuffix("Z"))
+    except ValueError:
+        errors.append(f"`{_format_path(path)}` must be an ISO8601 timestamp.")
+    return 0
+
+
+def _object(
+    properties: dict[str, Validator], *, required: tuple[str, ...] = ()
+) -> Validator:
+    # unknown keys are let through, as discord ignores them and embeds taken from
+    # existing messages include read-only ones like "type" and "proxy_url"
+    items = tuple(properties.items())
+
+    def validate(value: typing.Any, path: Path, errors: list[str]) -> int:
+        if not isinstance(value, dict):
+            errors.append(f"`{_format_path(path)}` must be an object.")
+            return 0
+
+        for key in required:
+            if key not in value:
+                errors.append(f"`{_format_path((path, key))}` is required.")
+
+        size = 0
+        for key, validator in items:
+            if (item := value.get(key)) is not None:
+                size += validator(item, (path, key), errors)
+        return size
+
+    return validate
+
+
+def _array(item_validator: Validator, *, max_items: int) -> Validator:
+    def validate(value: typing.Any, path: Path, errors: list[str]) -> int:
+        if not isinstance(value, list):
+            errors.append(f"`{_format_path(path)}` must be an array.")
+            return 0
+        if len(value) > max_items:
+            errors.append(
+                f"`{_format_path(path)}` can have at most {max_items} entries (got"
+                f" {len(value)})."
+            )
+
+        size = 0
+        for index, item in enumerate(value):
+            size += item_validator(item, (path, index), errors)
+        return size
+
+    return validate
+
+
+# built once at import so validating only walks prebuilt closures
+_image = _object({"url": _url(allow_attachment=True)}, required=("url",))
+_validate_embed = _object(
+    {
+        "title": _string(ipy.const.EMBED_MAX_NAME_LENGTH, counted=True),
+        "description": _string(ipy.const.EMBED_MAX_DESC_LENGTH, counted=True),
+        "url": _url(),
+        "timestamp": _timestamp,
+        "color": _integer(0, EMBED_COLOR_MAX),
+        "footer": _object(
+            {
+                "text": _string(EMBED_FOOTER_TEXT_LENGTH, counted=True),
+                "icon_url": _url(allow_attachment=True),
+            },
+            required=("text",),
+        ),
+        "image": _image,
+        "thumbnail": _image,
+        "author": _object(
+            {
+                "name": _string(ipy.const.EMBED_MAX_NAME_LENGTH, counted=True),
+                "url": _url(),
+                "icon_url": _url(allow_attachment=True),
+            },
+            required=("name",),
+        ),
+        "fields": _array(
+            _object(
+                {
+                    "name": _required_string(
+                        ipy.const.EMBED_MAX_NAME_LENGTH, counted=True
+                    ),
+                    "value": _required_string(
+                        ipy.const.EMBED_FIELD_VALUE_LENGTH, counted=True
+                    ),
+                    "inline": _boolean,
+                },
+                required=("name", "value"),
+            ),
+            max_items=ipy.const.EMBED_MAX_FIELDS,
+        ),
+    }
+)
+
+
+def validate_embed(data: typing.Any, *, path: str = "embed") -> list[str]:
+    """
+    Checks a raw embed dict against Discord's limits without making any requests.
+
+    Returns a list of human-readable errors, each naming the path of the value
+    that caused it. An empty list means the embed is valid.
+    """
+    errors: list[str] = []
+    size = _validate_embed(data, path, errors)
+
+    if size > ipy.const.EMBED_TOTAL_MAX:
+        errors.append(
+            f"`{path}` must be at most {ipy.const.EMBED_TOTAL_MAX} characters long"
+            f" in total (got {size})."
+        )
+
+    return errors
+
+
+def format_errors(errors: list[str], *, limit: int = 10) -> str:
+    formatted = "\n".join(f"- {error}" for error in errors[:limit])
+    if len(errors) > limit:
+        formatted += f"\n...and {len(errors) - limit} more."
+    return f"The raw embed is invalid:\n{formatted}"
+
+
+# a busy but valid embed, and the same one with a few mistakes in it, for
+# timing the validator against the requests it saves
+SAMPLE_EMBED: dict[str, typing.Any] = {
+    "title": "Server Rules",
+    "description": "Please read these before posting. " * 40,
+    "url": "https://example.com/rules",
+    "color": 0xD14136,
+    "timestamp": "2024-01-01T00:00:00+00:00",
+    "footer": {"text": "Last updated", "icon_url": "https://example.com/icon.png"},
+    "thumbnail": {"url": "https://example.com/thumbnail.png"},
+    "author": {"name": "Moderators", "url": "https://example.com"},
+    "fields": [
+        {"name": f"Rule {index}", "value": "Be kind to each other. " * 8}
+        for index in range(1, 21)
+    ],
+}
+INVALID_SAMPLE_EMBED: dict[str, typing.Any] = {
+    **SAMPLE_EMBED,
+    "title": "x" * 300,
+    "url": "not a url",
+    "color": -1,
+}
+
+
+def benchmark(count: int) -> list[tuple[str, float]]:
+    """
+    Times validating the sample embeds, in seconds per call.
+
+    Blocks for a while with big counts, so should be run in a thread.
+    """
+    results = []
+    for label, data in (
+        ("Valid embed", SAMPLE_EMBED),
+        ("Invalid embed", INVALID_SAMPLE_EMBED),
+    ):
+        start = time.perf_counter()
+        for _ in range(count):
+            validate_embed(data)
+        results.append((label, (time.perf_counter() - start) / count))
+    return results
+
+
+_PLACEHOLDER = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+
+# a renderer takes the variables and produces its part of the embed dict
+Renderer = typing.Callable[[dict[str, str]], typing.Any]
+
+
+class EmbedTemplate:
+    """
+    A raw embed with {{ variable }} placeholders, compiled once into a renderer.
+
+    Rendering only fills in the precomputed string pieces and rebuilds the
+    containers, so the template's JSON is never re-parsed.
+    """
+
+    __slots__ = ("_renderer", "name", "source", "variables")
+
+    def __init__(self, name: str, source: str) -> None:
+        self.name = name
+        self.source = source
+
+        try:
+            data = orjson.loads(source)
+        except orjson.JSONDecodeError:
+            raise ValueError("Could not parse the raw embed.") from None
+
+        if isinstance(data, dict) and isinstance(data.get("embeds"), list):
+            data = data["embeds"][0] if data["embeds"] else {}
+        if not isinstance(data, dict):
+            raise ValueError("The raw embed must be an object.")
+
+        variables: list[str] = []
+        self._renderer = _compile(data, variables)
+        self.variables = tuple(variables)
+
+    def render(self, variables: dict[str, str]) -> dict:
+        if missing := [v for v in self.variables if v not in variables]:
+            raise ValueError(f"Missing values for: {', '.join(missing)}.")
+        return self._renderer(variables)
+
+
+def _compile(value: typing.Any, variables: list[str]) -> Renderer:
+    if isinstance(value, dict):
+        items = tuple((k, _compile(v, variables)) for k, v in value.items())
+        return lambda values: {k: render(values) for k, render in items}
+
+    if isinstance(value, list):
+        renderers = tuple(_compile(v, variables) for v in value)
+        return lambda values: [render(values) for render in renderers]
+
+    if isinstance(value, str) and _PLACEHOLDER.search(value):
+        # re.split alternates between literal text and variable names
+        pieces = _PLACEHOLDER.split(value)
+        literals = pieces[::2]
+        names = pieces[1::2]
+        variables.extend(name for name in names if name not in variables)
+
+        if len(names) == 1 and not literals[0] and not literals[1]:
+            name = names[0]
+            return lambda values: values[name]
+
+        def render_string(values: dict[str, str]) -> str:
+            parts = [literals[0]]
+            for name, literal in zip(names, literals[1:], strict=True):
+                parts.append(values[name])
+                parts.append(literal)
+            return "".join(parts)
+
+        return render_string
+
+    return lambda _: value
@@ -0,0 +1,164 @@
+import collections
+import logging
+import re
+
+import interactions as ipy
+import typing_extensions as typing
+from interactions.client.client import _INTENT_EVENTS
+from interactions.ext import prefixed_commands as prefixed
+
+__all__ = (
+    "FilteredProcessors",
+    "check_intents",
+    "intent_names",
+    "required_intents",
+)
+
+logger = logging.getLogger("oscbot")
+
+# the same conversion interactions.py uses to get an event's listener name
+_event_name_reg = re.compile("(?<!^)(?=[A-Z])")
+
+# processors for these dispatch types only build models for their events (and
+# fill caches no extension reads), so they can be skipped when nothing listens
+# for the events they would dispatch
+_SKIPPABLE: dict[str, tuple[str, ...]] = {
+    "raw_typing_start": ("typing_start",),
+    "raw_presence_update": ("presence_update",),
+    "raw_message_reaction_add": ("message_reaction_add",),
+    "raw_message_reaction_remove": ("message_reaction_remove",),
+    "raw_message_reaction_remove_all": ("message_reaction_remove_all",),
+    "raw_message_reaction_remove_emoji": ("message_reaction_remove_emoji",),
+    "raw_voice_state_update": (
+        "voice_state_update",
+        "voice_user_mute",
+        "voice_user_deafen",
+        "voice_user_move",
+        "voice_user_join",
+        "voice_user_leave",
+    ),
+    "raw_invite_create": ("invite_create",),
+    "raw_invite_delete": ("invite_delete",),
+    "raw_guild_ban_add": ("ban_create",),
+    "raw_guild_ban_remove": ("ban_remove",),
+    "raw_integration_create": ("integration_create",),
+    "raw_integration_update": ("integration_update",),
+    "raw_integration_delete": ("integration_delete",),
+    "raw_webhook_update": ("webhooks_update",),
+    "raw_guild_audit_log_entry_create": ("guild_audit_log_entry_create",),
+    "raw_guild_scheduled_event_create": ("guild_scheduled_event_create",),
+    "raw_guild_scheduled_event_update": ("guild_scheduled_event_update",),
+    "raw_guild_scheduled_event_delete": ("guild_scheduled_event_delete",),
+    "raw_guild_scheduled_event_user_add": ("guild_scheduled_event_user_add",),
+    "raw_guild_scheduled_event_user_remove": ("guild_scheduled_event_user_remove",),
+    "raw_stage_instance_create": ("stage_instance_create",),
+    "raw_stage_instance_update": ("stage_instance_update",),
+    "raw_stage_instance_delete": ("stage_instance_delete",),
+    "raw_message_poll_vote_add": ("message_poll_vote_add",),
+    "raw_message_poll_vote_remove": ("message_poll_vote_remove",),
+    "raw_auto_moderation_action_execution": ("auto_mod_exec",),
+    "raw_auto_moderation_rule_create": ("auto_mod_created",),
+    "raw_auto_moderation_rule_update": ("auto_mod_updated",),
+    "raw_auto_moderation_rule_delete": ("auto_mod_deleted",),
+    "raw_entitlement_create": ("entitlement_create",),
+    "raw_entitlement_update": ("entitlement_update",),
+    "raw_entitlement_delete": ("entitlement_delete",),
+}
+
+
+def _intents_by_event() -> dict[str, ipy.Intents]:
+    # the first intent listed for an event is always the narrowest one
+    return {
+        _event_name_reg.sub("_", event.__name__).lower(): intents[0]
+        for event, intents in _INTENT_EVENTS.items()
+    }
+
+
+def intent_names(intents: ipy.Intents) -> str:
+    # the default intents also set bits discord hasn't named, which show up as None
+    return " | ".join(i.name for i in intents if i.name) or "None"
+
+
+def required_intents(bot: ipy.Client) -> ipy.Intents:
+    """Works out the smallest set of intents the loaded listeners and commands need."""
+    intents = ipy.Intents.GUILDS
+    intents_by_event = _intents_by_event()
+
+    for event_name in bot.listeners:
+        if intent := intents_by_event.get(event_name.removeprefix("raw_")):
+            intents |= intent
+
+    # discord always sends the content of messages that mention the bot, so
+    # mention prefixes work without the privileged intent
+    manager: prefixed.PrefixedManager | None = getattr(bot, "prefixed", None)
+    if (
+        manager
+        and manager.commands
+        and manager.generate_prefixes is not prefixed.when_mentioned
+    ):
+        intents |= ipy.Intents.MESSAGE_CONTENT
+
+    return intents
+
+
+def check_intents(bot: ipy.Client) -> ipy.Intents:
+    """Warns about configured intents that nothing loaded needs."""
+    required = required_intents(bot)
+
+    if extra := ipy.Intents(int(bot.intents) & ~int(required)):
+        logger.warning(
+            "Configured intents include %s, which no loaded extension needs. The"
+            " minimal set is %s.",
+            intent_names(extra),
+            intent_names(required),
+        )
+
+    return required
+
+
+class FilteredProcessors(dict):
+    """
+    Stands in for the client's processors to count and filter dispatch events.
+
+    The gateway looks up a processor for every dispatch it gets, so this sees
+    every event type received. With skipping on, dispatch types in the
+    skippable list whose events have no listeners or waiters get no
+    processor, so their payloads are never turned into models or cached.
+    """
+
+    def __init__(
+        self,
+        bot: ipy.Client,
+        processors: dict[str, typing.Callable[..., typing.Coroutine]],
+        *,
+        skip_unhandled: bool = False,
+    ) -> None:
+        super().__init__(processors)
+        self.bot = bot
+        self.skip_unhandled = skip_unhandled
+        self.received: collections.Counter[str] = collections.Counter()
+        self.processed: collections.Counter[str] = collections.Counter()
+
+    def is_handled(self, event_name: str) -> bool:
+        # checked on every event rather than once, so extensions loaded later
+        # get their events
+        listeners = self.bot.listeners
+        waits = self.bot.waits
+        if event_name in listeners or "event" in listeners:
+            return True
+        return any(
+            name in listeners or name in waits for name in _SKIPPABLE[event_name]
+        )
+
+    def get(
+        self, key: str, default: typing.Any = None
+    ) -> typing.Callable[..., typing.Coroutine] | typing.Any:
+        self.received[key] += 1
+
+        if self.skip_unhandled and key in _SKIPPABLE and not self.is_handled(key):
+            return default
+
+        processor = super().get(key, default)
+        if processor is not default:
+            self.processed[key] += 1
+        return processor
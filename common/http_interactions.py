@@ -0,0 +1,228 @@
+import asyncio
+import contextlib
+import logging
+import time
+
+import interactions as ipy
+import orjson
+import typing_extensions as typing
+from aiohttp import FormData, web
+
+__all__ = ("InteractionServer",)
+
+logger = logging.getLogger("oscbot")
+
+# what discord expects back from a ping, which it sends to check the endpoint
+_PONG = orjson.dumps({"type": ipy.CallbackType.PONG})
+
+
+class _PendingResponse:
+    __slots__ = ("callback", "sent")
+
+    def __init__(self) -> None:
+        loop = asyncio.get_running_loop()
+        # the initial response, ready to go out as the http response
+        self.callback: asyncio.Future[dict | FormData] = loop.create_future()
+        # set once it's been written, so followups can't get there first
+        self.sent: asyncio.Future[None] = loop.create_future()
+
+
+class InteractionServer:
+    """
+    Receives interactions through a signed HTTP endpoint instead of the gateway.
+
+    Every request is checked against the application's Ed25519 public key
+    before anything else is done with it. Interactions are then handed to
+    the client as if the gateway had sent them, and whatever the handler
+    sends as its initial response (a message, defer, modal or autocomplete
+    choices) goes back as the HTTP response rather than a separate request.
+    Anything sent after that goes through the REST API as usual.
+
+    When other processes share the endpoint, this one only has the guilds on
+    its own shards cached (or none at all, without a gateway connection), so
+    for any other guild it fetches the guild (and the bot's member in it)
+    before handing an interaction over, and again once that's old.
+    """
+
+    def __init__(
+        self,
+        bot: ipy.Client,
+        public_key: str,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        path: str = "/interactions",
+        fetch_guilds: bool = False,
+        guild_ttl: float = 5 * 60,
+        response_timeout: float = 2.8,
+        max_skew: float = 5 * 60,
+    ) -> None:
+        # pynacl is only needed for this mode, so it's imported here
+        try:
+            import nacl.exceptions
+            import nacl.signing
+        except ImportError as e:
+            raise RuntimeError(
+                "PyNaCl is needed to receive interactions over HTTP. Install it"
+                " with `pip install pynacl`."
+            ) from e
+
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.path = path
+        self.fetch_guilds = fetch_guilds
+        self.guild_ttl = guild_ttl
+        self.response_timeout = response_timeout
+        self.max_skew = max_skew
+
+        self._key = nacl.signing.VerifyKey(bytes.fromhex(public_key))
+        self._bad_signature = nacl.exceptions.BadSignatureError
+        self._runner: web.AppRunner | None = None
+        self.pending: dict[str, _PendingResponse] = {}
+        self.guilds_fetched: dict[int, float] = {}
+
+        self.received = 0
+        self.rejected = 0
+        self.answered = 0
+        self.timed_out = 0
+
+        self._rest_initial_response = bot.http.post_initial_response
+        bot.http.post_initial_response = self._post_initial_response
+
+    def verify(self, signature: str, timestamp: str, body: bytes) -> bool:
+        # the timestamp is signed too, so an old request can't be sent again
+        try:
+            if abs(time.time() - int(timestamp)) > self.max_skew:
+                return False
+            self._key.verify(timestamp.encode() + body, bytes.fromhex(signature))
+        except (ValueError, self._bad_signature):
+            return False
+        return True
+
+    async def _post_initial_response(
+        self,
+        payload: dict,
+        interaction_id: str,
+        token: str,
+        files: list[typing.Any] | None = None,
+    ) -> None:
+        # interactions from the gateway, or ones the endpoint already gave up
+        # on, are answered the usual way
+        if (pending := self.pending.pop(str(interaction_id), None)) is None:
+            return await self._rest_initial_response(
+                payload, interaction_id, token, files=files
+            )
+
+        # files make it a multipart response, same as the request would be
+        pending.callback.set_result(self.bot.http._process_payload(payload, files))
+        await pending.sent
+        return None
+
+    async def _ensure_guild(self, guild_id: int) -> None:
+        fetched = self.guilds_fetched.get(guild_id)
+        if fetched is not None and time.monotonic() - fetched < self.guild_ttl:
+            return
+
+        # the rest api has the guild's roles, but not the bot's own member
+        force = fetched is not None
+        guild = await self.bot.fetch_guild(guild_id, force=force)
+        await guild.fetch_member(self.bot.user.id, force=force)
+        if force:
+            self.bot.permission_cache.invalidate_guild(guild_id)
+        self.guilds_fetched[guild_id] = time.monotonic()
+
+    async def _dispatch(self, data: dict) -> None:
+        try:
+            if (
+                self.fetch_guilds
+                and (guild_id := data.get("guild_id"))
+                and not self.bot.sharding.owns(guild_id)
+            ):
+                await self._ensure_guild(int(guild_id))
+        except Exception as e:
+            self.bot.dispatch(ipy.events.Error(source="interaction guild", error=e))
+
+        # the same path the gateway takes, so it's counted the same way
+        if processor := self.bot.processors.get("raw_interaction_create"):
+            await processor(
+                ipy.events.RawGatewayEvent(data, override_name="raw_interaction_create")
+            )
+
+    async def _respond(
+        self, request: web.Request, body: dict | FormData
+    ) -> web.Response:
+        if isinstance(body, FormData):
+            response = web.Response(body=body())
+        else:
+            response = web.Response(
+                body=orjson.dumps(body), content_type="application/json"
+            )
+        await response.prepare(request)
+        await response.write_eof()
+        return response
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        if not self.verify(
+            request.headers.get("X-Signature-Ed25519", ""),
+            request.headers.get("X-Signature-Timestamp", ""),
+            body,
+        ):
+            self.rejected += 1
+            return web.Response(status=401, text="invalid request signature")
+
+        data = orjson.loads(body)
+        if data["type"] == ipy.InteractionType.PING:
+            return web.Response(body=_PONG, content_type="application/json")
+
+        self.received += 1
+        interaction_id = str(data["id"])
+        pending = self.pending[interaction_id] = _PendingResponse()
+        self.bot.create_task(self._dispatch(data), name=f"interaction {interaction_id}")
+
+        try:
+            callback = await asyncio.wait_for(
+                asyncio.shield(pending.callback), self.response_timeout
+            )
+        except asyncio.TimeoutError:
+            # if the handler took it at the last moment, it's still sent
+            if self.pending.pop(interaction_id, None) is not None:
+                self.timed_out += 1
+                return web.Response(status=500, text="no response in time")
+            callback = pending.callback.result()
+
+        try:
+            response = await self._respond(request, callback)
+        except BaseException as e:
+            # the handler finds out the same way it would from a failed request
+            pending.sent.set_exception(
+                e
+                if isinstance(e, Exception)
+                else ConnectionResetError("The response couldn't be sent.")
+            )
+            raise
+        pending.sent.set_result(None)
+        self.answered += 1
+        return response
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(
+            "Receiving interactions at http://%s:%s%s.", self.host, self.port, self.path
+        )
+
+    async def close(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+        # handlers still waiting on their response won't get one now
+        for pending in self.pending.values():
+            with contextlib.suppress(asyncio.InvalidStateError):
+                pending.callback.cancel()
+        self.pending.clear()
@@ -0,0 +1,161 @@
+import collections
+import functools
+import time
+
+import interactions as ipy
+import typing_extensions as typing
+
+import common.tracing as tracing
+
+if typing.TYPE_CHECKING:
+    from interactions.api.http.route import Route
+
+__all__ = ("LatencyMonitor", "LatencyStats", "Samples", "summarize")
+
+
+class LatencyStats(typing.NamedTuple):
+    count: int
+    p50: float
+    p95: float
+    max: float
+
+
+def summarize(values: list[float]) -> LatencyStats | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return LatencyStats(
+        len(values),
+        values[(len(values) - 1) // 2],
+        values[min(len(values) - 1, int(len(values) * 0.95))],
+        values[-1],
+    )
+
+
+class Samples:
+    """A fixed-size ring buffer of timed samples."""
+
+    __slots__ = ("samples",)
+
+    def __init__(self, size: int) -> None:
+        self.samples: collections.deque[tuple[float, float]] = collections.deque(
+            maxlen=size
+        )
+
+    def add(self, value: float) -> None:
+        self.samples.append((time.monotonic(), value))
+
+    @property
+    def last(self) -> float | None:
+        return self.samples[-1][1] if self.samples else None
+
+    def window(self, seconds: float) -> list[float]:
+        cutoff = time.monotonic() - seconds
+        # samples are in time order, so the window is a suffix of the buffer
+        values: list[float] = []
+        for added, value in reversed(self.samples):
+            if added < cutoff:
+                break
+            values.append(value)
+        return values
+
+    def stats(self, seconds: float) -> LatencyStats | None:
+        return summarize(self.window(seconds))
+
+
+class _RecordingDeque(collections.deque):
+    # the gateway appends each heartbeat's round trip to a short deque of its
+    # own - this passes every one of them on as well
+    def __init__(
+        self, iterable: typing.Iterable, maxlen: int, samples: Samples
+    ) -> None:
+        super().__init__(iterable, maxlen)
+        self.record = samples.add
+
+    def append(self, value: float) -> None:
+        super().append(value)
+        self.record(value)
+
+
+class LatencyMonitor:
+    """
+    Keeps recent heartbeat and REST round trip times, and connection events.
+
+    Heartbeats show how long Discord's gateway takes to answer, while REST
+    times are per route and include any time spent waiting on rate limits -
+    between the two, slowness on Discord's end can be told apart from ours.
+    """
+
+    def __init__(
+        self,
+        bot: ipy.Client,
+        *,
+        heartbeat_size: int = 512,
+        route_size: int = 256,
+        event_size: int = 20,
+    ) -> None:
+        self.bot = bot
+        self.heartbeats = Samples(heartbeat_size)
+        self.route_size = route_size
+        # keyed by route template (like "GET /channels/{channel_id}"), so the
+        # number of routes stays small
+        self.routes: dict[str, Samples] = {}
+        self.events: collections.deque[tuple[float, str]] = collections.deque(
+            maxlen=event_size
+        )
+
+        bot.http.request = self._timed(bot.http.request)
+
+    def _timed(
+        self, request: typing.Callable[..., typing.Awaitable[typing.Any]]
+    ) -> typing.Callable[..., typing.Awaitable[typing.Any]]:
+        @functools.wraps(request)
+        async def wrapper(
+            route: "Route", *args: typing.Any, **kwargs: typing.Any
+        ) -> typing.Any:
+            # interaction responses and followups are both sent to these
+            category = (
+                "response"
+                if route.path.startswith(("/interactions/", "/webhooks/"))
+                else "rest"
+            )
+            start = time.perf_counter()
+            try:
+                with tracing.span(route.endpoint, category):
+                    return await request(route, *args, **kwargs)
+            finally:
+                if (samples := self.routes.get(route.endpoint)) is None:
+                    samples = self.routes[route.endpoint] = Samples(self.route_size)
+                samples.add(time.perf_counter() - start)
+
+        return wrapper
+
+    def connected(self, kind: str) -> None:
+        """Records a connection event, and starts watching the new gateway."""
+        self.events.append((time.time(), kind))
+
+        # each reconnect makes a new gateway client with a new deque - and a
+        # sharded client has one connection per shard
+        for state in getattr(self.bot, "shards", [self.bot._connection_state]):
+            gateway = state.gateway
+            if gateway and not isinstance(gateway._latency, _RecordingDeque):
+                gateway._latency = _RecordingDeque(
+                    gateway._latency, gateway._latency.maxlen, self.heartbeats
+                )
+
+    def rest_stats(self, seconds: float) -> LatencyStats | None:
+        """Gets stats over every route together."""
+        return summarize(
+            [
+                value
+                for samples in self.routes.values()
+                for value in samples.window(seconds)
+            ]
+        )
+
+    def route_stats(self, seconds: float) -> dict[str, LatencyStats]:
+        return {
+            endpoint: stats
+            for endpoint, samples in self.routes.items()
+            if (stats := samples.stats(seconds))
+        }
@@ -0,0 +1,214 @@
+import bisect
+import collections
+import functools
+import logging
+import mmap
+import os
+import re
+import time
+from pathlib import Path
+
+import typing_extensions as typing
+
+__all__ = ("LEVELS", "LogIndex", "LogRecord", "LogSearch")
+
+# matches the formatter main sets up: asctime:levelname:name: message
+_RECORD_START = re.compile(
+    rb"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d{3}:([A-Z]+):([^:\n]*): ", re.MULTILINE
+)
+LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+    "CRITICAL": logging.CRITICAL,
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_time(raw: bytes) -> float:
+    # asctime is in local time, as is mktime - lots of records share a second,
+    # so parsing is cached
+    return time.mktime(time.strptime(raw.decode(), "%Y-%m-%d %H:%M:%S"))
+
+
+class LogRecord(typing.NamedTuple):
+    timestamp: float
+    level: str
+    logger: str
+    # the whole record, including any traceback lines after the first
+    text: str
+
+
+class LogIndex:
+    """
+    A sparse index of where in a log file each stretch of time starts.
+
+    Roughly every stride bytes, the offset and time of the next record is
+    noted down, so a search for a time range only has to read the part of
+    the file between two index points. The index is brought up to date
+    before each search by reading only what was appended since the last one,
+    and rebuilt if the file was replaced or truncated.
+    """
+
+    def __init__(self, path: Path, *, stride: int = 256 * 1024) -> None:
+        self.path = path
+        self.stride = stride
+        self.times: list[float] = []
+        self.offsets: list[int] = []
+        # where to look for the next index point from
+        self.indexed = 0
+        self.size = 0
+        self._identity: tuple[int, int] | None = None
+
+    def update(self, mapped: mmap.mmap, stat: os.stat_result) -> None:
+        identity = (stat.st_dev, stat.st_ino)
+        if identity != self._identity or stat.st_size < self.size:
+            self.times.clear()
+            self.offsets.clear()
+            self.indexed = 0
+            self._identity = identity
+        self.size = stat.st_size
+
+        # a record that's only partly written won't match yet, so it's picked
+        # up next time from the same place
+        while self.indexed < stat.st_size and (
+            match := _RECORD_START.search(mapped, self.indexed)
+        ):
+            self.times.append(_parse_time(match[1]))
+            self.offsets.append(match.start())
+            self.indexed = match.start() + self.stride
+
+    def span(self, since: float | None, until: float | None, size: int) -> range:
+        """Gets the bytes that could hold records between the two times."""
+        start = 0
+        if since is not None and (index := bisect.bisect_left(self.times, since)):
+            # records before the first index point past since may still match
+            start = self.offsets[index - 1]
+
+        end = size
+        if until is not None and (
+            (index := bisect.bisect_right(self.times, until)) < len(self.times)
+        ):
+            end = self.offsets[index]
+        return range(start, end)
+
+
+class LogSearch:
+    """Searches a log file and its rotated copies through their indexes."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.indexes: dict[Path, LogIndex] = {}
+        self.bytes_read = 0
+
+    def files(self) -> list[Path]:
+        # rotated copies are named like discord.log.1, with higher numbers
+        # being older - compressed ones are skipped
+        rotated = [
+            path
+            for path in self.path.parent.glob(f"{self.path.name}.*")
+            if path.suffix.removeprefix(".").isdigit()
+        ]
+        rotated.sort(key=lambda path: int(path.suffix.removeprefix(".")), reverse=True)
+        return [*rotated, self.path] if self.path.exists() else rotated
+
+    def _search_file(
+        self,
+        path: Path,
+        results: collections.deque[LogRecord],
+        since: float | None,
+        until: float | None,
+        **filters: typing.Any,
+    ) -> None:
+        if not (stat := path.stat()).st_size:
+            return
+        # a file last written before the range starts can't have anything
+        if since is not None and stat.st_mtime < since:
+            return
+
+        with (
+            path.open("rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+        ):
+            index = self.indexes.setdefault(path, LogIndex(path))
+            index.update(mapped, stat)
+            span = index.span(since, until, stat.st_size)
+            self.bytes_read += len(span)
+
+            # each record runs up to where the next one starts
+            previous = None
+            for match in _RECORD_START.finditer(mapped, span.start, span.stop):
+                if previous and not self._check(
+                    previous, mapped, match.start(), results, since, until, **filters
+                ):
+                    return
+                previous = match
+            if previous:
+                self._check(
+                    previous, mapped, span.stop, results, since, until, **filters
+                )
+
+    @staticmethod
+    def _check(
+        match: re.Match[bytes],
+        mapped: mmap.mmap,
+        end: int,
+        results: collections.deque[LogRecord],
+        since: float | None,
+        until: float | None,
+        *,
+        level: int,
+        logger: str | None,
+        pattern: re.Pattern[str] | None,
+    ) -> bool:
+        # returns False once records are past the end of the range
+        timestamp = _parse_time(match[1])
+        if until is not None and timestamp > until:
+            return False
+        if since is not None and timestamp < since:
+            return True
+
+        name = match[3].decode()
+        if LEVELS.get(match[2].decode(), 0) < level or (
+            logger and name != logger and not name.startswith(f"{logger}.")
+        ):
+            return True
+
+        text = mapped[match.start() : end].decode(errors="replace").rstrip()
+        if not pattern or pattern.search(text):
+            results.append(LogRecord(timestamp, match[2].decode(), name, text))
+        return True
+
+    def search(
+        self,
+        *,
+        since: float | None = None,
+        until: float | None = None,
+        level: int = logging.NOTSET,
+        logger: str | None = None,
+        pattern: re.Pattern[str] | None = None,
+        limit: int = 500,
+    ) -> list[LogRecord]:
+        """
+        Finds matching records, oldest first, keeping only the newest ones.
+
+        Blocks, so should be run in a thread.
+        """
+        results: collections.deque[LogRecord] = collections.deque(maxlen=limit)
+        files = self.files()
+        for path in files:
+            self._search_file(
+                path,
+                results,
+                since,
+                until,
+                level=level,
+                logger=logger,
+                pattern=pattern,
+            )
+
+        # forget files that were rotated away
+        for path in self.indexes.keys() - set(files):
+            del self.indexes[path]
+        return list(results)
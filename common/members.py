@@ -0,0 +1,293 @@
+import array
+import bisect
+import collections
+import collections.abc
+import random
+import time
+import tracemalloc
+
+import interactions as ipy
+import typing_extensions as typing
+
+__all__ = ("CompactMember", "CompactMemberStore", "benchmark")
+
+MemberKey: typing.TypeAlias = tuple[int, int]
+
+# bits of CompactMember.state
+_BOT = 1
+_DEAF = 2
+_MUTE = 4
+_PENDING = 8
+_PENDING_KNOWN = 16
+
+
+def _timestamp(value: typing.Any) -> float | None:
+    return value.timestamp() if isinstance(value, ipy.Timestamp) else None
+
+
+class CompactMember:
+    """
+    The parts of a member worth keeping, in as little memory as possible.
+
+    Role ids are kept sorted in a packed array, so role checks are a binary
+    search, and everything else is either a number or a short string.
+    """
+
+    __slots__ = (
+        "avatar",
+        "communication_disabled_until",
+        "flags",
+        "guild_id",
+        "id",
+        "joined_at",
+        "nick",
+        "premium_since",
+        "role_ids",
+        "state",
+    )
+
+    def __init__(
+        self,
+        user_id: int,
+        guild_id: int,
+        role_ids: typing.Iterable[int],
+        *,
+        nick: str | None = None,
+        avatar: str | None = None,
+        joined_at: float | None = None,
+        premium_since: float | None = None,
+        communication_disabled_until: float | None = None,
+        flags: int = 0,
+        state: int = 0,
+    ) -> None:
+        self.id = user_id
+        self.guild_id = guild_id
+        self.role_ids = array.array("Q", sorted(role_ids))
+        self.nick = nick
+        self.avatar = avatar
+        self.joined_at = joined_at
+        self.premium_since = premium_since
+        self.communication_disabled_until = communication_disabled_until
+        self.flags = flags
+        self.state = state
+
+    @classmethod
+    def from_member(cls, member: ipy.Member) -> typing.Self:
+        state = (
+            (_BOT if member.bot else 0)
+            | (_DEAF if member.deaf else 0)
+            | (_MUTE if member.mute else 0)
+            | (_PENDING if member.pending else 0)
+            | (_PENDING_KNOWN if member.pending is not None else 0)
+        )
+        return cls(
+            int(member.id),
+            int(member._guild_id),
+            (int(role_id) for role_id in member._role_ids),
+            nick=member.nick,
+            avatar=member.guild_avatar.hash if member.guild_avatar else None,
+            joined_at=_timestamp(member.joined_at),
+            premium_since=_timestamp(member.premium_since),
+            communication_disabled_until=_timestamp(
+                member.communication_disabled_until
+            ),
+            flags=int(member.flags),
+            state=state,
+        )
+
+    def to_member(self, client: ipy.Client) -> ipy.Member:
+        avatar = None
+        if self.avatar:
+            avatar = ipy.Asset.from_path_hash(
+                client,
+                f"guilds/{self.guild_id}/users/{self.id}/avatars/{{}}",
+                self.avatar,
+            )
+
+        return ipy.Member(
+            client=client,
+            id=self.id,
+            guild_id=self.guild_id,
+            role_ids=list(self.role_ids),
+            nick=self.nick,
+            guild_avatar=avatar,
+            joined_at=self.joined_at,
+            premium_since=self.premium_since,
+            communication_disabled_until=self.communication_disabled_until,
+            flags=self.flags,
+            bot=bool(self.state & _BOT),
+            deaf=bool(self.state & _DEAF),
+            mute=bool(self.state & _MUTE),
+            pending=(
+                bool(self.state & _PENDING) if self.state & _PENDING_KNOWN else None
+            ),
+        )
+
+    def has_role(self, *role_ids: ipy.Snowflake_Type) -> bool:
+        # same as Member.has_role - every role has to be there
+        for role_id in role_ids:
+            role_id = int(role_id)
+            index = bisect.bisect_left(self.role_ids, role_id)
+            if index == len(self.role_ids) or self.role_ids[index] != role_id:
+                return False
+        return True
+
+    def guild_permissions(self, guild: ipy.Guild) -> ipy.Permissions:
+        """Works out permissions like Member.guild_permissions does."""
+        if guild._owner_id == self.id:
+            return ipy.Permissions.ALL
+
+        # looking up the member's roles directly, rather than going through
+        # every role in the guild
+        permissions = guild.default_role.permissions
+        for role_id in self.role_ids:
+            if role := guild._client.cache.get_role(role_id):
+                permissions |= role.permissions
+
+        if ipy.Permissions.ADMINISTRATOR in permissions:
+            return ipy.Permissions.ALL
+        return permissions
+
+
+class CompactMemberStore(collections.abc.MutableMapping[MemberKey, ipy.Member]):
+    """
+    Stands in for the client's member cache, keeping most members compact.
+
+    The most recently used members are kept as full objects, so updates made
+    to them by the client stick and back-to-back lookups are cheap. Past
+    that, members are packed into CompactMember records and rebuilt as full
+    members when they're next looked up.
+    """
+
+    def __init__(self, client: ipy.Client, *, hot_size: int = 256) -> None:
+        self.client = client
+        self.hot_size = hot_size
+        self.hot: collections.OrderedDict[MemberKey, ipy.Member] = (
+            collections.OrderedDict()
+        )
+        self.records: dict[MemberKey, CompactMember] = {}
+        self.rebuilds = 0
+
+    def _promote(self, key: MemberKey, member: ipy.Member) -> None:
+        self.hot[key] = member
+        self.hot.move_to_end(key)
+        while len(self.hot) > self.hot_size:
+            old_key, old_member = self.hot.popitem(last=False)
+            self.records[old_key] = CompactMember.from_member(old_member)
+
+    def __getitem__(self, key: MemberKey) -> ipy.Member:
+        if (member := self.hot.get(key)) is not None:
+            self.hot.move_to_end(key)
+            return member
+
+        member = self.records.pop(key).to_member(self.client)
+        self.rebuilds += 1
+        self._promote(key, member)
+        return member
+
+    def __setitem__(self, key: MemberKey, member: ipy.Member) -> None:
+        self.records.pop(key, None)
+        self._promote(key, member)
+
+    def __delitem__(self, key: MemberKey) -> None:
+        if self.hot.pop(key, None) is None:
+            del self.records[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.hot or key in self.records
+
+    def __iter__(self) -> typing.Iterator[MemberKey]:
+        yield from list(self.hot)
+        yield from list(self.records)
+
+    def __len__(self) -> int:
+        return len(self.hot) + len(self.records)
+
+    def has_role(
+        self, guild_id: ipy.Snowflake_Type, user_id: ipy.Snowflake_Type, role_id: int
+    ) -> bool | None:
+        """Checks a cached member's roles without rebuilding them."""
+        key = (int(guild_id), int(user_id))
+        if (member := self.hot.get(key)) is not None:
+            return member.has_role(role_id)
+        if record := self.records.get(key):
+            return record.has_role(role_id)
+        return None
+
+
+def _deep_size(build: typing.Callable[[], typing.Any]) -> tuple[typing.Any, int]:
+    # tracemalloc catches everything the objects allocate, which getsizeof
+    # doesn't, like the contents of their lists and timestamps
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        value = build()
+        return value, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+def _time_per_call(
+    func: typing.Callable[[typing.Any], typing.Any], items: list[typing.Any]
+) -> float:
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    return (time.perf_counter() - start) / len(items)
+
+
+def benchmark(
+    client: ipy.Client, guild: ipy.Guild, count: int
+) -> list[list[typing.Any]]:
+    """
+    Compares full and compact members made up from the guild's roles.
+
+    Blocks for a while with big counts, so should be run in a thread. Gives
+    rows of measurement, full member and compact member.
+    """
+    role_ids = [int(role.id) for role in guild.roles if role.id != guild.id]
+    now = time.time()
+
+    full, full_size = _deep_size(
+        lambda: {
+            (int(guild.id), int(guild.id) + index): ipy.Member(
+                client=client,
+                id=int(guild.id) + index,
+                guild_id=guild.id,
+                role_ids=random.sample(role_ids, min(len(role_ids), 5)),
+                joined_at=now,
+            )
+            for index in range(1, count + 1)
+        }
+    )
+    compact, compact_size = _deep_size(
+        lambda: {key: CompactMember.from_member(m) for key, m in full.items()}
+    )
+
+    check_role = random.choice(role_ids) if role_ids else 0  # noqa: S311
+    members = list(full.values())
+    records = list(compact.values())
+
+    return [
+        ["Bytes/member", f"{full_size / count:.0f}", f"{compact_size / count:.0f}"],
+        [
+            "has_role",
+            f"{_time_per_call(lambda m: m.has_role(check_role), members) * 1e9:.0f}ns",
+            f"{_time_per_call(lambda m: m.has_role(check_role), records) * 1e9:.0f}ns",
+        ],
+        [
+            "Permissions",
+            f"{_time_per_call(lambda m: m.guild_permissions, members) * 1e6:.2f}us",
+            (
+                f"{_time_per_call(lambda m: m.guild_permissions(guild), records) * 1e6:.2f}us"
+            ),
+        ],
+        [
+            "Rebuild",
+            "-",
+            f"{_time_per_call(lambda m: m.to_member(client), records) * 1e6:.2f}us",
+        ],
+    ]
@@ -0,0 +1,98 @@
+import asyncio
+import collections
+import gc
+import linecache
+import tracemalloc
+
+import typing_extensions as typing
+
+__all__ = ("MemoryProfiler",)
+
+
+class MemoryProfiler:
+    """
+    Wraps tracemalloc to find out where memory is going.
+
+    Snapshots are named and kept until they're dropped or pushed out by newer
+    ones. Taking, comparing and formatting snapshots is slow on a big heap,
+    so all of it happens on a worker thread.
+    """
+
+    def __init__(self, *, max_snapshots: int = 5) -> None:
+        self.max_snapshots = max_snapshots
+        self.snapshots: collections.OrderedDict[str, tracemalloc.Snapshot] = (
+            collections.OrderedDict()
+        )
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> None:
+        tracemalloc.start(frames)
+
+    def stop(self) -> None:
+        # snapshots only make sense next to others taken in the same session
+        tracemalloc.stop()
+        self.snapshots.clear()
+
+    @staticmethod
+    def _take() -> tracemalloc.Snapshot:
+        snapshot = tracemalloc.take_snapshot()
+        # the profiler's own allocations would drown everything else out
+        return snapshot.filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, linecache.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            )
+        )
+
+    async def snapshot(self, name: str) -> tracemalloc.Snapshot:
+        snapshot = await asyncio.to_thread(self._take)
+        self.snapshots.pop(name, None)
+        self.snapshots[name] = snapshot
+        while len(self.snapshots) > self.max_snapshots:
+            self.snapshots.popitem(last=False)
+        return snapshot
+
+    @staticmethod
+    def _format_stat(stat: tracemalloc.StatisticDiff | tracemalloc.Statistic) -> str:
+        frame = stat.traceback[0]
+        line = f"{frame.filename}:{frame.lineno}: {stat.size / 1024:.1f} KiB"
+        if isinstance(stat, tracemalloc.StatisticDiff):
+            line += f" ({stat.size_diff / 1024:+.1f} KiB, {stat.count_diff:+} blocks)"
+        else:
+            line += f" ({stat.count} blocks)"
+        return line
+
+    def _report(self, old: str | None, new: str, limit: int) -> str:
+        snapshot = self.snapshots[new]
+        if old is None:
+            stats: list[typing.Any] = snapshot.statistics("lineno")
+            total = sum(stat.size for stat in stats)
+            header = f"Top allocators in {new} ({total / 1024:.1f} KiB traced)"
+        else:
+            stats = snapshot.compare_to(self.snapshots[old], "lineno")
+            change = sum(stat.size_diff for stat in stats)
+            header = f"Top changes from {old} to {new} ({change / 1024:+.1f} KiB)"
+
+        lines = [self._format_stat(stat) for stat in stats[:limit]]
+        return "\n".join([header, "", *lines])
+
+    async def report(self, old: str | None, new: str, *, limit: int = 25) -> str:
+        """
+        Lists the top allocators in a snapshot, grouped by file and line.
+
+        Given an older snapshot, lists what changed the most since then instead.
+        """
+        return await asyncio.to_thread(self._report, old, new, limit)
+
+    @staticmethod
+    def _census(limit: int) -> list[tuple[str, int]]:
+        counts = collections.Counter(type(obj).__qualname__ for obj in gc.get_objects())
+        return counts.most_common(limit)
+
+    async def census(self, *, limit: int = 25) -> list[tuple[str, int]]:
+        """Counts the live objects the garbage collector knows about, by type."""
+        return await asyncio.to_thread(self._census, limit)
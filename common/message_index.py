@@ -0,0 +1,202 @@
+import asyncio
+import collections
+import hashlib
+import logging
+from pathlib import Path
+
+import interactions as ipy
+import orjson
+import typing_extensions as typing
+
+__all__ = ("IndexedMessage", "MessageIndex", "payload_hash")
+
+logger = logging.getLogger("oscbot")
+
+# keys discord adds to embeds on its own - they're dropped before hashing so an
+# embed taken from a message hashes the same as the payload that created it
+_READ_ONLY_EMBED_KEYS = frozenset(
+    {
+        "type",
+        "proxy_url",
+        "proxy_icon_url",
+        "height",
+        "width",
+        "provider",
+        "video",
+        "content_scan_version",
+        "flags",
+    }
+)
+
+
+def _strip_read_only(value: typing.Any) -> typing.Any:
+    if isinstance(value, dict):
+        return {
+            k: _strip_read_only(v)
+            for k, v in value.items()
+            if k not in _READ_ONLY_EMBED_KEYS and v is not None
+        }
+    if isinstance(value, list):
+        return [_strip_read_only(v) for v in value]
+    return value
+
+
+def payload_hash(value: typing.Any) -> int:
+    # python's hash() is randomized per process, which would break persistence
+    data = orjson.dumps(_strip_read_only(value), option=orjson.OPT_SORT_KEYS)
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+class IndexedMessage:
+    __slots__ = (
+        "channel_id",
+        "content",
+        "content_hash",
+        "embed_hash",
+        "embeds",
+        "message_id",
+    )
+
+    def __init__(
+        self,
+        message_id: int,
+        channel_id: int,
+        content: str | None,
+        embeds: list[dict],
+    ) -> None:
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.content = content
+        self.embeds = embeds
+        self.content_hash = payload_hash(content or "")
+        self.embed_hash = payload_hash(embeds)
+
+    def to_list(self) -> list:
+        return [self.message_id, self.channel_id, self.content, self.embeds]
+
+
+class MessageIndex:
+    """
+    A bounded, persistent index of messages the bot has sent or edited.
+
+    Entries hold the last payload the bot posted to a message along with its
+    hashes, so edit handlers can skip fetching the message and drop edits that
+    wouldn't change anything. Message updates from the gateway keep entries in
+    line with edits made elsewhere.
+
+    When other processes share the guilds, each has its own index and may not
+    see the others' edits at all, so entries can't be trusted to say an edit
+    changes nothing - they're still used to find a message's channel.
+    """
+
+    def __init__(
+        self, path: Path, *, max_size: int = 2000, shared: bool = False
+    ) -> None:
+        self.path = path
+        self.max_size = max_size
+        self.shared = shared
+        self.messages: collections.OrderedDict[int, IndexedMessage] = (
+            collections.OrderedDict()
+        )
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def get(self, message_id: int) -> IndexedMessage | None:
+        if entry := self.messages.get(message_id):
+            self.messages.move_to_end(message_id)
+        return entry
+
+    def record(
+        self,
+        message_id: int,
+        channel_id: int,
+        *,
+        content: str | None = None,
+        embeds: list[dict] | None = None,
+    ) -> IndexedMessage:
+        entry = IndexedMessage(message_id, channel_id, content, embeds or [])
+        self.messages[message_id] = entry
+        self.messages.move_to_end(message_id)
+
+        while len(self.messages) > self.max_size:
+            self.messages.popitem(last=False)
+
+        self.dirty = True
+        return entry
+
+    def record_message(
+        self, message: ipy.Message, *, embeds: list[dict] | None = None
+    ) -> IndexedMessage:
+        # embeds can be passed in so the payload that was actually sent is stored,
+        # rather than discord's version of it
+        if embeds is None:
+            embeds = [embed.to_dict() for embed in message.embeds]
+        return self.record(
+            int(message.id),
+            int(message._channel_id),
+            content=message.content,
+            embeds=embeds,
+        )
+
+    def update_message(self, message: ipy.Message) -> IndexedMessage | None:
+        # only messages already indexed are kept, and ones whose payload still
+        # hashes the same keep what the bot sent rather than discord's version
+        if not (entry := self.messages.get(int(message.id))):
+            return None
+
+        embeds = [embed.to_dict() for embed in message.embeds]
+        if entry.content_hash == payload_hash(
+            message.content or ""
+        ) and entry.embed_hash == payload_hash(embeds):
+            return entry
+        return self.record_message(message, embeds=embeds)
+
+    def is_unchanged(
+        self,
+        message_id: int,
+        *,
+        content: str | None = None,
+        embeds: list[dict] | None = None,
+    ) -> bool:
+        if self.shared or not (entry := self.get(message_id)):
+            return False
+        if content is not None and entry.content_hash != payload_hash(content):
+            return False
+        return embeds is None or entry.embed_hash == payload_hash(embeds)
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+
+        # a broken file (from being killed mid-save, say) only costs the index
+        try:
+            entries = [
+                IndexedMessage(message_id, channel_id, content, embeds)
+                for message_id, channel_id, content, embeds in orjson.loads(
+                    self.path.read_bytes()
+                )[-self.max_size :]
+            ]
+        except (ValueError, TypeError):
+            logger.warning("Could not read the message index, starting empty.")
+            return
+
+        for entry in entries:
+            self.messages[entry.message_id] = entry
+
+    def _write(self, data: bytes) -> None:
+        temp_path = self.path.with_suffix(".tmp")
+        temp_path.write_bytes(data)
+        temp_path.replace(self.path)
+
+    async def load(self) -> None:
+        await asyncio.to_thread(self._load)
+
+    async def save(self) -> None:
+        if not self.dirty:
+            return
+
+        data = orjson.dumps([entry.to_list() for entry in self.messages.values()])
+        self.dirty = False
+        await asyncio.to_thread(self._write, data)
@@ -0,0 +1,56 @@
+import collections
+
+import interactions as ipy
+
+__all__ = ("PermissionCache",)
+
+
+class PermissionCache:
+    """
+    Caches the resolved guild permissions of recently seen members.
+
+    Working out a member's permissions means matching their roles against every
+    role in the guild and combining the results, which adds up when several
+    checks run per command. Entries also remember the role ids they were
+    resolved from, so a member whose roles changed without a member update
+    reaching us (the bot doesn't ask for the members intent) is resolved again.
+    Only the most recently used members are kept - the rest are resolved again
+    if they come back.
+    """
+
+    def __init__(self, *, max_size: int = 2000) -> None:
+        self.max_size = max_size
+        # keyed by (guild id, member id), least recently used first
+        self.entries: collections.OrderedDict[
+            tuple[int, int], tuple[tuple[int, ...], int]
+        ] = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, member: ipy.Member) -> ipy.Permissions:
+        key = (int(member._guild_id), int(member.id))
+        role_ids = tuple(member._role_ids)
+
+        if (entry := self.entries.get(key)) and entry[0] == role_ids:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return ipy.Permissions(entry[1])
+
+        self.misses += 1
+        permissions = member.guild_permissions
+        self.entries[key] = (role_ids, int(permissions))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return permissions
+
+    def invalidate_member(self, guild_id: int, member_id: int) -> None:
+        self.entries.pop((guild_id, member_id), None)
+
+    def invalidate_guild(self, guild_id: int) -> None:
+        # role changes can affect anyone in the guild
+        for key in [key for key in self.entries if key[0] == guild_id]:
+            del self.entries[key]
@@ -0,0 +1,140 @@
+import interactions as ipy
+import typing_extensions as typing
+from interactions.ext import prefixed_commands as prefixed
+
+__all__ = ("CommandTrie", "FilteredPrefixedManager")
+
+# marks the end of a command name in the trie
+_END = ""
+
+
+class CommandTrie:
+    """
+    A trie of command names behind a small set of prefixes.
+
+    Deciding if a message could be a command only looks at the first few
+    characters, no matter how long the message is.
+    """
+
+    def __init__(
+        self, prefixes: typing.Iterable[str], names: typing.Iterable[str]
+    ) -> None:
+        # longest first, so a prefix that starts another doesn't shadow it
+        self.prefixes = tuple(sorted(set(prefixes), key=len, reverse=True))
+        self.first_chars = frozenset(p[0] for p in self.prefixes if p)
+        self.root: dict[str, dict] = {}
+
+        for name in names:
+            node = self.root
+            for char in name:
+                node = node.setdefault(char, {})
+            node[_END] = {}
+
+    def could_be_command(self, content: str) -> bool:
+        # nearly every message is rejected by this first check
+        if not content or content[0] not in self.first_chars:
+            return False
+
+        for prefix in self.prefixes:
+            if content.startswith(prefix) and self._matches_name(content, len(prefix)):
+                return True
+        return False
+
+    def _matches_name(self, content: str, index: int) -> bool:
+        # the prefixed manager strips whitespace between the prefix and the name
+        length = len(content)
+        while index < length and content[index].isspace():
+            index += 1
+
+        node = self.root
+        while index < length and not content[index].isspace():
+            if not (node := node.get(content[index])):
+                return False
+            index += 1
+
+        return _END in node
+
+
+class FilteredPrefixedManager(prefixed.PrefixedManager):
+    """
+    A prefixed command manager that drops messages that can't be commands early.
+
+    With the message content intent, the manager otherwise looks up or waits
+    for the full message object of every message sent anywhere, just to find
+    out it doesn't start with a prefix.
+    """
+
+    def __init__(self, client: ipy.Client, **kwargs: typing.Any) -> None:
+        self.accepted = 0
+        self.dropped = 0
+        self._trie: CommandTrie | None = None
+        super().__init__(client, **kwargs)
+
+        # a command's trace only starts once it's been found, since nothing
+        # would end one for a message that turns out not to be a command
+        self._pre_run_callback = client.pre_run_callback
+        client.pre_run_callback = self._begin_trace
+
+    async def _begin_trace(
+        self, ctx: ipy.BaseContext, *args: typing.Any, **kwargs: typing.Any
+    ) -> None:
+        # interaction commands go through here too, but already have a trace
+        if isinstance(ctx, prefixed.PrefixedContext):
+            # renamed to the command once it completes
+            self.client.tracer.begin("prefixed", ctx.message_id)
+        if self._pre_run_callback:
+            await self._pre_run_callback(ctx, *args, **kwargs)
+
+    def _static_prefixes(self) -> tuple[str, ...] | None:
+        if self.default_prefix:
+            return (
+                (self.default_prefix,)
+                if isinstance(self.default_prefix, str)
+                else tuple(self.default_prefix)
+            )
+        if self.generate_prefixes is prefixed.when_mentioned and self.client.user:
+            return (f"<@{self.client.user.id}> ", f"<@!{self.client.user.id}> ")
+
+        # custom prefix generators need the full message, so nothing can be
+        # filtered ahead of time
+        return None
+
+    def could_be_command(self, content: str | None) -> bool:
+        if self._trie is None:
+            if (prefixes := self._static_prefixes()) is None:
+                return True
+            self._trie = CommandTrie(prefixes, self.commands)
+
+        return self._trie.could_be_command(content or "")
+
+    def add_command(self, command: prefixed.PrefixedCommand) -> None:
+        super().add_command(command)
+        self._trie = None
+
+    def remove_command(
+        self, name: str, delete_parent_if_empty: bool = False
+    ) -> prefixed.PrefixedCommand | None:
+        command = super().remove_command(name, delete_parent_if_empty)
+        self._trie = None
+        return command
+
+    def _remove_cmd_and_aliases(self, name: str) -> None:
+        super()._remove_cmd_and_aliases(name)
+        self._trie = None
+
+    @ipy.listen("raw_message_create", is_default_listener=True)
+    async def _dispatch_prefixed_commands(
+        self, event: ipy.events.RawGatewayEvent
+    ) -> None:
+        data = event.data
+        # the manager ignores these too, but only after the trie would be walked
+        if (
+            data.get("webhook_id")
+            or data.get("author", {}).get("bot")
+            or not self.could_be_command(data.get("content"))
+        ):
+            self.dropped += 1
+            return
+
+        self.accepted += 1
+        await prefixed.PrefixedManager._dispatch_prefixed_commands.callback(self, event)
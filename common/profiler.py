@@ -0,0 +1,93 @@
+import collections
+import os
+import sys
+import time
+import types
+
+import typing_extensions as typing
+
+__all__ = ("ProfileResult", "SamplingProfiler")
+
+
+class ProfileResult(typing.NamedTuple):
+    samples: int
+    duration: float
+    # stacks are root first, joined with ; - the collapsed format flamegraph
+    # tools (flamegraph.pl, speedscope, inferno) read
+    stacks: collections.Counter[str]
+    # times each function was the innermost frame, and times it was anywhere
+    own: collections.Counter[str]
+    total: collections.Counter[str]
+
+    def collapsed(self) -> str:
+        return "\n".join(
+            f"{stack} {count}" for stack, count in self.stacks.most_common()
+        )
+
+
+def frame_label(frame: types.FrameType) -> str:
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's stack on a timer, from another thread.
+
+    Unlike cProfile, nothing is hooked into the profiled thread, so what
+    it costs is about the time taken to walk one stack per sample - cheap
+    enough to leave on a busy bot for a minute.
+    """
+
+    def __init__(self, thread_id: int, *, rate: float = 100) -> None:
+        self.thread_id = thread_id
+        self.interval = 1 / rate
+        self.running = False
+
+    def _sample(self, result: ProfileResult) -> None:
+        # _current_frames is the only way to see another thread's stack
+        if not (frame := sys._current_frames().get(self.thread_id)):
+            return
+
+        labels: list[str] = []
+        while frame:
+            labels.append(frame_label(frame))
+            frame = frame.f_back
+        labels.reverse()
+
+        result.stacks[";".join(labels)] += 1
+        result.own[labels[-1]] += 1
+        # recursion shouldn't count a function more than once per sample
+        result.total.update(set(labels))
+
+    def run(self, seconds: float) -> ProfileResult:
+        """Samples for the given time. Blocks, so should be run in a thread."""
+        result = ProfileResult(
+            0, 0.0, collections.Counter(), collections.Counter(), collections.Counter()
+        )
+        samples = 0
+        start = time.perf_counter()
+        deadline = start + seconds
+        next_sample = start
+        self.running = True
+
+        try:
+            while self.running and (now := time.perf_counter()) < deadline:
+                self._sample(result)
+                samples += 1
+                # scheduled from the start time, so slow samples don't make
+                # the rate drift
+                next_sample += self.interval
+                if (delay := next_sample - time.perf_counter()) > 0:
+                    time.sleep(delay)
+                elif next_sample < now:
+                    next_sample = now
+        finally:
+            self.running = False
+
+        return result._replace(samples=samples, duration=time.perf_counter() - start)
+
+    def stop(self) -> None:
+        self.running = False
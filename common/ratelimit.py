@@ -0,0 +1,107 @@
+import datetime
+import time
+
+import humanize
+import interactions as ipy
+import typing_extensions as typing
+
+import common.utils as utils
+
+__all__ = ("BucketSpec", "InteractionRateLimiter")
+
+
+class BucketSpec(typing.NamedTuple):
+    # a full bucket allows `capacity` uses at once, and refills over `per` seconds
+    capacity: int
+    per: float
+
+    @property
+    def interval(self) -> float:
+        return self.per / self.capacity
+
+    @property
+    def burst(self) -> float:
+        return self.per - self.interval
+
+
+class InteractionRateLimiter:
+    """
+    Per-user and per-guild token buckets for component and modal handlers.
+
+    Each bucket is stored as a single float: the time it'll next be full
+    (a GCRA, which behaves the same as a token bucket). Buckets that have
+    refilled completely hold no information, so they're swept out
+    periodically.
+    """
+
+    def __init__(
+        self,
+        *,
+        user: BucketSpec = BucketSpec(5, 10),
+        guild: BucketSpec = BucketSpec(50, 10),
+        sweep_interval: float = 60.0,
+    ) -> None:
+        self.default_limits = (user, guild)
+        self.limits: dict[str, tuple[BucketSpec, BucketSpec]] = {}
+        self.buckets: dict[tuple[str, bool, int], float] = {}
+        self.rejected: dict[str, int] = {}
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def configure(
+        self,
+        prefix: str,
+        *,
+        user: BucketSpec | None = None,
+        guild: BucketSpec | None = None,
+    ) -> None:
+        default_user, default_guild = self.default_limits
+        self.limits[prefix] = (user or default_user, guild or default_guild)
+
+    def sweep(self, now: float) -> None:
+        self.buckets = {key: tat for key, tat in self.buckets.items() if tat > now}
+        self._next_sweep = now + self.sweep_interval
+
+    def acquire(self, prefix: str, user_id: int, guild_id: int | None) -> float:
+        """Takes a token from each bucket, or returns how long to wait if it can't."""
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self.sweep(now)
+
+        user_spec, guild_spec = self.limits.get(prefix, self.default_limits)
+        checks = [((prefix, False, user_id), user_spec)]
+        if guild_id:
+            checks.append(((prefix, True, guild_id), guild_spec))
+
+        # nothing is taken unless every bucket has room
+        retry_after = 0.0
+        for key, spec in checks:
+            tat = max(self.buckets.get(key, now), now)
+            retry_after = max(retry_after, tat - spec.burst - now)
+        if retry_after > 0:
+            self.rejected[prefix] = self.rejected.get(prefix, 0) + 1
+            return retry_after
+
+        for key, spec in checks:
+            self.buckets[key] = max(self.buckets.get(key, now), now) + spec.interval
+        return 0.0
+
+    async def limited(self, ctx: ipy.InteractionContext, prefix: str) -> bool:
+        """Checks the buckets for an interaction, replying if it's rate limited."""
+        retry_after = self.acquire(
+            prefix, int(ctx.author_id), int(ctx.guild_id) if ctx.guild_id else None
+        )
+        if not retry_after:
+            return False
+
+        # the reply is the interaction response itself, so this costs no other
+        # requests
+        delta_wait = datetime.timedelta(seconds=retry_after)
+        await ctx.send(
+            embeds=utils.error_embed_generate(
+                "You're doing that too fast! Try again in"
+                f" `{humanize.precisedelta(delta_wait, format='%0.1f')}`."
+            ),
+            ephemeral=True,
+        )
+        return True
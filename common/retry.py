@@ -0,0 +1,232 @@
+import asyncio
+import collections
+import random
+import time
+
+import aiohttp
+import interactions as ipy
+import typing_extensions as typing
+
+import common.tracing as tracing
+
+__all__ = (
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "RetryPolicy",
+    "RetryStats",
+    "classify",
+    "response_deadline",
+)
+
+T = typing.TypeVar("T")
+
+# the request never made it to discord, so even a send can be tried again
+UNSENT = "unsent"
+# discord or the connection had a problem, and it may or may not have acted
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+
+def classify(error: BaseException) -> str:
+    # the http client already retries 500, 502 and 504 itself, and rate limits
+    # never make it this far - what's left is mostly the connection failing
+    if isinstance(error, aiohttp.ClientConnectorError):
+        return UNSENT
+    if isinstance(
+        error,
+        aiohttp.ServerDisconnectedError
+        | aiohttp.ClientOSError
+        | aiohttp.ClientPayloadError
+        | asyncio.TimeoutError,
+    ):
+        return TRANSIENT
+    if isinstance(error, ipy.errors.HTTPException) and error.status >= 500:
+        return TRANSIENT
+    return PERMANENT
+
+
+def response_deadline(ctx: ipy.BaseContext | None) -> float | None:
+    """Gets the time an interaction has to be responded to by."""
+    if not isinstance(ctx, ipy.InteractionContext):
+        return None
+
+    created = ctx.id.created_at.timestamp()
+    # tokens last 15 minutes once there's been a response, but the first one
+    # has to come within 3 seconds - with some room left to send it
+    if ctx.responded or ctx.deferred:
+        return created + 15 * 60
+    return created + 2.5
+
+
+class CircuitOpenError(ipy.errors.BadArgument):
+    def __init__(self) -> None:
+        super().__init__(
+            "Discord isn't responding properly right now, so that wasn't tried."
+            " Please try again in a bit."
+        )
+
+
+class CircuitBreaker:
+    """
+    Stops requests from being tried while Discord looks to be down.
+
+    After enough transient failures in a row, the breaker opens and requests
+    fail straight away. Once the cooldown passes, one request is let through
+    to see if things are better - if it works, the breaker closes again.
+    """
+
+    def __init__(self, *, threshold: int = 5, cooldown: float = 30.0) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trips = 0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release(self) -> None:
+        # for calls that ended without saying anything about discord's health
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing:
+            # a failed probe opens the breaker again straight away
+            self.opened_at = time.monotonic()
+            self._probing = False
+        elif self.opened_at is None and self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            self.trips += 1
+
+
+class RetryStats:
+    __slots__ = ("calls", "gave_up", "recovered", "rejected", "retries")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.retries = 0
+        # calls that only worked after a retry
+        self.recovered = 0
+        self.gave_up = 0
+        # calls turned away by the open breaker
+        self.rejected = 0
+
+
+class RetryPolicy:
+    """
+    Retries REST calls that failed for reasons that might not happen again.
+
+    Idempotent calls are retried on any transient error, while others (like
+    sending a message) are only retried when the request never reached
+    Discord, so nothing gets sent twice. Retries back off exponentially with
+    full jitter, and stop early rather than miss an interaction's deadline.
+    Every call goes through one circuit breaker, so an outage doesn't get
+    several times the requests it would've had.
+    """
+
+    def __init__(
+        self,
+        *,
+        attempts: int = 3,
+        base_delay: float = 0.25,
+        max_delay: float = 2.0,
+        budget: float = 10.0,
+        breaker: CircuitBreaker | None = None,
+    ) -> None:
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.breaker = breaker or CircuitBreaker()
+        self.stats: collections.defaultdict[str, RetryStats] = collections.defaultdict(
+            RetryStats
+        )
+
+    def _deadline(self, ctx: ipy.BaseContext | None, started: float) -> float:
+        deadline = started + self.budget
+        if (response_by := response_deadline(ctx)) is not None:
+            deadline = min(deadline, response_by)
+        return deadline
+
+    async def run(
+        self,
+        name: str,
+        func: typing.Callable[[], typing.Awaitable[T]],
+        *,
+        idempotent: bool = True,
+        ctx: ipy.BaseContext | None = None,
+    ) -> T:
+        """
+        Calls func, retrying it if it fails in a way that could be retried.
+
+        The context is used to work out how long there is to respond by -
+        it's looked at again before each retry, since it may have been
+        deferred in the meantime.
+        """
+        stats = self.stats[name]
+        stats.calls += 1
+        started = time.time()
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                stats.rejected += 1
+                raise CircuitOpenError()
+
+            try:
+                result = await func()
+            except Exception as e:
+                kind = classify(e)
+                if kind == PERMANENT:
+                    # if discord answered, it's up even if the request was bad
+                    if isinstance(e, ipy.errors.HTTPException):
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.release()
+                    raise
+
+                self.breaker.record_failure()
+                delay = random.uniform(  # noqa: S311
+                    0, min(self.max_delay, self.base_delay * 2**attempt)
+                )
+                if (
+                    attempt == self.attempts - 1
+                    or not (idempotent or kind == UNSENT)
+                    or time.time() + delay >= self._deadline(ctx, started)
+                ):
+                    stats.gave_up += 1
+                    raise
+
+                stats.retries += 1
+                with tracing.span("backoff", "retry", operation=name, attempt=attempt):
+                    await asyncio.sleep(delay)
+                attempt += 1
+            except BaseException:
+                self.breaker.release()
+                raise
+            else:
+                self.breaker.record_success()
+                if attempt:
+                    stats.recovered += 1
+                return result
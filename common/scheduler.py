@@ -0,0 +1,240 @@
+import asyncio
+import contextlib
+import heapq
+import logging
+import time
+
+import interactions as ipy
+import orjson
+import typing_extensions as typing
+
+if typing.TYPE_CHECKING:
+    from common.db import Database, Statement
+
+__all__ = ("ScheduledMessage", "Scheduler")
+
+logger = logging.getLogger("oscbot")
+
+
+class ScheduledMessage:
+    __slots__ = ("author_id", "channel_id", "content", "due", "embed", "guild_id", "id")
+
+    def __init__(
+        self,
+        id: int,  # noqa: A002
+        guild_id: int,
+        channel_id: int,
+        author_id: int,
+        due: float,
+        content: str | None = None,
+        embed: dict | None = None,
+    ) -> None:
+        self.id = id
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.due = due
+        self.content = content
+        self.embed = embed
+
+    @classmethod
+    def from_row(cls, row: typing.Any) -> "typing.Self":
+        return cls(
+            row["id"],
+            row["guild_id"],
+            row["channel_id"],
+            row["author_id"],
+            row["due"],
+            row["content"],
+            orjson.loads(row["embed"]) if row["embed"] else None,
+        )
+
+
+class Scheduler:
+    """
+    Posts scheduled messages when they're due, using one timer for all of them.
+
+    Due times are kept in a min-heap, and a single task sleeps until the
+    earliest one (or until something earlier is added). Cancelled messages
+    are left in the heap and skipped when they come up. A message is only
+    posted by whoever deletes its row, so a re-read of the table (or another
+    process) can't send it twice.
+
+    When other processes share the database, the table is re-read every so
+    often to pick up what they added or cancelled. Only processes running
+    shards post messages - interactions workers just keep track of them.
+    """
+
+    def __init__(
+        self,
+        bot: ipy.Client,
+        *,
+        max_lateness: float = 6 * 60 * 60,
+        catch_up_limit: int = 5,
+        sync_interval: float = 15.0,
+    ) -> None:
+        self.bot = bot
+        # messages this late (say, after a long outage) are dropped, not posted
+        self.max_lateness = max_lateness
+        # how many due messages are posted before pausing for a second, so a
+        # backlog after a restart doesn't all go out at once
+        self.catch_up_limit = catch_up_limit
+        self.sync_interval = sync_interval
+        self.jobs: dict[int, ScheduledMessage] = {}
+        self._heap: list[tuple[float, int]] = []
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._sync_task: asyncio.Task | None = None
+        self._insert: Statement | None = None
+        self._delete: Statement | None = None
+        self._claim: Statement | None = None
+        # keeps a re-read of the table from undoing an add or cancel
+        self._lock = asyncio.Lock()
+
+    @property
+    def db(self) -> "Database":
+        return self.bot.db
+
+    @property
+    def posting(self) -> bool:
+        # interactions workers don't run shards, and never post
+        return bool(self.bot.sharding.shard_ids)
+
+    async def load(self) -> None:
+        """Rebuilds the heap from the database and starts the timer if needed."""
+        # the database only exists once the bot has started
+        self._insert = self.db.prepare(
+            "INSERT INTO scheduled_messages (id, guild_id, channel_id, author_id,"
+            " due, content, embed) VALUES ($1, $2, $3, $4, $5, $6, $7)"
+        )
+        self._delete = self.db.prepare("DELETE FROM scheduled_messages WHERE id = $1")
+        self._claim = self.db.prepare(
+            "DELETE FROM scheduled_messages WHERE id = $1 RETURNING id"
+        )
+
+        await self.sync()
+
+        if self.posting and (not self._task or self._task.done()):
+            self._task = self.bot.create_task(
+                self._run(), name="scheduler", group="scheduler", daemon=True
+            )
+        if self.bot.sharding.shared and (not self._sync_task or self._sync_task.done()):
+            self._sync_task = self.bot.create_task(
+                self._run_sync(), name="scheduler sync", group="scheduler", daemon=True
+            )
+
+    async def sync(self) -> None:
+        """Rebuilds the jobs and heap from the database."""
+        async with self._lock:
+            rows = await self.db.fetch("SELECT * FROM scheduled_messages")
+
+            # with several shard workers, each posts only its own guilds' messages
+            self.jobs = {
+                int(row["id"]): ScheduledMessage.from_row(row)
+                for row in rows
+                if not self.posting or self.bot.sharding.owns(row["guild_id"])
+            }
+            self._heap = [(job.due, job.id) for job in self.jobs.values()]
+            heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    async def _run_sync(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                self.bot.dispatch(ipy.events.Error(source="scheduler sync", error=e))
+
+    async def add(self, job: ScheduledMessage) -> None:
+        async with self._lock:
+            await self._insert.execute(
+                job.id,
+                job.guild_id,
+                job.channel_id,
+                job.author_id,
+                job.due,
+                job.content,
+                orjson.dumps(job.embed).decode() if job.embed else None,
+            )
+            self.jobs[job.id] = job
+            heapq.heappush(self._heap, (job.due, job.id))
+
+        # only matters if this is now the next message to go out
+        if self.posting and self._heap[0][1] == job.id:
+            self._wakeup.set()
+
+    async def cancel(self, job_id: int) -> ScheduledMessage | None:
+        async with self._lock:
+            if not (job := self.jobs.pop(job_id, None)):
+                return None
+            await self._delete.execute(job_id)
+        return job
+
+    def for_guild(self, guild_id: int) -> list[ScheduledMessage]:
+        return sorted(
+            (job for job in self.jobs.values() if job.guild_id == guild_id),
+            key=lambda job: job.due,
+        )
+
+    async def _sleep_until_next(self) -> None:
+        # drop cancelled entries so they don't cause early wakeups
+        while self._heap and self._heap[0][1] not in self.jobs:
+            heapq.heappop(self._heap)
+
+        timeout = max(self._heap[0][0] - time.time(), 0) if self._heap else None
+        self._wakeup.clear()
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+
+    def _pop_due(self) -> list[ScheduledMessage]:
+        now = time.time()
+        due: list[ScheduledMessage] = []
+
+        while self._heap and self._heap[0][0] <= now and len(due) < self.catch_up_limit:
+            _, job_id = heapq.heappop(self._heap)
+            if job := self.jobs.pop(job_id, None):
+                due.append(job)
+        return due
+
+    async def _post(self, job: ScheduledMessage) -> None:
+        # removed first, so a message that fails to send isn't retried forever -
+        # no row means it was cancelled, or is already being posted
+        if not await self._claim.execute_returning(job.id):
+            return
+
+        if time.time() - job.due > self.max_lateness:
+            logger.warning(
+                "Dropped scheduled message %s, which was due at %s.", job.id, job.due
+            )
+            return
+
+        channel = await self.bot.fetch_channel(job.channel_id)
+        if not isinstance(channel, ipy.MessageableMixin):
+            logger.warning(
+                "Dropped scheduled message %s, as its channel is gone.", job.id
+            )
+            return
+
+        msg = await channel.send(job.content, embed=job.embed)
+        self.bot.message_index.record_message(
+            msg, embeds=[job.embed] if job.embed else None
+        )
+
+    async def _run(self) -> None:
+        while True:
+            await self._sleep_until_next()
+
+            while due := self._pop_due():
+                for job in due:
+                    try:
+                        await self._post(job)
+                    except Exception as e:
+                        self.bot.dispatch(
+                            ipy.events.Error(
+                                source=f"scheduled message {job.id}", error=e
+                            )
+                        )
+
+                if len(due) == self.catch_up_limit:
+                    await asyncio.sleep(1)
@@ -0,0 +1,416 @@
+import asyncio
+import collections
+import contextlib
+import logging
+import math
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+
+import interactions as ipy
+import orjson
+import typing_extensions as typing
+
+__all__ = ("ShardPlan", "ShardStatus", "WorkerLauncher", "shard_for", "split_shards")
+
+logger = logging.getLogger("oscbot")
+
+
+def shard_for(guild_id: ipy.Snowflake_Type, total_shards: int) -> int:
+    # the same formula discord uses to pick a guild's shard
+    return (int(guild_id) >> 22) % total_shards
+
+
+def _status_path(directory: Path, worker: int) -> Path:
+    return directory / f"worker{worker}.json"
+
+
+def split_shards(total_shards: int, processes: int) -> list[list[int]]:
+    """Splits shards into runs of neighbouring ids, one per process."""
+    # the first few processes take one extra shard each if it doesn't divide
+    per_process, extra = divmod(total_shards, processes)
+    groups = []
+    start = 0
+    for index in range(processes):
+        end = start + per_process + (index < extra)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+
+class ShardPlan:
+    """
+    Which shards this process runs, out of how many.
+
+    SHARD_COUNT sets the total number of shards and SHARD_PROCESSES how many
+    worker processes they're spread over. The launcher gives each worker it
+    starts a SHARD_WORKER index, which picks out that worker's shards.
+
+    INTERACTIONS_WORKERS adds that many processes which run no shards at all,
+    and only answer the interactions endpoint - each gets an
+    INTERACTIONS_WORKER index instead.
+    """
+
+    __slots__ = (
+        "interactions_worker",
+        "interactions_workers",
+        "processes",
+        "shard_ids",
+        "total_shards",
+        "worker",
+    )
+
+    def __init__(
+        self,
+        total_shards: int = 1,
+        shard_ids: list[int] | None = None,
+        *,
+        worker: int | None = None,
+        processes: int = 1,
+        interactions_worker: int | None = None,
+        interactions_workers: int = 0,
+    ) -> None:
+        self.total_shards = total_shards
+        self.shard_ids = (
+            shard_ids if shard_ids is not None else list(range(total_shards))
+        )
+        self.worker = worker
+        self.processes = processes
+        self.interactions_worker = interactions_worker
+        self.interactions_workers = interactions_workers
+
+    @classmethod
+    def from_env(cls) -> typing.Self:
+        total_shards = int(os.environ.get("SHARD_COUNT", 1))
+        processes = int(os.environ.get("SHARD_PROCESSES", 1))
+        if total_shards < 1 or not 1 <= processes <= total_shards:
+            raise ValueError(
+                "SHARD_PROCESSES must be between 1 and SHARD_COUNT, which must be"
+                " at least 1."
+            )
+
+        interactions_workers = int(os.environ.get("INTERACTIONS_WORKERS", 0))
+
+        if (interactions_worker := os.environ.get("INTERACTIONS_WORKER")) is not None:
+            return cls(
+                total_shards,
+                [],
+                processes=processes,
+                interactions_worker=int(interactions_worker),
+                interactions_workers=interactions_workers,
+            )
+
+        if (worker := os.environ.get("SHARD_WORKER")) is None:
+            return cls(
+                total_shards,
+                processes=processes,
+                interactions_workers=interactions_workers,
+            )
+
+        groups = split_shards(total_shards, processes)
+        return cls(
+            total_shards,
+            groups[int(worker)],
+            worker=int(worker),
+            processes=processes,
+            interactions_workers=interactions_workers,
+        )
+
+    @property
+    def sharded(self) -> bool:
+        return self.total_shards > 1
+
+    @property
+    def launcher(self) -> bool:
+        # the process main.py was started as, which only starts the workers
+        return (
+            (self.processes > 1 or self.interactions_workers > 0)
+            and self.worker is None
+            and self.interactions_worker is None
+        )
+
+    @property
+    def shared(self) -> bool:
+        # whether other processes use the same database and guilds
+        return self.processes > 1 or self.interactions_workers > 0
+
+    @property
+    def serves_interactions(self) -> bool:
+        # with dedicated workers for it, the gateway processes don't
+        if self.interactions_worker is not None:
+            return True
+        return not self.interactions_workers and not self.launcher
+
+    @property
+    def interactions_index(self) -> int:
+        # each process that serves interactions listens on its own port
+        if self.interactions_worker is not None:
+            return self.interactions_worker
+        return self.worker or 0
+
+    @property
+    def leader(self) -> bool:
+        # whoever runs shard 0 (which also gets dms) does the once-only work
+        return 0 in self.shard_ids
+
+    def shard_for(self, guild_id: ipy.Snowflake_Type) -> int:
+        return shard_for(guild_id, self.total_shards)
+
+    def owns(self, guild_id: ipy.Snowflake_Type) -> bool:
+        return self.shard_for(guild_id) in self.shard_ids
+
+    def worker_path(self, path: Path) -> Path:
+        """Gives each worker its own copy of a file only one process may write."""
+        if self.interactions_worker is not None:
+            name = f"interactions{self.interactions_worker}"
+        elif self.worker is not None:
+            name = f"worker{self.worker}"
+        else:
+            return path
+        return path.with_name(f"{path.stem}.{name}{path.suffix}")
+
+    def describe(self) -> str:
+        if self.interactions_worker is not None:
+            return (
+                f"interactions worker {self.interactions_worker + 1}/"
+                f"{self.interactions_workers}"
+            )
+
+        first, last = self.shard_ids[0], self.shard_ids[-1]
+        shards = f"shard {first}" if first == last else f"shards {first}-{last}"
+        text = f"{shards} of {self.total_shards}"
+        if self.worker is not None:
+            text = f"worker {self.worker + 1}/{self.processes}, {text}"
+        return text
+
+
+class ShardStatus:
+    """
+    Shares how this process's shards are doing with the other workers.
+
+    Each worker writes a small status file every so often, which any worker
+    can read to show every shard at once - the workers don't otherwise talk
+    to each other. The launcher also reads them to know when a worker is
+    ready, so the next one can start.
+    """
+
+    def __init__(
+        self,
+        bot: ipy.Client,
+        plan: ShardPlan,
+        directory: Path,
+        *,
+        interval: float = 15.0,
+    ) -> None:
+        self.bot = bot
+        self.plan = plan
+        self.directory = directory
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def collect(self) -> dict[str, typing.Any]:
+        guilds = collections.Counter(
+            self.plan.shard_for(guild_id) for guild_id in self.bot.cache.guild_cache
+        )
+        shards = {}
+        # a single-shard client doesn't have the list
+        for state in getattr(self.bot, "shards", [self.bot._connection_state]):
+            started = state.start_time
+            # shards that haven't connected yet don't have a gateway
+            latency = state.latency if state.gateway else math.inf
+            shards[str(state.shard_id)] = {
+                "guilds": guilds[state.shard_id],
+                "latency": latency if math.isfinite(latency) else None,
+                "started": started.timestamp() if started else None,
+            }
+
+        return {
+            "worker": self.plan.worker,
+            "pid": os.getpid(),
+            "ready": self.bot.is_ready,
+            "updated": time.time(),
+            "members": len(self.bot.cache.member_cache),
+            "shards": shards,
+        }
+
+    def _write(self, status: dict[str, typing.Any]) -> None:
+        self.directory.mkdir(exist_ok=True)
+        path = _status_path(self.directory, self.plan.worker)
+        temp_path = path.with_suffix(".tmp")
+        temp_path.write_bytes(orjson.dumps(status))
+        temp_path.replace(path)
+
+    async def write(self) -> None:
+        if self.plan.worker is not None:
+            await asyncio.to_thread(self._write, self.collect())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.write()
+            except Exception as e:
+                self.bot.dispatch(ipy.events.Error(source="shard status", error=e))
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self.plan.worker is None:
+            return
+        if not self._task or self._task.done():
+            self._task = self.bot.create_task(
+                self._run(), name="shard status", group="sharding", daemon=True
+            )
+
+    def read(self, worker: int) -> dict[str, typing.Any] | None:
+        with contextlib.suppress(FileNotFoundError, orjson.JSONDecodeError):
+            return orjson.loads(_status_path(self.directory, worker).read_bytes())
+        return None
+
+    def read_all(self) -> list[dict[str, typing.Any]]:
+        """Gets every worker's status, with this worker's being up to date."""
+        if self.plan.worker is None:
+            return [self.collect()]
+        return [
+            self.collect() if worker == self.plan.worker else status
+            for worker in range(self.plan.processes)
+            if (status := self.read(worker)) or worker == self.plan.worker
+        ]
+
+    def is_stale(self, status: dict[str, typing.Any]) -> bool:
+        return time.time() - status["updated"] > self.interval * 3
+
+
+class WorkerLauncher:
+    """
+    Runs each worker as its own copy of main.py, and restarts any that die.
+
+    Shard workers are started one at a time, each once the last is ready,
+    since discord only lets shards connect so quickly - interactions workers
+    don't connect to the gateway, so they all start straight away. Stopping
+    the launcher interrupts every worker so they can shut down properly.
+    """
+
+    def __init__(
+        self,
+        plan: ShardPlan,
+        status_directory: Path,
+        *,
+        ready_timeout: float = 10 * 60,
+        stop_timeout: float = 30.0,
+        max_backoff: float = 5 * 60,
+    ) -> None:
+        self.plan = plan
+        self.status_directory = status_directory
+        self.ready_timeout = ready_timeout
+        self.stop_timeout = stop_timeout
+        self.max_backoff = max_backoff
+        # keyed by the variable that tells a worker what it is, and its index
+        self.processes: dict[tuple[str, int], asyncio.subprocess.Process] = {}
+        self.restarts: collections.Counter[tuple[str, int]] = collections.Counter()
+        self._stopping = asyncio.Event()
+
+    @staticmethod
+    def _label(key: tuple[str, int]) -> str:
+        kind, index = key
+        return f"{kind.removesuffix('_WORKER').lower()} worker {index}"
+
+    async def _spawn(self, key: tuple[str, int]) -> asyncio.subprocess.Process:
+        kind, index = key
+        # old status would make a worker look ready before it is
+        if kind == "SHARD_WORKER":
+            with contextlib.suppress(FileNotFoundError):
+                _status_path(self.status_directory, index).unlink()
+
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            sys.argv[0],
+            env=os.environ | {kind: str(index)},
+            # so a ctrl+c in the terminal only reaches the launcher, which
+            # passes it on once
+            start_new_session=True,
+        )
+        self.processes[key] = process
+        logger.info("Started %s as pid %s.", self._label(key), process.pid)
+        return process
+
+    async def _wait_ready(self, key: tuple[str, int]) -> None:
+        path = _status_path(self.status_directory, key[1])
+        deadline = time.monotonic() + self.ready_timeout
+
+        while time.monotonic() < deadline and not self._stopping.is_set():
+            with contextlib.suppress(FileNotFoundError, orjson.JSONDecodeError):
+                if orjson.loads(path.read_bytes())["ready"]:
+                    return
+            if self.processes[key].returncode is not None:
+                return
+            await asyncio.sleep(1)
+
+        logger.warning("%s didn't get ready in time.", self._label(key).capitalize())
+
+    async def _stop(self, process: asyncio.subprocess.Process) -> None:
+        # an interrupt is what makes a worker shut down cleanly
+        with contextlib.suppress(ProcessLookupError):
+            process.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(process.wait(), self.stop_timeout)
+        except asyncio.TimeoutError:
+            with contextlib.suppress(ProcessLookupError):
+                process.kill()
+            await process.wait()
+
+    async def _supervise(
+        self, key: tuple[str, int], process: asyncio.subprocess.Process
+    ) -> None:
+        backoff = 5.0
+        while True:
+            started = time.monotonic()
+            stopping = asyncio.create_task(self._stopping.wait())
+            exited = asyncio.create_task(process.wait())
+            await asyncio.wait({stopping, exited}, return_when=asyncio.FIRST_COMPLETED)
+
+            if self._stopping.is_set():
+                exited.cancel()
+                await self._stop(process)
+                return
+            stopping.cancel()
+
+            # a worker that ran for a while gets restarted quickly again
+            if time.monotonic() - started > self.max_backoff:
+                backoff = 5.0
+            logger.error(
+                "%s exited with code %s, restarting in %ss.",
+                self._label(key).capitalize(),
+                process.returncode,
+                backoff,
+            )
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stopping.wait(), backoff)
+            if self._stopping.is_set():
+                return
+
+            backoff = min(backoff * 2, self.max_backoff)
+            self.restarts[key] += 1
+            process = await self._spawn(key)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stopping.set)
+
+        supervisors: list[asyncio.Task] = []
+        for index in range(self.plan.interactions_workers):
+            key = ("INTERACTIONS_WORKER", index)
+            process = await self._spawn(key)
+            supervisors.append(asyncio.create_task(self._supervise(key, process)))
+
+        for index in range(self.plan.processes):
+            if self._stopping.is_set():
+                break
+            key = ("SHARD_WORKER", index)
+            process = await self._spawn(key)
+            supervisors.append(asyncio.create_task(self._supervise(key, process)))
+            await self._wait_ready(key)
+
+        await self._stopping.wait()
+        await asyncio.gather(*supervisors)
@@ -0,0 +1,126 @@
+import array
+import base64
+import hashlib
+import math
+
+import typing_extensions as typing
+
+__all__ = ("CountMinSketch", "HyperLogLog", "hash64")
+
+_MASK64 = (1 << 64) - 1
+
+
+def hash64(value: typing.Any) -> int:
+    # python's hash() is randomized per process, and sketches are saved to disk
+    digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class HyperLogLog:
+    """
+    Estimates how many distinct values have been added, in fixed memory.
+
+    With precision p, this takes 2^p bytes and has a standard error of about
+    1.04 / sqrt(2^p) - 2KB and 2.3% at the default of 11.
+    """
+
+    __slots__ = ("p", "registers")
+
+    def __init__(self, p: int = 11, registers: bytearray | None = None) -> None:
+        self.p = p
+        self.registers = registers if registers is not None else bytearray(1 << p)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, value: typing.Any) -> None:
+        h = hash64(value)
+        index = h >> (64 - self.p)
+        rest = (h << self.p) & _MASK64
+        # position of the first set bit in the remaining bits
+        rank = 65 - rest.bit_length() if rest else 65 - self.p
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0**-r for r in self.registers)
+
+        # small counts are better estimated from the number of empty registers
+        if estimate <= 2.5 * m and (zeros := self.registers.count(0)):
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {"p": self.p, "registers": base64.b64encode(self.registers).decode()}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, typing.Any]) -> "typing.Self":
+        return cls(data["p"], bytearray(base64.b64decode(data["registers"])))
+
+
+class CountMinSketch:
+    """
+    Estimates how often each key has been seen, in fixed memory.
+
+    Estimates never undercount. With probability 1 - e^-depth, they overcount
+    by at most e / width of the total count.
+    """
+
+    __slots__ = ("depth", "table", "total", "width")
+
+    def __init__(
+        self,
+        width: int = 1024,
+        depth: int = 4,
+        table: array.array | None = None,
+        total: int = 0,
+    ) -> None:
+        self.width = width
+        self.depth = depth
+        self.table = (
+            table if table is not None else array.array("I", bytes(4 * width * depth))
+        )
+        self.total = total
+
+    @property
+    def error_bound(self) -> float:
+        return math.e / self.width * self.total
+
+    @property
+    def confidence(self) -> float:
+        return 1 - math.exp(-self.depth)
+
+    def _indexes(self, key: typing.Any) -> typing.Iterator[int]:
+        # double hashing gives each row its own index from a single hash
+        h = hash64(key)
+        h1, h2 = h >> 32, (h & 0xFFFFFFFF) | 1
+        for row in range(self.depth):
+            yield row * self.width + (h1 + row * h2) % self.width
+
+    def add(self, key: typing.Any, count: int = 1) -> None:
+        for index in self._indexes(key):
+            self.table[index] += count
+        self.total += count
+
+    def estimate(self, key: typing.Any) -> int:
+        return min(self.table[index] for index in self._indexes(key))
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "width": self.width,
+            "depth": self.depth,
+            "total": self.total,
+            "table": base64.b64encode(self.table.tobytes()).decode(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, typing.Any]) -> "typing.Self":
+        table = array.array("I")
+        table.frombytes(base64.b64decode(data["table"]))
+        return cls(data["width"], data["depth"], table, data["total"])
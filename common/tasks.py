@@ -0,0 +1,157 @@
+import asyncio
+import collections
+import time
+
+import interactions as ipy
+import typing_extensions as typing
+
+__all__ = ("TaskRecord", "TaskSupervisor")
+
+
+class TaskRecord:
+    __slots__ = (
+        "created",
+        "daemon",
+        "error",
+        "finished",
+        "group",
+        "name",
+        "started",
+        "task",
+    )
+
+    def __init__(self, name: str, group: str, *, daemon: bool = False) -> None:
+        self.name = name
+        self.group = group
+        self.daemon = daemon
+        self.task: asyncio.Task | None = None
+        self.created = time.monotonic()
+        self.started: float | None = None
+        self.finished: float | None = None
+        self.error: BaseException | None = None
+
+    @property
+    def state(self) -> str:
+        if self.finished is None:
+            return "queued" if self.started is None else "running"
+        if self.error is None:
+            return "done"
+        return (
+            "cancelled" if isinstance(self.error, asyncio.CancelledError) else "failed"
+        )
+
+    @property
+    def duration(self) -> float:
+        # time spent waiting in the queue counts until the task starts running
+        start = self.created if self.started is None else self.started
+        return (self.finished or time.monotonic()) - start
+
+
+class TaskSupervisor:
+    """
+    Runs background tasks in named groups, each with its own concurrency limit.
+
+    Tasks beyond a group's limit wait their turn. Exceptions are dispatched as
+    error events so they go through the bot's normal error handling, and
+    shutdown waits for running tasks up to a deadline before cancelling them.
+    Daemon tasks (loops that never finish on their own) are cancelled without
+    waiting.
+    """
+
+    def __init__(
+        self,
+        client: ipy.Client,
+        *,
+        default_limit: int | None = None,
+        history: int = 20,
+    ) -> None:
+        self.client = client
+        self.default_limit = default_limit
+        self.limits: dict[str, int | None] = {}
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self.active: dict[asyncio.Task, TaskRecord] = {}
+        self.failed: collections.deque[TaskRecord] = collections.deque(maxlen=history)
+        self.completed: collections.Counter[str] = collections.Counter()
+        self.closing = False
+
+    def configure_group(self, group: str, *, limit: int | None) -> None:
+        # only affects tasks created after this
+        self.limits[group] = limit
+        self._semaphores.pop(group, None)
+
+    def _semaphore(self, group: str) -> asyncio.Semaphore | None:
+        if (limit := self.limits.get(group, self.default_limit)) is None:
+            return None
+        if group not in self._semaphores:
+            self._semaphores[group] = asyncio.Semaphore(limit)
+        return self._semaphores[group]
+
+    async def _run(
+        self,
+        record: TaskRecord,
+        coro: typing.Coroutine,
+        semaphore: asyncio.Semaphore | None,
+    ) -> typing.Any:
+        try:
+            if semaphore:
+                async with semaphore:
+                    record.started = time.monotonic()
+                    return await coro
+            record.started = time.monotonic()
+            return await coro
+        except asyncio.CancelledError as e:
+            record.error = e
+            raise
+        except Exception as e:
+            record.error = e
+            self.failed.append(record)
+            self.client.dispatch(
+                ipy.events.Error(source=f"task {record.group}/{record.name}", error=e)
+            )
+        finally:
+            record.finished = time.monotonic()
+            self.completed[record.state] += 1
+
+    def _discard(self, task: asyncio.Task) -> None:
+        self.active.pop(task, None)
+
+    def create_task(
+        self,
+        coro: typing.Coroutine,
+        *,
+        name: str | None = None,
+        group: str = "default",
+        daemon: bool = False,
+    ) -> asyncio.Task:
+        if self.closing:
+            coro.close()
+            raise RuntimeError("Cannot create tasks while shutting down.")
+
+        record = TaskRecord(
+            name or getattr(coro, "__qualname__", "task"), group, daemon=daemon
+        )
+        task = asyncio.create_task(
+            self._run(record, coro, self._semaphore(group)), name=record.name
+        )
+        record.task = task
+        self.active[task] = record
+        task.add_done_callback(self._discard)
+        # a task cancelled while queued (or before it ever ran) never starts
+        # its coroutine, which would otherwise warn about never being awaited
+        task.add_done_callback(lambda _: coro.close())
+        return task
+
+    async def shutdown(self, deadline: float = 10.0) -> None:
+        self.closing = True
+        if not self.active:
+            return
+
+        pending = {task for task, record in self.active.items() if record.daemon}
+        if workers := [task for task in self.active if task not in pending]:
+            _, unfinished = await asyncio.wait(workers, timeout=deadline)
+            pending |= unfinished
+
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,285 @@
+import asyncio
+import contextlib
+import contextvars
+import itertools
+import os
+import random
+import secrets
+import time
+from pathlib import Path
+
+import interactions as ipy
+import orjson
+import typing_extensions as typing
+
+__all__ = ("Span", "Trace", "Tracer", "current", "end_trace", "fail", "span")
+
+_current: contextvars.ContextVar["Trace | None"] = contextvars.ContextVar(
+    "trace", default=None
+)
+# trace viewers put each tid on its own row, so every trace gets a small one
+_tids = itertools.count(1)
+
+
+class Span:
+    __slots__ = ("args", "category", "end", "error", "name", "start")
+
+    def __init__(
+        self, name: str, category: str, start: float, args: dict[str, typing.Any]
+    ) -> None:
+        self.name = name
+        self.category = category
+        self.start = start
+        self.end = start
+        self.args = args
+        self.error: str | None = None
+
+
+class Trace:
+    """The spans recorded while handling one interaction or prefixed command."""
+
+    __slots__ = (
+        "created",
+        "error",
+        "finished",
+        "name",
+        "spans",
+        "start",
+        "start_time",
+        "tid",
+        "trace_id",
+        "tracer",
+    )
+
+    def __init__(self, tracer: "Tracer", name: str, created: float) -> None:
+        self.tracer = tracer
+        self.trace_id = secrets.token_hex(8)
+        self.tid = next(_tids)
+        self.name = name
+        # when discord created the interaction or message, from its snowflake
+        self.created = created
+        self.start_time = time.time()
+        self.start = time.perf_counter()
+        self.spans: list[Span] = []
+        self.error: str | None = None
+        self.finished: float | None = None
+
+    @property
+    def duration(self) -> float:
+        return (self.finished or time.perf_counter()) - self.start
+
+    def _us(self, perf: float) -> int:
+        return int((self.start_time + perf - self.start) * 1_000_000)
+
+    def events(self) -> list[dict[str, typing.Any]]:
+        """Turns the trace into Chrome trace format complete events."""
+        pid = os.getpid()
+        root_args = {"trace_id": self.trace_id}
+        if self.error:
+            root_args["error"] = self.error
+
+        events = [
+            {
+                "name": "gateway",
+                "cat": "gateway",
+                "ph": "X",
+                "ts": int(self.created * 1_000_000),
+                "dur": max(int((self.start_time - self.created) * 1_000_000), 0),
+                "pid": pid,
+                "tid": self.tid,
+                "args": {"trace_id": self.trace_id},
+            },
+            {
+                "name": self.name,
+                "cat": "handler",
+                "ph": "X",
+                "ts": self._us(self.start),
+                "dur": int(self.duration * 1_000_000),
+                "pid": pid,
+                "tid": self.tid,
+                "args": root_args,
+            },
+        ]
+        for item in self.spans:
+            args = {"trace_id": self.trace_id, **item.args}
+            if item.error:
+                args["error"] = item.error
+            events.append(
+                {
+                    "name": item.name,
+                    "cat": item.category,
+                    "ph": "X",
+                    "ts": self._us(item.start),
+                    "dur": int((item.end - item.start) * 1_000_000),
+                    "pid": pid,
+                    "tid": self.tid,
+                    "args": args,
+                }
+            )
+        return events
+
+    def finish(
+        self, *, name: str | None = None, error: Exception | None = None
+    ) -> None:
+        if self.finished is not None:
+            return
+        self.finished = time.perf_counter()
+        if name:
+            self.name = name
+        if error and not self.error:
+            self.error = repr(error)
+        self.tracer.finished(self)
+
+
+def current() -> Trace | None:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def span(
+    name: str, category: str = "internal", **args: typing.Any
+) -> typing.Iterator[Span | None]:
+    """Times the block as part of the current trace, if there is one."""
+    if not (trace := _current.get()) or trace.finished is not None:
+        yield None
+        return
+
+    item = Span(name, category, time.perf_counter(), args)
+    try:
+        yield item
+    except BaseException as e:
+        item.error = repr(e)
+        raise
+    finally:
+        item.end = time.perf_counter()
+        trace.spans.append(item)
+
+
+def fail(error: Exception) -> None:
+    """Marks the current trace as failed, so it's always kept."""
+    if (trace := _current.get()) and not trace.error:
+        trace.error = repr(error)
+
+
+def end_trace(*, name: str | None = None, error: Exception | None = None) -> None:
+    if trace := _current.get():
+        trace.finish(name=name, error=error)
+
+
+class Tracer:
+    """
+    Records traces of interactions and writes some of them to disk.
+
+    A sampled share of traces is kept, along with every slow or failed one.
+    Kept traces are written by a background task as Chrome trace format
+    events, one per line. Each file starts with the opening bracket of a
+    JSON array and every line ends in a comma, which the format allows -
+    so a file opens as is in Perfetto or chrome://tracing.
+    """
+
+    def __init__(
+        self,
+        bot: ipy.Client,
+        path: Path,
+        *,
+        sample_rate: float = 0.05,
+        slow_threshold: float = 1.0,
+        max_bytes: int = 5 * 2**20,
+        backups: int = 3,
+        queue_size: int = 1000,
+        flush_interval: float = 1.0,
+    ) -> None:
+        self.bot = bot
+        self.path = path
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue: asyncio.Queue[Trace] = asyncio.Queue(maxsize=queue_size)
+        self.flush_interval = flush_interval
+        self.kept = 0
+        self.dropped = 0
+        self._task: asyncio.Task | None = None
+        # traces taken off the queue but not yet written, so closing can
+        # still write them
+        self._batch: list[Trace] = []
+
+    def begin(self, name: str, snowflake: ipy.Snowflake_Type) -> Trace:
+        """Starts a trace for the current task and anything it goes on to run."""
+        created = ipy.Snowflake(snowflake).created_at.timestamp()
+        trace = Trace(self, name, created)
+        _current.set(trace)
+        return trace
+
+    def finished(self, trace: Trace) -> None:
+        # whether to keep it is decided by the writer, so an error recorded
+        # just after the handler finished still counts
+        try:
+            self.queue.put_nowait(trace)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def should_keep(self, trace: Trace) -> bool:
+        return (
+            trace.error is not None
+            or trace.duration >= self.slow_threshold
+            or random.random() < self.sample_rate  # noqa: S311
+        )
+
+    def _rotate(self) -> None:
+        for index in range(self.backups - 1, 0, -1):
+            older = self.path.with_suffix(f".{index}{self.path.suffix}")
+            if older.exists():
+                older.replace(self.path.with_suffix(f".{index + 1}{self.path.suffix}"))
+        self.path.replace(self.path.with_suffix(f".1{self.path.suffix}"))
+
+    def _append(self, lines: list[bytes]) -> None:
+        if self.path.exists() and self.path.stat().st_size >= self.max_bytes:
+            self._rotate()
+
+        new_file = not self.path.exists()
+        with self.path.open("ab") as f:
+            if new_file:
+                f.write(b"[\n")
+            f.writelines(lines)
+
+    async def _write(self, traces: list[Trace]) -> None:
+        if not (kept := [trace for trace in traces if self.should_keep(trace)]):
+            return
+
+        lines = [
+            orjson.dumps(event) + b",\n" for trace in kept for event in trace.events()
+        ]
+        await asyncio.to_thread(self._append, lines)
+        self.kept += len(kept)
+
+    async def _run(self) -> None:
+        while True:
+            self._batch.append(await self.queue.get())
+            # a short wait lets a burst of traces go out in one write
+            await asyncio.sleep(self.flush_interval)
+            while not self.queue.empty():
+                self._batch.append(self.queue.get_nowait())
+
+            batch, self._batch = self._batch, []
+            try:
+                await self._write(batch)
+            except Exception as e:
+                self.bot.dispatch(ipy.events.Error(source="tracer", error=e))
+
+    def start(self) -> None:
+        if not self._task or self._task.done():
+            self._task = self.bot.create_task(
+                self._run(), name="tracer", group="tracing", daemon=True
+            )
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+        batch, self._batch = self._batch, []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        await self._write(batch)
@@ -1,5 +1,7 @@
 import logging
 import os
+import re
+import time
 import traceback
 from pathlib import Path
 
@@ -8,11 +10,21 @@ import interactions as ipy
 import typing_extensions as typing
 from interactions.ext import prefixed_commands as prefixed
 
+import common.tracing as tracing
+from common.sharding import ShardPlan
+
 logger = logging.getLogger("oscbot")
 
 BOT_COLOR = ipy.Color(int(os.environ["BOT_COLOR"]))
 
 
+def env_flag(name: str, *, default: bool = False) -> bool:
+    # same truthy values load_env accepts for DOCKER_MODE
+    if (value := os.environ.get(name)) is None:
+        return default
+    return value in {"true", "True", "TRUE", "t", "T", "1"}
+
+
 def error_embed_generate(error_msg: str) -> ipy.Embed:
     return ipy.Embed(
         title="Error",
@@ -31,19 +43,66 @@ def make_embed(description: str, *, title: str | None = None) -> ipy.Embed:
     )
 
 
+_duration_reg = re.compile(r"(\d+)\s*([wdhms])", re.IGNORECASE)
+_timestamp_reg = re.compile(r"<t:(\d+)(?::[tTdDfFR])?>")
+_duration_units = {"w": 604800, "d": 86400, "h": 3600, "m": 60, "s": 1}
+
+
+def parse_time(text: str, *, future: bool = True) -> float:
+    # accepts a discord timestamp or a duration like 1d12h, which counts
+    # forward from now (or back, for past times)
+    text = text.strip()
+    if match := _timestamp_reg.fullmatch(text):
+        return float(match[1])
+    if text.isdigit():
+        # could be meant as seconds, minutes or a unix timestamp
+        raise ipy.errors.BadArgument(
+            f"`{text}` needs a unit, like `{text}m`, or use a Discord timestamp."
+        )
+    if (parts := _duration_reg.findall(text)) and not _duration_reg.sub(
+        "", text
+    ).strip():
+        offset = sum(
+            int(amount) * _duration_units[unit.lower()] for amount, unit in parts
+        )
+        return time.time() + offset if future else time.time() - offset
+
+    raise ipy.errors.BadArgument(
+        "Could not understand that time. Use a duration like `1d12h` or a"
+        " Discord timestamp."
+    )
+
+
 CommandT = typing.TypeVar("CommandT", ipy.BaseCommand, ipy.const.AsyncCallable)
 
 
-def proper_permissions() -> typing.Callable[[CommandT], CommandT]:
+def permissions_check(
+    *permissions: ipy.Permissions, require_all: bool = False
+) -> typing.Callable[[CommandT], CommandT]:
+    # by default, having any one of the permissions is enough
+    combined = ipy.Permissions.NONE
+    for permission in permissions:
+        combined |= permission
+
     async def predicate(ctx: ipy.BaseContext) -> bool:
-        return (
-            ipy.Permissions.ADMINISTRATOR in ctx.author.guild_permissions
-            or ipy.Permissions.MANAGE_MESSAGES in ctx.author.guild_permissions
-        )
+        if not isinstance(ctx.author, ipy.Member):
+            return False
+
+        with tracing.span("permissions", "check"):
+            member_permissions = ctx.bot.permission_cache.get(ctx.author)
+        if require_all:
+            return member_permissions & combined == combined
+        return bool(member_permissions & combined)
 
     return ipy.check(predicate)
 
 
+def proper_permissions() -> typing.Callable[[CommandT], CommandT]:
+    return permissions_check(
+        ipy.Permissions.ADMINISTRATOR, ipy.Permissions.MANAGE_MESSAGES
+    )
+
+
 async def error_handle(
     error: Exception, *, ctx: typing.Optional[ipy.BaseContext] = None
 ) -> None:
@@ -135,7 +194,8 @@ class CustomCheckFailure(ipy.errors.BadArgument):
 
 
 async def _global_checks(ctx: ipy.BaseContext) -> bool:
-    return bool(ctx.guild) if ctx.bot.is_ready else False
+    with tracing.span("global_checks", "check"):
+        return bool(ctx.guild) if ctx.bot.is_ready else False
 
 
 class Extension(ipy.Extension):
@@ -150,13 +210,57 @@ class Extension(ipy.Extension):
 if typing.TYPE_CHECKING:
     import asyncio
 
+    from common.analytics import UsageAnalytics
+    from common.audit import AuditJournal
+    from common.cache_snapshot import CacheSnapshot
+    from common.db import Database
+    from common.defer import DeferTracker
+    from common.http_interactions import InteractionServer
+    from common.latency import LatencyMonitor
+    from common.message_index import MessageIndex
+    from common.permissions import PermissionCache
+    from common.ratelimit import InteractionRateLimiter
+    from common.retry import RetryPolicy
+    from common.scheduler import Scheduler
+    from common.sharding import ShardStatus
+    from common.tasks import TaskSupervisor
+    from common.tracing import Tracer
+
     class OSCBotBase(prefixed.PrefixedInjectedClient):
         init_load: bool
         owner: ipy.User
-        background_tasks: set[asyncio.Task]
+        tasks: TaskSupervisor
+        db: Database
+        scheduler: Scheduler
+        audit: AuditJournal
+        analytics: UsageAnalytics
+        latency_monitor: LatencyMonitor
+        cache_snapshot: CacheSnapshot
+        tracer: Tracer
         color: ipy.Color
-
-        def create_task(self, coro: typing.Coroutine) -> asyncio.Task: ...
+        message_index: MessageIndex
+        defer_tracker: DeferTracker
+        permission_cache: PermissionCache
+        interaction_limiter: InteractionRateLimiter
+        retry: RetryPolicy
+        sharding: ShardPlan
+        shard_status: ShardStatus
+        interaction_server: InteractionServer | None
+
+        def create_task(
+            self,
+            coro: typing.Coroutine,
+            *,
+            name: str | None = None,
+            group: str = "default",
+            daemon: bool = False,
+        ) -> asyncio.Task: ...
+
+elif ShardPlan.from_env().sharded:
+    # the sharded client differs from the usual one in small ways, so it's
+    # only used when there's more than one shard
+    class OSCBotBase(ipy.AutoShardedClient):
+        pass
 
 else:
 
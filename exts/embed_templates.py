@@ -0,0 +1,377 @@
+import asyncio
+import contextlib
+import importlib
+import logging
+import os
+from pathlib import Path
+
+import interactions as ipy
+import orjson
+import typing_extensions as typing
+
+import common.embeds as embeds
+import common.utils as utils
+
+logger = logging.getLogger("oscbot")
+
+TEMPLATES_PATH = Path(os.environ["DIRECTORY_OF_FILE"]) / "embed_templates.json"
+
+# modals can only hold 5 text inputs, one per variable
+MAX_VARIABLES = 5
+
+
+def make_template(name: str, source: str) -> embeds.EmbedTemplate:
+    """Compiles a template, raising ValueError if it can't be saved as is."""
+    template = embeds.EmbedTemplate(name, source)
+
+    if len(template.variables) > MAX_VARIABLES:
+        raise ValueError(f"Templates can have at most {MAX_VARIABLES} variables.")
+
+    # without variables the rendered embed never changes, so it can be fully
+    # checked now - otherwise that waits until it's posted
+    if not template.variables and (
+        errors := embeds.validate_embed(template.render({}))
+    ):
+        raise ValueError(embeds.format_errors(errors))
+
+    return template
+
+
+def templates_mtime() -> float | None:
+    with contextlib.suppress(FileNotFoundError):
+        return TEMPLATES_PATH.stat().st_mtime
+    return None
+
+
+def read_sources() -> dict[str, typing.Any]:
+    try:
+        sources = orjson.loads(TEMPLATES_PATH.read_bytes())
+    except FileNotFoundError:
+        return {}
+    except orjson.JSONDecodeError:
+        logger.warning("Could not parse the embed templates file.")
+        return {}
+
+    if not isinstance(sources, dict):
+        logger.warning("Ignored embed templates file, which isn't an object.")
+        return {}
+    return sources
+
+
+def load_templates(sources: dict[str, typing.Any]) -> dict[str, embeds.EmbedTemplate]:
+    # a bad entry (from editing the file by hand, say) is skipped rather than
+    # breaking every other template
+    templates = {}
+    for name, source in sources.items():
+        try:
+            templates[name] = embeds.EmbedTemplate(name, source)
+        except (ValueError, TypeError) as e:
+            logger.warning("Skipped embed template %s: %s", name, e)
+    return templates
+
+
+class EmbedTemplates(utils.Extension):
+    def __init__(self, bot: utils.OSCBotBase) -> None:
+        self.bot: utils.OSCBotBase = bot
+        self.name = "Embed Templates"
+        self.add_ext_auto_defer(enabled=False)
+
+        # templates are compiled when the file is read, never when posting
+        self._templates: dict[str, embeds.EmbedTemplate] = {}
+        self._templates_mtime: float | None = None
+        self._write_lock = asyncio.Lock()
+
+    @staticmethod
+    def _load_if_changed(
+        known_mtime: float | None,
+    ) -> tuple[float | None, dict[str, embeds.EmbedTemplate] | None]:
+        if (mtime := templates_mtime()) == known_mtime:
+            return mtime, None
+        return mtime, load_templates(read_sources())
+
+    async def fetch_templates(self) -> dict[str, embeds.EmbedTemplate]:
+        # other shard workers may have saved the file since it was last read -
+        # it's checked (and compiled, if it changed) off the event loop
+        mtime, templates = await asyncio.to_thread(
+            self._load_if_changed, self._templates_mtime
+        )
+        if templates is not None:
+            self._templates, self._templates_mtime = templates, mtime
+        return self._templates
+
+    @staticmethod
+    def _update_file(
+        name: str, source: str | None
+    ) -> tuple[float, dict[str, embeds.EmbedTemplate]]:
+        # read again right before writing, so templates another worker saved
+        # since this one last looked aren't lost
+        sources = read_sources()
+        if source is None:
+            sources.pop(name, None)
+        else:
+            sources[name] = source
+
+        temp_path = TEMPLATES_PATH.with_suffix(".tmp")
+        temp_path.write_bytes(orjson.dumps(sources, option=orjson.OPT_INDENT_2))
+        temp_path.replace(TEMPLATES_PATH)
+        return TEMPLATES_PATH.stat().st_mtime, load_templates(sources)
+
+    async def save_template(
+        self, name: str, template: embeds.EmbedTemplate | None
+    ) -> None:
+        """Saves a template to the file, or deletes it if None is given."""
+        async with self._write_lock:
+            self._templates_mtime, self._templates = await asyncio.to_thread(
+                self._update_file, name, template.source if template else None
+            )
+
+    async def get_template(self, name: str) -> embeds.EmbedTemplate:
+        if template := (await self.fetch_templates()).get(name):
+            return template
+        raise ipy.errors.BadArgument(f"No template named `{name}` exists.")
+
+    @ipy.slash_command(
+        "embed-template",
+        description="Manages stored embed templates.",
+        default_member_permissions=ipy.Permissions.MANAGE_MESSAGES,
+        sub_cmd_name="save",
+        sub_cmd_description=(
+            "Creates or edits a template. Use {{ name }} for variables."
+        ),
+    )
+    @ipy.slash_option(
+        "name",
+        "The name of the template.",
+        ipy.OptionType.STRING,
+        required=True,
+        autocomplete=True,
+        max_length=32,
+    )
+    async def template_save(self, ctx: ipy.SlashContext, name: str) -> None:
+        existing = (await self.fetch_templates()).get(name)
+
+        modal = ipy.Modal(
+            ipy.InputText(
+                label="Enter the raw embed for the template:",
+                style=ipy.TextStyles.PARAGRAPH,
+                value=existing.source if existing else ipy.MISSING,
+                custom_id="template-source",
+            ),
+            title="Save Embed Template",
+            custom_id=f"embed-template-save|{name}",
+        )
+        await ctx.send_modal(modal)
+
+    @ipy.slash_command(
+        "embed-template",
+        description="Manages stored embed templates.",
+        default_member_permissions=ipy.Permissions.MANAGE_MESSAGES,
+        sub_cmd_name="post",
+        sub_cmd_description="Sends a template, asking for its variables if it has any.",
+    )
+    @ipy.slash_option(
+        "name",
+        "The name of the template.",
+        ipy.OptionType.STRING,
+        required=True,
+        autocomplete=True,
+        max_length=32,
+    )
+    @ipy.slash_option(
+        "channel",
+        "The channel to send the embed in.",
+        ipy.OptionType.CHANNEL,
+        required=False,
+        channel_types=[ipy.ChannelType.GUILD_TEXT],
+    )
+    async def template_post(
+        self, ctx: ipy.SlashContext, name: str, channel: ipy.GuildText | None = None
+    ) -> None:
+        if channel is None:
+            channel = ctx.channel  # type: ignore
+
+        template = await self.get_template(name)
+
+        if not template.variables:
+            embed_dict = await self.render_template(ctx, template, {})
+            if embed_dict is None:
+                return
+
+            async with self.bot.defer_tracker.guard(
+                ctx, "embed-template-post", ephemeral=True
+            ):
+                msg = await channel.send(embed=embed_dict)
+                self.bot.message_index.record_message(msg, embeds=[embed_dict])
+                await self.bot.audit.record_message(
+                    "template-post", ctx, msg, detail=name
+                )
+                await ctx.send(
+                    embeds=utils.make_embed(f"Sent! See it at {msg.jump_url}."),
+                    ephemeral=True,
+                )
+            return
+
+        modal = ipy.Modal(
+            *(
+                ipy.InputText(
+                    label=variable[:45],
+                    style=ipy.TextStyles.SHORT,
+                    custom_id=variable,
+                )
+                for variable in template.variables
+            ),
+            title=f"Post {name}"[:45],
+            custom_id=f"embed-template-post|{channel.id}|{name}",
+        )
+        await ctx.send_modal(modal)
+
+    @ipy.slash_command(
+        "embed-template",
+        description="Manages stored embed templates.",
+        default_member_permissions=ipy.Permissions.MANAGE_MESSAGES,
+        sub_cmd_name="list",
+        sub_cmd_description="Lists all stored templates and their variables.",
+    )
+    async def template_list(self, ctx: ipy.SlashContext) -> None:
+        if not (templates := await self.fetch_templates()):
+            await ctx.send(
+                embeds=utils.make_embed("No templates saved."), ephemeral=True
+            )
+            return
+
+        description = "\n".join(
+            f"`{name}`: "
+            + (", ".join(f"`{v}`" for v in template.variables) or "no variables")
+            for name, template in sorted(templates.items())
+        )
+        await ctx.send(
+            embeds=utils.make_embed(description, title="Embed Templates"),
+            ephemeral=True,
+        )
+
+    @ipy.slash_command(
+        "embed-template",
+        description="Manages stored embed templates.",
+        default_member_permissions=ipy.Permissions.MANAGE_MESSAGES,
+        sub_cmd_name="delete",
+        sub_cmd_description="Deletes a stored template.",
+    )
+    @ipy.slash_option(
+        "name",
+        "The name of the template.",
+        ipy.OptionType.STRING,
+        required=True,
+        autocomplete=True,
+        max_length=32,
+    )
+    async def template_delete(self, ctx: ipy.SlashContext, name: str) -> None:
+        await self.get_template(name)
+        await self.save_template(name, None)
+        await ctx.send(embeds=utils.make_embed(f"Deleted `{name}`."), ephemeral=True)
+
+    @template_save.autocomplete("name")
+    @template_post.autocomplete("name")
+    @template_delete.autocomplete("name")
+    async def template_name_autocomplete(self, ctx: ipy.AutocompleteContext) -> None:
+        query = ctx.input_text.lower()
+        templates = await self.fetch_templates()
+        await ctx.send(
+            [name for name in sorted(templates) if query in name.lower()][:25]
+        )
+
+    @staticmethod
+    async def render_template(
+        ctx: ipy.InteractionContext,
+        template: embeds.EmbedTemplate,
+        variables: dict[str, str],
+    ) -> dict | None:
+        embed_dict = template.render(variables)
+
+        # variables can push the embed over the limits, so the rendered
+        # embed still needs checking, even though the template was parsed
+        if errors := embeds.validate_embed(embed_dict):
+            await ctx.send(
+                embeds=utils.error_embed_generate(embeds.format_errors(errors)),
+                ephemeral=True,
+            )
+            return None
+
+        return embed_dict
+
+    @ipy.listen(ipy.events.ModalCompletion)  # type: ignore
+    async def on_modal_completion(self, event: ipy.events.ModalCompletion) -> None:
+        ctx = event.ctx
+
+        if ctx.custom_id.startswith("embed-template-save|"):
+            if await self.bot.interaction_limiter.limited(ctx, "embed-template-save"):
+                return
+
+            name = ctx.custom_id.removeprefix("embed-template-save|")
+
+            try:
+                template = make_template(name, ctx.responses["template-source"])
+            except ValueError as e:
+                await ctx.send(
+                    embeds=utils.error_embed_generate(str(e)), ephemeral=True
+                )
+                return
+
+            await self.save_template(name, template)
+            await ctx.send(
+                embeds=utils.make_embed(
+                    f"Saved `{name}`"
+                    + (
+                        " with variables"
+                        f" {', '.join(f'`{v}`' for v in template.variables)}."
+                        if template.variables
+                        else "."
+                    )
+                ),
+                ephemeral=True,
+            )
+
+        elif ctx.custom_id.startswith("embed-template-post|"):
+            if await self.bot.interaction_limiter.limited(ctx, "embed-template-post"):
+                return
+
+            _, channel_id, name = ctx.custom_id.split("|", 2)
+
+            template = (await self.fetch_templates()).get(name)
+            if not template:
+                await ctx.send(
+                    embeds=utils.error_embed_generate(
+                        f"No template named `{name}` exists."
+                    ),
+                    ephemeral=True,
+                )
+                return
+
+            embed_dict = await self.render_template(ctx, template, ctx.responses)
+            if embed_dict is None:
+                return
+
+            async with self.bot.defer_tracker.guard(
+                ctx, "embed-template-post", ephemeral=True
+            ):
+                channel = await self.bot.fetch_channel(int(channel_id))
+                if not channel:
+                    await ctx.send(
+                        embeds=utils.error_embed_generate("Could not get channel."),
+                        ephemeral=True,
+                    )
+                    return
+
+                msg = await channel.send(embed=embed_dict)
+                self.bot.message_index.record_message(msg, embeds=[embed_dict])
+                await self.bot.audit.record_message(
+                    "template-post", ctx, msg, detail=name
+                )
+                await ctx.send(
+                    embeds=utils.make_embed(f"Sent! See it at {msg.jump_url}."),
+                    ephemeral=True,
+                )
+
+
+def setup(bot: utils.OSCBotBase) -> None:
+    importlib.reload(utils)
+    EmbedTemplates(bot)
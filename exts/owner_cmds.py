@@ -1,19 +1,42 @@
 import asyncio
 import contextlib
+import datetime
+import functools
+import gc
 import importlib
 import inspect
 import io
+import math
+import os
 import platform
+import re
 import textwrap
+import threading
 import traceback
+import tracemalloc
 import weakref
+from pathlib import Path
 
 import interactions as ipy
 import typing_extensions as typing
 from interactions.ext import paginators
 from interactions.ext import prefixed_commands as prefixed
 
+import common.embeds as embeds
+import common.members as members
 import common.utils as utils
+from common.command_sync import CommandSync
+from common.gateway_filter import (
+    FilteredProcessors,
+    intent_names,
+    required_intents,
+)
+from common.log_search import LEVELS, LogSearch
+from common.memory import MemoryProfiler
+from common.prefix_filter import FilteredPrefixedManager
+from common.profiler import SamplingProfiler
+
+COMMAND_MANIFEST_PATH = Path(os.environ["DIRECTORY_OF_FILE"]) / "command_manifest.json"
 
 
 def debug_embed(title: str, **kwargs: typing.Any) -> ipy.Embed:
@@ -38,8 +61,13 @@ def get_cache_state(bot: "ipy.Client") -> str:
         for c in inspect.getmembers(bot.cache, predicate=lambda x: isinstance(x, dict))
         if not c[0].startswith("__")
     }
+    # the compact member store isn't a dict, so it's missed above
+    if isinstance(bot.cache.member_cache, members.CompactMemberStore):
+        caches["member_cache"] = bot.cache.member_cache
     caches["endpoints"] = bot.http._endpoints
     caches["rate_limits"] = bot.http.ratelimit_locks
+    caches["message_index"] = bot.message_index.messages
+    caches["interaction_buckets"] = bot.interaction_limiter.buckets
     table = []
 
     for cache, val in caches.items():
@@ -177,6 +205,12 @@ class OwnerCMDs(ipy.Extension):
     def __init__(self, bot: utils.OSCBotBase) -> None:
         self.bot: utils.OSCBotBase = bot
         self.name = "Owner"
+        self.memory = MemoryProfiler()
+        self.profiler: SamplingProfiler | None = None
+        self.logs = LogSearch(Path(os.environ["LOG_FILE_PATH"]))
+        # searching updates the file indexes, which isn't safe from two
+        # threads at once
+        self._logs_lock = asyncio.Lock()
 
         self.set_extension_error(self.ext_error)
         self.add_ext_check(ipy.is_owner())
@@ -205,6 +239,23 @@ class OwnerCMDs(ipy.Extension):
 
         e.add_field("Guilds", str(len(self.bot.guilds)))
 
+        if self.bot.sharding.sharded:
+            e.add_field("Shards", self.bot.sharding.describe())
+
+        if server := self.bot.interaction_server:
+            e.add_field(
+                "HTTP Interactions",
+                f"{server.received} received | {server.answered} answered |"
+                f" {server.timed_out} timed out | {server.rejected} rejected",
+            )
+
+        if isinstance(self.bot.prefixed, FilteredPrefixedManager):
+            e.add_field(
+                "Prefixed Messages",
+                f"{self.bot.prefixed.accepted} accepted |"
+                f" {self.bot.prefixed.dropped} dropped",
+            )
+
         await ctx.reply(embeds=[e])
 
     @debug.subcommand(aliases=["cache"])
@@ -213,6 +264,653 @@ class OwnerCMDs(ipy.Extension):
         e = debug_embed("Cache")
 
         e.description = f"```prolog\n{get_cache_state(self.bot)}\n```"
+
+        permission_cache = self.bot.permission_cache
+        e.add_field(
+            "Permission Cache",
+            f"{len(permission_cache)} members | {permission_cache.hits} hits |"
+            f" {permission_cache.misses} misses",
+        )
+
+        snapshot = self.bot.cache_snapshot
+        startup = (
+            f"{snapshot.startup_time:.2f}s" if snapshot.startup_time else "not ready"
+        )
+        e.add_field(
+            "Warm Start",
+            f"{'Enabled' if snapshot.enabled else 'Disabled'} | ready after"
+            f" {startup} | {len(snapshot)}/{snapshot.loaded} entries left |"
+            f" indexed in {snapshot.load_time * 1000:.1f}ms\n"
+            f"{snapshot.restored.total()} restored |"
+            f" {snapshot.cold.total()} cold fetches"
+            f" ({snapshot.cold_warmup} while warming up) |"
+            f" {snapshot.stale} stale | {snapshot.superseded} superseded",
+        )
+        await ctx.reply(embeds=[e])
+
+    @debug.subcommand(aliases=["defers"])
+    async def defer(self, ctx: prefixed.PrefixedContext) -> None:
+        """Get information about how interaction handlers are being deferred."""
+        e = debug_embed("Defer")
+
+        tracker = self.bot.defer_tracker
+        rows = [
+            [
+                key,
+                f"{stats.estimate * 1000:.0f}ms",
+                stats.samples,
+                stats.direct,
+                stats.predicted_defers,
+                stats.deadline_defers,
+            ]
+            for key, stats in sorted(tracker.stats.items())
+        ]
+
+        if rows:
+            table = make_table(
+                rows, ["Handler", "Avg", "Runs", "Direct", "Predicted", "Deadline"]
+            )
+            e.description = f"```prolog\n{table}\n```"
+        else:
+            e.description = "No handlers have run yet."
+
+        e.add_field("Adaptive", "Enabled" if tracker.enabled else "Disabled")
+        e.add_field("Deadline", f"{tracker.deadline}s")
+        await ctx.reply(embeds=[e])
+
+    @debug.subcommand(aliases=["gateway"])
+    async def events(self, ctx: prefixed.PrefixedContext) -> None:
+        """Get information about the gateway events received and processed."""
+        e = debug_embed("Events")
+
+        processors = self.bot.processors
+        if not isinstance(processors, FilteredProcessors):
+            e.description = "Event counting is not enabled."
+            await ctx.reply(embeds=[e])
+            return
+
+        rows = [
+            [
+                event_name.removeprefix("raw_"),
+                count,
+                processors.processed[event_name],
+            ]
+            for event_name, count in processors.received.most_common(20)
+        ]
+        if rows:
+            table = make_table(rows, ["Event", "Received", "Processed"])
+            e.description = f"```prolog\n{table}\n```"
+        else:
+            e.description = "No events received yet."
+
+        required = required_intents(self.bot)
+        e.add_field(
+            "Skipping Unhandled", "Enabled" if processors.skip_unhandled else "Disabled"
+        )
+        e.add_field("Required Intents", intent_names(required))
+        if extra := ipy.Intents(int(self.bot.intents) & ~int(required)):
+            e.add_field("Unneeded Intents", intent_names(extra))
+
+        await ctx.reply(embeds=[e])
+
+    @debug.subcommand(aliases=["journal"])
+    async def audit(self, ctx: prefixed.PrefixedContext, *, filters: str = "") -> None:
+        """
+        Query recent audit journal entries.
+
+        Filters are given as user:<user>, channel:<channel>, since:<time>,
+        until:<time> and limit:<count>, where times are durations ago (like 2h)
+        or Discord timestamps.
+        """
+        query: dict[str, typing.Any] = {}
+        for item in filters.split():
+            key, _, value = item.partition(":")
+            if key in {"user", "channel"}:
+                if not (digits := "".join(c for c in value if c.isdigit())):
+                    raise ipy.errors.BadArgument(f"`{value}` is not a valid {key}.")
+                query[f"{key}_id"] = int(digits)
+            elif key in {"since", "until"}:
+                query[key] = utils.parse_time(value, future=False)
+            elif key == "limit" and value.isdigit():
+                query["limit"] = min(int(value), 30)
+            else:
+                raise ipy.errors.BadArgument(f"Unknown filter `{item}`.")
+
+        e = debug_embed("Audit")
+        events = await self.bot.audit.query(**query)
+        rows = [
+            [
+                datetime.datetime.fromtimestamp(
+                    event.created_at, datetime.timezone.utc
+                ).strftime("%m-%d %H:%M:%S"),
+                event.action,
+                event.user_id,
+                event.channel_id or "-",
+                event.message_id or event.detail or "-",
+            ]
+            for event in events
+        ]
+
+        if rows:
+            table = make_table(
+                rows, ["Time (UTC)", "Action", "User", "Channel", "Target"]
+            )
+            e.description = f"```prolog\n{table}\n```"
+        else:
+            e.description = "No matching entries."
+
+        e.add_field("Written", str(self.bot.audit.written))
+        e.add_field("Queued", str(self.bot.audit.queue.qsize()))
+        e.add_field("Dropped", str(self.bot.audit.dropped))
+        await ctx.reply(embeds=[e])
+
+    @debug.subcommand(aliases=["log"])
+    async def logs(self, ctx: prefixed.PrefixedContext, *, filters: str = "") -> None:
+        """
+        Search the log file and its rotated copies.
+
+        Filters are given as since:<time>, until:<time>, level:<level>,
+        logger:<name> and limit:<count>, where times are durations ago (like
+        2h) or Discord timestamps. Anything else is searched for as text, or
+        as a regex if it's wrapped in slashes, like /timed? out/.
+        """
+        query: dict[str, typing.Any] = {"limit": 200}
+        words: list[str] = []
+        for item in filters.split():
+            key, _, value = item.partition(":")
+            if key in {"since", "until"} and value:
+                query[key] = utils.parse_time(value, future=False)
+            elif key == "level" and value:
+                if (level := LEVELS.get(value.upper())) is None:
+                    raise ipy.errors.BadArgument(f"Unknown level `{value}`.")
+                query["level"] = level
+            elif key == "logger" and value:
+                query["logger"] = value
+            elif key == "limit" and value.isdigit():
+                query["limit"] = min(int(value), 5000)
+            else:
+                words.append(item)
+
+        if text := " ".join(words):
+            if len(text) > 2 and text.startswith("/") and text.endswith("/"):
+                try:
+                    query["pattern"] = re.compile(text[1:-1], re.IGNORECASE)
+                except re.error as e:
+                    raise ipy.errors.BadArgument(f"Invalid regex: {e}") from None
+            else:
+                query["pattern"] = re.compile(re.escape(text), re.IGNORECASE)
+
+        async with ctx.channel.typing, self._logs_lock:
+            read_before = self.logs.bytes_read
+            records = await asyncio.to_thread(
+                functools.partial(self.logs.search, **query)
+            )
+            read = self.logs.bytes_read - read_before
+
+        if not records:
+            await ctx.reply("No matching log records.")
+            return
+
+        summary = (
+            f"{len(records)} records (newest {query['limit']} at most), searched"
+            f" {read / 1024:.0f} KiB across {len(self.logs.indexes)} files."
+        )
+        result = "\n".join(record.text for record in records)
+        # past a handful of pages, a file is easier to read through
+        if len(result) > 20000:
+            await ctx.reply(
+                summary,
+                file=ipy.File(io.BytesIO(result.encode()), file_name="logs.txt"),
+            )
+            return
+
+        result = result.replace("```", "`\u200b``")
+        paginator = paginators.Paginator.create_from_string(
+            self.bot, result, prefix="```", suffix="```", page_size=1900
+        )
+        await ctx.reply(summary)
+        await paginator.reply(ctx)
+
+    @debug.subcommand(aliases=["retries", "breaker"])
+    async def retry(self, ctx: prefixed.PrefixedContext) -> None:
+        """Get how REST calls have been retried, and the circuit breaker's state."""
+        e = debug_embed("Retry")
+
+        policy = self.bot.retry
+        rows = [
+            [
+                name,
+                stats.calls,
+                stats.retries,
+                stats.recovered,
+                stats.gave_up,
+                stats.rejected,
+            ]
+            for name, stats in sorted(policy.stats.items())
+        ]
+        if rows:
+            table = make_table(
+                rows,
+                ["Operation", "Calls", "Retries", "Recovered", "Gave Up", "Rejected"],
+            )
+            e.description = f"```prolog\n{table}\n```"
+        else:
+            e.description = "No calls have gone through the retry policy yet."
+
+        breaker = policy.breaker
+        e.add_field(
+            "Circuit Breaker",
+            f"{breaker.state.title()} | {breaker.failures} failures in a row |"
+            f" {breaker.trips} trips",
+        )
+        e.add_field(
+            "Policy",
+            f"{policy.attempts} attempts | {policy.base_delay}s base delay |"
+            f" opens after {breaker.threshold} failures for {breaker.cooldown}s",
+        )
+        await ctx.reply(embeds=[e])
+
+    @debug.subcommand(aliases=["ping"])
+    async def latency(self, ctx: prefixed.PrefixedContext) -> None:
+        """Get recent gateway heartbeat and REST latency, and connection events."""
+        e = debug_embed("Latency")
+        monitor = self.bot.latency_monitor
+
+        def ms(value: float) -> str:
+            return f"{value * 1000:.0f}ms"
+
+        rows = []
+        for label, window in (("5m", 5 * 60), ("1h", 60 * 60)):
+            if stats := monitor.heartbeats.stats(window):
+                rows.append(
+                    [
+                        f"heartbeat {label}",
+                        stats.count,
+                        ms(stats.p50),
+                        ms(stats.p95),
+                        ms(stats.max),
+                    ]
+                )
+
+            if stats := monitor.rest_stats(window):
+                rows.append(
+                    [
+                        f"rest {label}",
+                        stats.count,
+                        ms(stats.p50),
+                        ms(stats.p95),
+                        ms(stats.max),
+                    ]
+                )
+
+        if rows:
+            table = make_table(rows, ["Source", "Count", "p50", "p95", "Max"])
+            e.description = f"```prolog\n{table}\n```"
+        else:
+            e.description = "No latency has been recorded yet."
+
+        if (current := monitor.heartbeats.last) is not None:
+            e.add_field("Current Heartbeat", ms(current))
+
+        if slowest := sorted(
+            monitor.route_stats(60 * 60).items(),
+            key=lambda item: item[1].p95,
+            reverse=True,
+        )[:5]:
+            e.add_field(
+                "Slowest Routes (1h p95)",
+                "\n".join(
+                    f"`{endpoint}`: {ms(stats.p95)} ({stats.count})"
+                    for endpoint, stats in slowest
+                ),
+                inline=False,
+            )
+
+        if monitor.events:
+            e.add_field(
+                "Connection Events",
+                "\n".join(
+                    f"{kind}: <t:{int(when)}:R>"
+                    for when, kind in reversed(monitor.events)
+                ),
+                inline=False,
+            )
+
+        await ctx.reply(embeds=[e])
+
+    @debug.subcommand(aliases=["shard"])
+    async def shards(self, ctx: prefixed.PrefixedContext) -> None:
+        """Get the latency and guilds of every shard, across every worker."""
+        e = debug_embed("Shards")
+        status = self.bot.shard_status
+
+        rows = []
+        guilds = members = 0
+        for worker in status.read_all():
+            # other workers' status is only as fresh as their last write
+            state = "stale" if status.is_stale(worker) else "ready"
+            if not worker["ready"]:
+                state = "starting"
+            guilds += sum(shard["guilds"] for shard in worker["shards"].values())
+            members += worker["members"]
+
+            for shard_id, shard in sorted(
+                worker["shards"].items(), key=lambda item: int(item[0])
+            ):
+                latency = shard["latency"]
+                rows.append(
+                    [
+                        shard_id,
+                        "-" if worker["worker"] is None else worker["worker"] + 1,
+                        worker["pid"],
+                        shard["guilds"],
+                        f"{latency * 1000:.0f}ms" if latency is not None else "-",
+                        state,
+                    ]
+                )
+
+        table = make_table(
+            rows, ["Shard", "Worker", "PID", "Guilds", "Latency", "State"]
+        )
+        e.description = f"```prolog\n{table}\n```"
+        e.add_field("This Process", self.bot.sharding.describe())
+        e.add_field("Total Guilds", str(guilds))
+        e.add_field("Cached Members", str(members))
+        await ctx.reply(embeds=[e])
+
+    @debug.subcommand(aliases=["analytics"])
+    async def usage(self, ctx: prefixed.PrefixedContext, day: str = "") -> None:
+        """
+        Get estimated command and role button usage for a day.
+
+        The day is given as YYYY-MM-DD, and defaults to today (in UTC).
+        """
+        if day:
+            try:
+                day = datetime.date.fromisoformat(day).isoformat()
+            except ValueError:
+                raise ipy.errors.BadArgument(f"`{day}` is not a valid day.") from None
+
+        usage = await self.bot.analytics.get(day or self.bot.analytics.current.day)
+        if not usage:
+            raise ipy.errors.BadArgument(f"No usage was recorded on {day}.")
+
+        e = debug_embed(f"Usage ({usage.day})")
+        counts = usage.counts
+        rows = sorted(
+            (
+                [key, counts.estimate(key), users.count()]
+                for key, users in usage.keys.items()
+            ),
+            key=lambda row: row[1],
+            reverse=True,
+        )
+
+        if rows:
+            table = make_table(rows[:25], ["Key", "Uses", "Users"])
+            e.description = f"```prolog\n{table}\n```"
+        else:
+            e.description = "Nothing has been used yet."
+
+        total_users = usage.users.count()
+        e.add_field(
+            "Distinct Users",
+            f"{total_users} ±{math.ceil(total_users * usage.users.relative_error)}",
+        )
+        e.add_field("Total Uses", str(counts.total))
+
+        bounds = [
+            "Uses are never undercounted, and are overcounted by at most"
+            f" {math.ceil(counts.error_bound)} with {counts.confidence:.0%} confidence."
+        ]
+        if usage.keys:
+            key_error = next(iter(usage.keys.values())).relative_error
+            bounds.append(
+                f"Users per key are within ±{key_error:.1%} (one standard error)."
+            )
+        e.add_field("Error Bounds", " ".join(bounds), inline=False)
+        await ctx.reply(embeds=[e])
+
+    async def send_report(
+        self, ctx: prefixed.PrefixedContext, text: str, file_name: str
+    ) -> None:
+        if len(text) <= 1900:
+            await ctx.reply(f"```\n{text}\n```")
+            return
+        await ctx.reply(
+            "The report was too long, so it's attached instead.",
+            file=ipy.File(io.BytesIO(text.encode()), file_name=file_name),
+        )
+
+    @debug.subcommand(aliases=["memory"])
+    async def mem(self, ctx: prefixed.PrefixedContext) -> None:
+        """Get memory usage and the state of memory profiling."""
+        e = debug_embed("Memory")
+        if self.memory.tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            e.add_field(
+                "Traced", f"{current / 2**20:.1f} MiB (peak {peak / 2**20:.1f} MiB)"
+            )
+        else:
+            e.add_field("Traced", "Not tracing - use `debug mem start`.")
+
+        e.add_field(
+            "Snapshots",
+            ", ".join(f"`{name}`" for name in self.memory.snapshots) or "None",
+        )
+        e.add_field("GC Counts", " | ".join(str(count) for count in gc.get_count()))
+        await ctx.reply(embeds=[e])
+
+    @mem.subcommand(name="start")
+    async def mem_start(self, ctx: prefixed.PrefixedContext, frames: int = 1) -> None:
+        """Starts tracing allocations, keeping the given number of frames for each."""
+        if self.memory.tracing:
+            raise ipy.errors.BadArgument("tracemalloc is already running.")
+        self.memory.start(frames)
+        await ctx.reply("Started tracing allocations.")
+
+    @mem.subcommand(name="stop")
+    async def mem_stop(self, ctx: prefixed.PrefixedContext) -> None:
+        """Stops tracing allocations and drops all snapshots."""
+        self.memory.stop()
+        await ctx.reply("Stopped tracing allocations.")
+
+    @mem.subcommand(name="snapshot", aliases=["snap"])
+    async def mem_snapshot(self, ctx: prefixed.PrefixedContext, name: str) -> None:
+        """Takes a named snapshot of traced allocations."""
+        if not self.memory.tracing:
+            raise ipy.errors.BadArgument("tracemalloc isn't running.")
+
+        async with ctx.channel.typing:
+            snapshot = await self.memory.snapshot(name)
+        await ctx.reply(f"Took snapshot `{name}` ({len(snapshot.traces)} traces).")
+
+    @mem.subcommand(name="top")
+    async def mem_top(self, ctx: prefixed.PrefixedContext, name: str) -> None:
+        """Lists the top allocators in a snapshot by file and line."""
+        if name not in self.memory.snapshots:
+            raise ipy.errors.BadArgument(f"There's no snapshot named `{name}`.")
+
+        async with ctx.channel.typing:
+            report = await self.memory.report(None, name)
+        await self.send_report(ctx, report, f"top_{name}.txt")
+
+    @mem.subcommand(name="diff")
+    async def mem_diff(self, ctx: prefixed.PrefixedContext, old: str, new: str) -> None:
+        """Lists what changed the most between two snapshots, by file and line."""
+        for name in (old, new):
+            if name not in self.memory.snapshots:
+                raise ipy.errors.BadArgument(f"There's no snapshot named `{name}`.")
+
+        async with ctx.channel.typing:
+            report = await self.memory.report(old, new)
+        await self.send_report(ctx, report, f"diff_{old}_{new}.txt")
+
+    @mem.subcommand(name="types", aliases=["census"])
+    async def mem_types(self, ctx: prefixed.PrefixedContext) -> None:
+        """Counts live objects by type."""
+        async with ctx.channel.typing:
+            counts = await self.memory.census()
+
+        table = make_table([list(row) for row in counts], ["Type", "Count"])
+        await self.send_report(ctx, table, "types.txt")
+
+    @debug.subcommand(aliases=["prof", "cpu"])
+    async def profile(
+        self, ctx: prefixed.PrefixedContext, seconds: float = 10, rate: int = 100
+    ) -> None:
+        """
+        Samples what the event loop is doing for a number of seconds.
+
+        Sends back the hottest functions, and every stack sampled in collapsed
+        format for flamegraph tools. Time the loop spends idle shows up under
+        the selector's select.
+        """
+        if not 0 < seconds <= 120:
+            raise ipy.errors.BadArgument("Profiles can be up to 120 seconds long.")
+        if not 1 <= rate <= 1000:
+            raise ipy.errors.BadArgument("The rate must be between 1 and 1000 Hz.")
+        if self.profiler and self.profiler.running:
+            raise ipy.errors.BadArgument("A profile is already running.")
+
+        # this coroutine runs on the loop's thread, which is what gets sampled
+        self.profiler = SamplingProfiler(threading.get_ident(), rate=rate)
+        async with ctx.channel.typing:
+            result = await asyncio.to_thread(self.profiler.run, seconds)
+
+        if not result.samples:
+            await ctx.reply("No samples were taken.")
+            return
+
+        rows = [
+            [
+                textwrap.shorten(label, 50, placeholder="..."),
+                f"{own / result.samples:.1%}",
+                f"{result.total[label] / result.samples:.1%}",
+            ]
+            for label, own in result.own.most_common(15)
+        ]
+        table = make_table(rows, ["Function", "Own", "Total"])
+
+        e = debug_embed("Profile")
+        e.description = f"```prolog\n{table}\n```"
+        e.add_field("Samples", str(result.samples))
+        e.add_field(
+            "Rate",
+            f"{result.samples / result.duration:.0f} Hz over {result.duration:.1f}s",
+        )
+        await ctx.reply(
+            embeds=[e],
+            file=ipy.File(
+                io.BytesIO(result.collapsed().encode()), file_name="profile.folded"
+            ),
+        )
+
+    @debug.subcommand(aliases=["members"])
+    async def member_info(
+        self, ctx: prefixed.PrefixedContext, count: int = 10000
+    ) -> None:
+        """
+        Compares full and compact members, built from this server's roles.
+
+        Measures memory per cached member and how long role and permission
+        checks take on each, then shows how the member cache is doing.
+        """
+        if not 1 <= count <= 100000:
+            raise ipy.errors.BadArgument("The count must be between 1 and 100000.")
+
+        async with ctx.channel.typing:
+            rows = await asyncio.to_thread(
+                members.benchmark, self.bot, ctx.guild, count
+            )
+
+        e = debug_embed("Members")
+        table = make_table(rows, ["Measure", "Full", "Compact"])
+        e.description = f"```prolog\n{table}\n```"
+
+        store = self.bot.cache.member_cache
+        if isinstance(store, members.CompactMemberStore):
+            e.add_field(
+                "Member Cache",
+                f"{len(store.hot)} full | {len(store.records)} compact |"
+                f" {store.rebuilds} rebuilds",
+            )
+        else:
+            e.add_field("Member Cache", f"{len(store)} full | compacting disabled")
+        await ctx.reply(embeds=[e])
+
+    @debug.subcommand(aliases=["embeds"])
+    async def embed_info(
+        self, ctx: prefixed.PrefixedContext, count: int = 1000
+    ) -> None:
+        """
+        Compares validating a raw embed with the requests it can save.
+
+        Times the validator on a large sample embed, with and without errors,
+        against the REST latency seen over the last hour. Nothing is sent.
+        """
+        if not 1 <= count <= 100000:
+            raise ipy.errors.BadArgument("The count must be between 1 and 100000.")
+
+        async with ctx.channel.typing:
+            results = await asyncio.to_thread(embeds.benchmark, count)
+
+        # measured from the requests the bot already makes, rather than
+        # sending ones known to be bad
+        rest_stats = self.bot.latency_monitor.rest_stats(60 * 60)
+        rest = rest_stats.p50 if rest_stats else None
+
+        rows = [
+            [
+                label,
+                f"{seconds * 1e6:.1f}us",
+                f"{rest / seconds:.0f}x" if rest else "-",
+            ]
+            for label, seconds in results
+        ]
+        if rest:
+            rows.append(["REST p50 (1h)", f"{rest * 1000:.0f}ms", "1x"])
+
+        e = debug_embed("Embeds")
+        table = make_table(rows, ["Measure", "Time", "vs REST"])
+        e.description = f"```prolog\n{table}\n```"
+        e.add_field("Validations", str(count))
+        if not rest:
+            e.add_field("REST", "No requests have been timed yet.")
+        await ctx.reply(embeds=[e])
+
+    @debug.subcommand(aliases=["task"])
+    async def tasks(self, ctx: prefixed.PrefixedContext) -> None:
+        """Get information about running, queued and failed background tasks."""
+        e = debug_embed("Tasks")
+
+        supervisor = self.bot.tasks
+        records = sorted(supervisor.active.values(), key=lambda r: r.created)
+        rows = [
+            [record.name, record.group, record.state, f"{record.duration:.1f}s"]
+            for record in [*records, *supervisor.failed]
+        ]
+
+        if rows:
+            table = make_table(rows, ["Task", "Group", "State", "Duration"])
+            e.description = f"```prolog\n{table}\n```"
+        else:
+            e.description = "No tasks are running and none have failed."
+
+        if supervisor.failed:
+            last = supervisor.failed[-1]
+            e.add_field(
+                "Last Failure",
+                f"`{last.name}`: `{type(last.error).__name__}: {last.error}`",
+            )
+        e.add_field(
+            "Finished",
+            " | ".join(
+                f"{count} {state}"
+                for state, count in sorted(supervisor.completed.items())
+            )
+            or "None",
+        )
         await ctx.reply(embeds=[e])
 
     @debug.subcommand()
@@ -387,12 +1085,14 @@ class OwnerCMDs(ipy.Extension):
 
     @debug.subcommand(aliases=["sync-interactions", "sync-cmds", "sync_cmds", "sync"])
     async def sync_interactions(
-        self, ctx: prefixed.PrefixedContext, scope: int = 0
+        self, ctx: prefixed.PrefixedContext, scope: int = 0, *, flags: str = ""
     ) -> None:
         """
-        Synchronizes all interaction commands with Discord.
+        Synchronizes changed interaction commands with Discord.
 
-        Should not be used lightly.
+        Only commands that changed since the last sync are sent. Pass "verify"
+        to check against the commands Discord has instead of the local
+        manifest, and "dry" to only show what would be done.
         """
         # syncing interactions in inherently intensive and
         # has a high risk of running into the ratelimit
@@ -400,17 +1100,33 @@ class OwnerCMDs(ipy.Extension):
         # to even matter, for big bots, running into this ratelimit
         # can cause havoc on other functions
 
-        # we only sync to the global scope to make delete_commands
-        # a lot better in the ratelimiting department, but i
-        # would still advise caution to any self-hosters, and would
-        # only suggest using this when necessary
+        # because of that, this works from a manifest of what was last
+        # pushed and only sends the difference, rather than overwriting
+        # every command in the scope each time
+        options = set(flags.lower().split())
+        if unknown := options - {"dry", "verify"}:
+            raise ipy.errors.BadArgument(f"Unknown flags: {', '.join(unknown)}.")
 
+        sync = CommandSync(self.bot, COMMAND_MANIFEST_PATH)
         async with ctx.channel.typing:
-            await self.bot.synchronise_interactions(
-                scopes=[scope], delete_commands=True
-            )
+            operations = await sync.plan(scope, verify="verify" in options)
+            if "dry" not in options:
+                await sync.apply(scope, operations)
 
-        await ctx.reply("Done!")
+        if not operations:
+            await ctx.reply("Already up to date!")
+            return
+
+        e = debug_embed("Dry Run" if "dry" in options else "Sync")
+        table = make_table(
+            [
+                [operation.action, operation.name, operation.command_type.name.lower()]
+                for operation in operations
+            ],
+            ["Action", "Command", "Type"],
+        )
+        e.description = f"```prolog\n{table}\n```"
+        await ctx.reply(embeds=[e])
 
     async def ext_error(
         self,
@@ -1,5 +1,9 @@
+import asyncio
+import functools
 import importlib
 import io
+import re
+import time
 import typing
 
 import aiohttp
@@ -8,7 +12,58 @@ import interactions as ipy
 import orjson
 from interactions.ext import prefixed_commands as prefixed
 
+import common.embeds as embeds
+import common.retry as retry
 import common.utils as utils
+from common.message_index import payload_hash
+from common.scheduler import ScheduledMessage
+
+MAX_BROADCAST_TARGETS = 50
+# the http client already queues requests behind discord's per-channel and
+# global limits - this just keeps a broadcast from flooding that queue
+BROADCAST_CONCURRENCY = 5
+
+MAX_SCHEDULED_PER_GUILD = 25
+MAX_SCHEDULE_AHEAD = 365 * 24 * 60 * 60
+MAX_WHEN_LENGTH = 50
+
+
+def parse_when(when: str) -> float:
+    # the time is kept in the modal's custom id until it's submitted, which only
+    # has room for so much
+    if len(when := when.strip()) > MAX_WHEN_LENGTH:
+        raise ipy.errors.BadArgument("Could not understand that time.")
+    due = utils.parse_time(when)
+    if due <= time.time():
+        raise ipy.errors.BadArgument("That time is in the past.")
+    if due - time.time() > MAX_SCHEDULE_AHEAD:
+        raise ipy.errors.BadArgument("Messages can be scheduled up to a year ahead.")
+    return due
+
+
+_channel_mention_reg = re.compile(r"<#([0-9]{15,})>")
+
+
+class BroadcastTargetConverter(ipy.GuildChannelConverter):
+    """
+    Converts channel mentions and IDs from this server, but not channel names.
+
+    Broadcast targets are followed by free text, so a word in the message that
+    happened to name a channel would otherwise be taken as another target.
+    """
+
+    async def convert(
+        self, ctx: prefixed.PrefixedContext, argument: str
+    ) -> ipy.GuildChannel:
+        if not (
+            self._get_id_match(argument) or _channel_mention_reg.fullmatch(argument)
+        ):
+            raise ipy.errors.BadArgument(f"{argument} is not a channel mention or ID.")
+
+        channel = await super().convert(ctx, argument)
+        if channel._guild_id != ctx.guild_id:
+            raise ipy.errors.BadArgument(f"{channel.mention} is not in this server.")
+        return channel
 
 
 class SayCMDs(utils.Extension):
@@ -16,6 +71,7 @@ class SayCMDs(utils.Extension):
         self.bot: utils.OSCBotBase = bot
         self.name = "Say"
         self.add_ext_auto_defer(enabled=False)
+        self.bot.tasks.configure_group("broadcast", limit=BROADCAST_CONCURRENCY)
 
     @ipy.slash_command(
         "say",
@@ -82,7 +138,14 @@ class SayCMDs(utils.Extension):
             raise ipy.errors.BadArgument("You must provide content or files.")
 
         try:
-            msg = await channel.send(content, files=files_to_upload)
+            msg = await self.bot.retry.run(
+                "say",
+                functools.partial(channel.send, content, files=files_to_upload),
+                idempotent=False,
+                ctx=ctx,
+            )
+            self.bot.message_index.record_message(msg)
+            await self.bot.audit.record_message("say", ctx, msg)
             if channel != ctx.channel:
                 await ctx.reply(
                     embeds=utils.make_embed(f"Sent! See it at {msg.jump_url}.")
@@ -91,6 +154,158 @@ class SayCMDs(utils.Extension):
             for ipy_file in files_to_upload:
                 ipy_file.file.close()
 
+    @staticmethod
+    async def stage_attachments(
+        ctx: prefixed.PrefixedContext,
+    ) -> list[tuple[str, bytes]]:
+        # downloads every attachment once, up front, so each target can be sent
+        # a copy from memory
+        for attachment in ctx.message.attachments:
+            if attachment.size > ctx.guild.filesize_limit:
+                raise ipy.errors.BadArgument(
+                    "Attachments must be less than"
+                    f" {humanize.naturalsize(attachment.size, binary=True)} in"
+                    " size."
+                )
+
+        async def download(
+            session: aiohttp.ClientSession, attachment: ipy.Attachment
+        ) -> tuple[str, bytes] | None:
+            async with session.get(attachment.url) as resp:
+                if resp.status == 200:
+                    return attachment.filename, await resp.read()
+                return None
+
+        async with aiohttp.ClientSession() as session:
+            staged = await asyncio.gather(
+                *(download(session, a) for a in ctx.message.attachments)
+            )
+        return [s for s in staged if s is not None]
+
+    async def broadcast_send(
+        self,
+        channel: ipy.GuildText,
+        content: str | None,
+        staged: list[tuple[str, bytes]],
+    ) -> ipy.Message | str:
+        # returns the sent message, or why it couldn't be sent
+        async def send() -> ipy.Message:
+            # sending reads the files, so each attempt gets new ones
+            files = [ipy.File(io.BytesIO(data), name) for name, data in staged]
+            try:
+                return await channel.send(content, files=files)
+            finally:
+                for ipy_file in files:
+                    ipy_file.file.close()
+
+        try:
+            msg = await self.bot.retry.run("broadcast", send, idempotent=False)
+        except retry.CircuitOpenError:
+            return "Skipped while Discord is having issues."
+        except ipy.errors.HTTPException as e:
+            return f"{e.status} {e.text or 'Unknown error'}"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return type(e).__name__
+
+        self.bot.message_index.record_message(msg)
+        return msg
+
+    @prefixed.prefixed_command(name="broadcast", aliases=["say-all"])
+    @utils.proper_permissions()
+    async def broadcast_cmd(
+        self,
+        ctx: prefixed.PrefixedContext,
+        targets: ipy.Greedy[BroadcastTargetConverter],
+        *,
+        content: typing.Optional[str] = None,
+    ) -> None:
+        channels: dict[int, ipy.GuildText] = {}
+        for target in targets:
+            # greedy arguments can't be unions, so the channel types are
+            # checked here instead
+            if isinstance(target, ipy.GuildCategory):
+                channels |= {int(c.id): c for c in target.text_channels}
+            elif isinstance(target, ipy.GuildText):
+                channels[int(target.id)] = target
+            else:
+                raise ipy.errors.BadArgument(
+                    f"{target.mention} is not a text channel or category."
+                )
+
+        if not channels:
+            raise ipy.errors.BadArgument(
+                "You must provide at least one channel or category."
+            )
+        if len(channels) > MAX_BROADCAST_TARGETS:
+            raise ipy.errors.BadArgument(
+                f"You can broadcast to at most {MAX_BROADCAST_TARGETS} channels."
+            )
+
+        if not ctx.message.attachments and not content:
+            raise ipy.errors.BadArgument("You must provide content or files.")
+
+        needed = ipy.Permissions.SEND_MESSAGES
+        if ctx.message.attachments:
+            needed |= ipy.Permissions.ATTACH_FILES
+
+        results: dict[ipy.GuildText, ipy.Message | str] = {}
+        sendable: list[ipy.GuildText] = []
+        for channel in channels.values():
+            # channels we know we can't send to don't cost a request
+            if needed not in channel.permissions_for(ctx.guild.me):
+                results[channel] = "Missing permissions."
+            else:
+                sendable.append(channel)
+
+        # nothing is downloaded if it couldn't be sent anywhere
+        staged = (
+            await self.stage_attachments(ctx)
+            if sendable and ctx.message.attachments
+            else []
+        )
+        if sendable and not staged and not content:
+            raise ipy.errors.BadArgument("You must provide content or files.")
+
+        sends: dict[ipy.GuildText, asyncio.Task] = {
+            channel: self.bot.create_task(
+                self.broadcast_send(channel, content, staged),
+                name=f"broadcast #{channel.name}",
+                group="broadcast",
+            )
+            for channel in sendable
+        }
+
+        async with ctx.channel.typing:
+            for channel, result in zip(
+                sends, await asyncio.gather(*sends.values()), strict=True
+            ):
+                # the supervisor reports anything broadcast_send didn't catch
+                # and gives back None, which still has to count as a failure
+                results[channel] = (
+                    "Unexpected error, see logs." if result is None else result
+                )
+                if isinstance(result, ipy.Message):
+                    await self.bot.audit.record_message("broadcast", ctx, result)
+
+        sent = [
+            f"{c.mention}: {r.jump_url}"
+            for c, r in results.items()
+            if isinstance(r, ipy.Message)
+        ]
+        failed = [f"{c.mention}: {r}" for c, r in results.items() if isinstance(r, str)]
+
+        lines = [f"Sent to {len(sent)}/{len(results)} channels.", *sent]
+        if failed:
+            lines.extend(("", "**Failed:**", *failed))
+
+        description = "\n".join(lines)
+        if len(description) > ipy.const.EMBED_MAX_DESC_LENGTH:
+            description = (
+                description[: ipy.const.EMBED_MAX_DESC_LENGTH - 1].rsplit("\n", 1)[0]
+                + "\n…"
+            )
+        await ctx.reply(embeds=utils.make_embed(description, title="Broadcast"))
+
     @ipy.slash_command(
         "raw-embed-say",
         description="Allows you to send an embed from the raw embed JSON format.",
@@ -139,13 +354,21 @@ class SayCMDs(utils.Extension):
             await ctx.send("You can only edit embeds sent by the bot.", ephemeral=True)
             return
 
+        # the indexed payload is what was originally sent, without the extra
+        # fields discord adds to embeds - as long as it's still what's there
+        current = [embed.to_dict() for embed in msg.embeds]
+        entry = self.bot.message_index.get(int(msg.id))
+        embed_dict = (
+            entry.embeds[0]
+            if entry and entry.embeds and entry.embed_hash == payload_hash(current)
+            else current[0]
+        )
+
         modal = ipy.Modal(
             ipy.InputText(
                 label="Enter the embed you want to edit:",
                 style=ipy.TextStyles.PARAGRAPH,
-                value=orjson.dumps(
-                    msg.embeds[0].to_dict(), option=orjson.OPT_INDENT_2
-                ).decode(),
+                value=orjson.dumps(embed_dict, option=orjson.OPT_INDENT_2).decode(),
                 custom_id="embed-edit",
             ),
             title="Raw Embed Edit",
@@ -210,8 +433,22 @@ class SayCMDs(utils.Extension):
         else:
             files_to_upload = None
 
+        if files_to_upload is None and self.bot.message_index.is_unchanged(
+            int(message.id), content=content
+        ):
+            await ctx.reply(embeds=utils.make_embed("Nothing to edit."))
+            return
+
         try:
-            msg = await message.edit(content=content, files=files_to_upload)
+            # uploads would be read twice, so only plain edits are retried
+            msg = await self.bot.retry.run(
+                "edit",
+                functools.partial(message.edit, content=content, files=files_to_upload),
+                idempotent=files_to_upload is None,
+                ctx=ctx,
+            )
+            self.bot.message_index.record_message(msg)
+            await self.bot.audit.record_message("edit", ctx, msg)
             if msg.channel != ctx.channel:
                 await ctx.reply(
                     embeds=utils.make_embed(f"Edited! See it at {msg.jump_url}.")
@@ -221,108 +458,428 @@ class SayCMDs(utils.Extension):
                 for ipy_file in files_to_upload:
                     ipy_file.file.close()
 
+    @ipy.slash_command(
+        "schedule",
+        description="Manages messages scheduled to be sent later.",
+        default_member_permissions=ipy.Permissions.MANAGE_MESSAGES,
+        sub_cmd_name="say",
+        sub_cmd_description="Schedules a message to be sent later.",
+    )
+    @ipy.slash_option(
+        "when",
+        "When to send it - a duration like 1d12h, or a Discord timestamp.",
+        ipy.OptionType.STRING,
+        required=True,
+    )
+    @ipy.slash_option(
+        "channel",
+        "The channel to send the message in.",
+        ipy.OptionType.CHANNEL,
+        required=False,
+        channel_types=[ipy.ChannelType.GUILD_TEXT],
+    )
+    async def schedule_say(
+        self, ctx: ipy.SlashContext, when: str, channel: ipy.GuildText | None = None
+    ) -> None:
+        if channel is None:
+            channel = ctx.channel  # type: ignore
+            if typing.TYPE_CHECKING:
+                assert channel is not None
+
+        # checked now so a bad time is caught before the modal is filled in,
+        # but durations count from when it's submitted
+        parse_when(when)
+        modal = ipy.Modal(
+            ipy.InputText(
+                label="Enter the content you want to send:",
+                style=ipy.TextStyles.PARAGRAPH,
+                custom_id="say-content",
+            ),
+            title="Schedule Message",
+            custom_id=f"schedule-say|{channel.id}|{when.strip()}",
+        )
+        await ctx.send_modal(modal)
+
+    @ipy.slash_command(
+        "schedule",
+        description="Manages messages scheduled to be sent later.",
+        default_member_permissions=ipy.Permissions.MANAGE_MESSAGES,
+        sub_cmd_name="embed",
+        sub_cmd_description="Schedules an embed from the raw embed JSON format.",
+    )
+    @ipy.slash_option(
+        "when",
+        "When to send it - a duration like 1d12h, or a Discord timestamp.",
+        ipy.OptionType.STRING,
+        required=True,
+    )
+    @ipy.slash_option(
+        "channel",
+        "The channel to send the embed in.",
+        ipy.OptionType.CHANNEL,
+        required=False,
+        channel_types=[ipy.ChannelType.GUILD_TEXT],
+    )
+    async def schedule_embed(
+        self, ctx: ipy.SlashContext, when: str, channel: ipy.GuildText | None = None
+    ) -> None:
+        if channel is None:
+            channel = ctx.channel  # type: ignore
+            if typing.TYPE_CHECKING:
+                assert channel is not None
+
+        # checked now so a bad time is caught before the modal is filled in,
+        # but durations count from when it's submitted
+        parse_when(when)
+        modal = ipy.Modal(
+            ipy.InputText(
+                label="Enter the embed you want to send:",
+                style=ipy.TextStyles.PARAGRAPH,
+                custom_id="embed-say",
+            ),
+            title="Schedule Raw Embed",
+            custom_id=f"schedule-embed|{channel.id}|{when.strip()}",
+        )
+        await ctx.send_modal(modal)
+
+    @ipy.slash_command(
+        "schedule",
+        description="Manages messages scheduled to be sent later.",
+        default_member_permissions=ipy.Permissions.MANAGE_MESSAGES,
+        sub_cmd_name="list",
+        sub_cmd_description="Lists the messages scheduled in this server.",
+    )
+    async def schedule_list(self, ctx: ipy.SlashContext) -> None:
+        if not (jobs := self.bot.scheduler.for_guild(int(ctx.guild_id))):
+            await ctx.send(
+                embeds=utils.make_embed("No messages are scheduled."), ephemeral=True
+            )
+            return
+
+        description = "\n".join(
+            f"`{job.id}` <t:{int(job.due)}:f> in <#{job.channel_id}>: "
+            + (
+                f"embed `{(job.embed or {}).get('title') or 'Untitled'}`"
+                if job.embed
+                else f"`{(job.content or '')[:40]}`"
+            )
+            for job in jobs
+        )
+        await ctx.send(
+            embeds=utils.make_embed(description, title="Scheduled Messages"),
+            ephemeral=True,
+        )
+
+    @ipy.slash_command(
+        "schedule",
+        description="Manages messages scheduled to be sent later.",
+        default_member_permissions=ipy.Permissions.MANAGE_MESSAGES,
+        sub_cmd_name="cancel",
+        sub_cmd_description="Cancels a scheduled message.",
+    )
+    @ipy.slash_option(
+        "id",
+        "The ID of the scheduled message.",
+        ipy.OptionType.STRING,
+        required=True,
+        autocomplete=True,
+        argument_name="job_id",
+    )
+    async def schedule_cancel(self, ctx: ipy.SlashContext, job_id: str) -> None:
+        job = self.bot.scheduler.jobs.get(int(job_id)) if job_id.isdigit() else None
+        if not job or job.guild_id != int(ctx.guild_id):
+            raise ipy.errors.BadArgument("No scheduled message has that ID.")
+
+        await self.bot.scheduler.cancel(job.id)
+        await ctx.send(
+            embeds=utils.make_embed(f"Cancelled scheduled message `{job.id}`."),
+            ephemeral=True,
+        )
+
+    @schedule_cancel.autocomplete("id")
+    async def schedule_id_autocomplete(self, ctx: ipy.AutocompleteContext) -> None:
+        choices = []
+        for job in self.bot.scheduler.for_guild(int(ctx.guild_id)):
+            if ctx.input_text not in str(job.id):
+                continue
+
+            channel = self.bot.get_channel(job.channel_id)
+            channel_name = channel.name if channel else job.channel_id
+            choices.append(
+                {"name": f"{job.id} in #{channel_name}", "value": str(job.id)}
+            )
+
+        await ctx.send(choices[:25])
+
+    async def schedule_message(
+        self,
+        ctx: ipy.ModalContext,
+        *,
+        content: str | None = None,
+        embed: dict | None = None,
+    ) -> None:
+        _, channel_id, when = ctx.custom_id.split("|", 2)
+
+        try:
+            due = int(parse_when(when))
+        except ipy.errors.BadArgument as e:
+            # an exact time can pass while the modal is still open
+            await ctx.send(embeds=utils.error_embed_generate(str(e)), ephemeral=True)
+            return
+
+        if len(self.bot.scheduler.for_guild(int(ctx.guild_id))) >= (
+            MAX_SCHEDULED_PER_GUILD
+        ):
+            await ctx.send(
+                embeds=utils.error_embed_generate(
+                    f"Only {MAX_SCHEDULED_PER_GUILD} messages can be scheduled at once."
+                ),
+                ephemeral=True,
+            )
+            return
+
+        job = ScheduledMessage(
+            int(ctx.id),
+            int(ctx.guild_id),
+            int(channel_id),
+            int(ctx.author_id),
+            due,
+            content,
+            embed,
+        )
+        await self.bot.scheduler.add(job)
+        await self.bot.audit.record(
+            "schedule", ctx, channel_id=job.channel_id, detail=f"job {job.id} at {due}"
+        )
+        await ctx.send(
+            embeds=utils.make_embed(
+                f"Scheduled for <t:{due}:f> (<t:{due}:R>). The ID is `{job.id}`."
+            ),
+            ephemeral=True,
+        )
+
+    async def edit_by_id(
+        self,
+        ctx: ipy.ModalContext,
+        message_id: int,
+        *,
+        content: str | None = None,
+        embed: dict | None = None,
+    ) -> ipy.Message | None:
+        # edits the message directly instead of fetching it first - the index
+        # knows the channel for messages the bot posted, and the context menu
+        # was used in the message's channel otherwise
+        entry = self.bot.message_index.get(message_id)
+        channel_id = entry.channel_id if entry else ctx.channel_id
+
+        payload = ipy.process_message_payload(content=content, embeds=embed)
+        try:
+            message_data = await self.bot.retry.run(
+                "edit",
+                functools.partial(
+                    self.bot.http.edit_message, payload, channel_id, message_id
+                ),
+                ctx=ctx,
+            )
+        except ipy.errors.NotFound:
+            return None
+
+        msg = self.bot.cache.place_message_data(message_data)
+        self.bot.message_index.record_message(
+            msg, embeds=[embed] if embed is not None else None
+        )
+        await self.bot.audit.record_message("edit", ctx, msg)
+        return msg
+
+    @staticmethod
+    async def parse_raw_embed(ctx: ipy.ModalContext, response_id: str) -> dict | None:
+        # parses and validates the raw embed before any requests are made,
+        # so a bad embed costs one interaction response instead of a 400
+        raw_embed = ctx.responses[response_id]
+
+        try:
+            embed_dict = orjson.loads(raw_embed) if len(raw_embed) <= 7000 else None
+        except orjson.JSONDecodeError:
+            embed_dict = None
+
+        if embed_dict is None:
+            await ctx.send(
+                embeds=utils.error_embed_generate("Could not parse the raw embed."),
+                ephemeral=True,
+            )
+            return None
+
+        if isinstance(embed_dict, dict) and "embeds" in embed_dict:
+            embed_list = embed_dict["embeds"]
+            if isinstance(embed_list, list):
+                if not embed_list:
+                    await ctx.send(
+                        embeds=utils.error_embed_generate(
+                            "The raw embed's `embeds` list is empty."
+                        ),
+                        ephemeral=True,
+                    )
+                    return None
+                embed_dict = embed_list[0]
+            else:
+                embed_dict = embed_list
+
+        if errors := embeds.validate_embed(embed_dict):
+            await ctx.send(
+                embeds=utils.error_embed_generate(embeds.format_errors(errors)),
+                ephemeral=True,
+            )
+            return None
+
+        return embed_dict
+
     @ipy.listen(ipy.events.ModalCompletion)  # type: ignore
     async def on_modal_completion(self, event: ipy.events.ModalCompletion) -> None:
         ctx = event.ctx
 
         if ctx.custom_id.startswith("raw-embed-say"):
-            await ctx.defer(ephemeral=True)
+            if await self.bot.interaction_limiter.limited(ctx, "raw-embed-say"):
+                return
 
-            channel_id = int(ctx.custom_id.split("|")[1])
-            channel = await self.bot.fetch_channel(channel_id)
-            if not channel:
-                await ctx.send(
-                    embeds=utils.error_embed_generate("Could not get channel."),
-                    ephemeral=True,
-                )
+            embed_dict = await self.parse_raw_embed(ctx, "embed-say")
+            if embed_dict is None:
                 return
 
-            try:
-                if len(ctx.responses["embed-say"]) > 7000:
+            async with self.bot.defer_tracker.guard(
+                ctx, "raw-embed-say", ephemeral=True
+            ):
+                channel_id = int(ctx.custom_id.split("|")[1])
+                channel = await self.bot.retry.run(
+                    "fetch-channel",
+                    functools.partial(self.bot.fetch_channel, channel_id),
+                    ctx=ctx,
+                )
+                if not channel:
                     await ctx.send(
-                        embeds=utils.error_embed_generate(
-                            "Could not parse the raw embed."
-                        ),
+                        embeds=utils.error_embed_generate("Could not get channel."),
                         ephemeral=True,
                     )
                     return
 
-                embed_dict: dict = orjson.loads(ctx.responses["embed-say"])
-            except orjson.JSONDecodeError:
+                msg = await self.bot.retry.run(
+                    "embed-say",
+                    functools.partial(channel.send, embed=embed_dict),
+                    idempotent=False,
+                    ctx=ctx,
+                )
+                self.bot.message_index.record_message(msg, embeds=[embed_dict])
+                await self.bot.audit.record_message("embed-say", ctx, msg)
                 await ctx.send(
-                    embeds=utils.error_embed_generate("Could not parse the raw embed."),
+                    embeds=utils.make_embed(f"Sent! See it at {msg.jump_url}."),
                     ephemeral=True,
                 )
-                return
-
-            if embeds := embed_dict.get("embeds"):
-                embed_dict = embeds[0]
-
-            msg = await channel.send(embed=embed_dict)
-            await ctx.send(
-                embeds=utils.make_embed(f"Sent! See it at {msg.jump_url}."),
-                ephemeral=True,
-            )
 
         elif ctx.custom_id.startswith("raw-embed-edit"):
-            await ctx.defer(ephemeral=True)
+            if await self.bot.interaction_limiter.limited(ctx, "raw-embed-edit"):
+                return
+
+            embed_dict = await self.parse_raw_embed(ctx, "embed-edit")
+            if embed_dict is None:
+                return
 
             msg_id = int(ctx.custom_id.split("|")[1])
 
-            try:
-                embed_dict: dict = orjson.loads(ctx.responses["embed-edit"])
-            except orjson.JSONDecodeError:
+            if self.bot.message_index.is_unchanged(msg_id, embeds=[embed_dict]):
                 await ctx.send(
-                    embeds=utils.error_embed_generate("Could not parse the raw embed."),
-                    ephemeral=True,
+                    embeds=utils.make_embed("Nothing to edit."), ephemeral=True
                 )
                 return
 
-            if embeds := embed_dict.get("embeds"):
-                embed_dict = embeds[0]
-
-            message = await ctx.channel.fetch_message(msg_id)
-            if message:
-                await message.edit(embed=embed_dict)
-                await ctx.send(embeds=utils.make_embed("Edited!"), ephemeral=True)
-            else:
-                await ctx.send(
-                    embeds=utils.error_embed_generate("Could not get message."),
-                    ephemeral=True,
-                )
+            async with self.bot.defer_tracker.guard(
+                ctx, "raw-embed-edit", ephemeral=True
+            ):
+                if await self.edit_by_id(ctx, msg_id, embed=embed_dict):
+                    await ctx.send(embeds=utils.make_embed("Edited!"), ephemeral=True)
+                else:
+                    await ctx.send(
+                        embeds=utils.error_embed_generate("Could not get message."),
+                        ephemeral=True,
+                    )
 
         elif ctx.custom_id.startswith("say-cmd"):
-            await ctx.defer(ephemeral=True)
+            if await self.bot.interaction_limiter.limited(ctx, "say-cmd"):
+                return
 
-            channel_id = int(ctx.custom_id.split("|")[1])
-            channel = await self.bot.fetch_channel(channel_id)
-            if not channel:
+            async with self.bot.defer_tracker.guard(ctx, "say-cmd", ephemeral=True):
+                channel_id = int(ctx.custom_id.split("|")[1])
+                channel = await self.bot.retry.run(
+                    "fetch-channel",
+                    functools.partial(self.bot.fetch_channel, channel_id),
+                    ctx=ctx,
+                )
+                if not channel:
+                    await ctx.send(
+                        embeds=utils.error_embed_generate("Could not get channel."),
+                        ephemeral=True,
+                    )
+                    return
+
+                msg = await self.bot.retry.run(
+                    "say",
+                    functools.partial(
+                        channel.send, content=ctx.responses["say-content"]
+                    ),
+                    idempotent=False,
+                    ctx=ctx,
+                )
+                self.bot.message_index.record_message(msg)
+                await self.bot.audit.record_message("say", ctx, msg)
                 await ctx.send(
-                    embeds=utils.error_embed_generate("Could not get channel."),
+                    embeds=utils.make_embed(f"Sent! See it at {msg.jump_url}."),
                     ephemeral=True,
                 )
-                return
-
-            msg = await channel.send(content=ctx.responses["say-content"])
-            await ctx.send(
-                embeds=utils.make_embed(f"Sent! See it at {msg.jump_url}."),
-                ephemeral=True,
-            )
 
         elif ctx.custom_id.startswith("edit-message"):
-            await ctx.defer(ephemeral=True)
+            if await self.bot.interaction_limiter.limited(ctx, "edit-message"):
+                return
 
             msg_id = int(ctx.custom_id.split("|")[1])
-            message = await ctx.channel.fetch_message(msg_id)
-            if not message:
+            content = ctx.responses["edit-content"]
+
+            if self.bot.message_index.is_unchanged(msg_id, content=content):
                 await ctx.send(
-                    embeds=utils.error_embed_generate("Could not get message."),
-                    ephemeral=True,
+                    embeds=utils.make_embed("Nothing to edit."), ephemeral=True
                 )
                 return
 
-            await message.edit(content=ctx.responses["edit-content"])
-            await ctx.send(embeds=utils.make_embed("Edited!"), ephemeral=True)
+            async with self.bot.defer_tracker.guard(
+                ctx, "edit-message", ephemeral=True
+            ):
+                if not await self.edit_by_id(ctx, msg_id, content=content):
+                    await ctx.send(
+                        embeds=utils.error_embed_generate("Could not get message."),
+                        ephemeral=True,
+                    )
+                    return
+
+                await ctx.send(embeds=utils.make_embed("Edited!"), ephemeral=True)
+
+        elif ctx.custom_id.startswith("schedule-say"):
+            if await self.bot.interaction_limiter.limited(ctx, "schedule-say"):
+                return
+
+            async with self.bot.defer_tracker.guard(
+                ctx, "schedule-say", ephemeral=True
+            ):
+                await self.schedule_message(ctx, content=ctx.responses["say-content"])
+
+        elif ctx.custom_id.startswith("schedule-embed"):
+            if await self.bot.interaction_limiter.limited(ctx, "schedule-embed"):
+                return
+
+            embed_dict = await self.parse_raw_embed(ctx, "embed-say")
+            if embed_dict is None:
+                return
+
+            async with self.bot.defer_tracker.guard(
+                ctx, "schedule-embed", ephemeral=True
+            ):
+                await self.schedule_message(ctx, embed=embed_dict)
 
 
 def setup(bot: utils.OSCBotBase) -> None:
@@ -1,9 +1,11 @@
+import functools
 import importlib
 
 import interactions as ipy
 import interactions.ext.prefixed_commands as prefixed
 
 import common.utils as utils
+from common.ratelimit import BucketSpec
 
 
 class SelfRoles(utils.Extension):
@@ -11,6 +13,12 @@ class SelfRoles(utils.Extension):
         self.bot: utils.OSCBotBase = bot
         self.name = "Self Role"
 
+        # role changes share one per-guild route limit, so a single member
+        # spamming buttons could hold everyone else up
+        self.bot.interaction_limiter.configure(
+            "rolebutton", user=BucketSpec(3, 10), guild=BucketSpec(10, 10)
+        )
+
         self.project_roles: dict[str, tuple[int, str]] = {
             "Jukebox": (1153816806654492672, "🎶"),
             "OSC Workout": (1417623455443980439, "💪"),
@@ -119,40 +127,65 @@ class SelfRoles(utils.Extension):
         ctx = event.ctx
 
         if ctx.custom_id.startswith("rolebutton|"):
-            await ctx.defer(ephemeral=True)
-
-            member = ctx.author
-            if not isinstance(member, ipy.Member):
-                await ctx.send(
-                    embeds=utils.error_embed_generate(
-                        "An error occured. Please try again."
-                    ),
-                    ephemeral=True,
-                )
+            if await self.bot.interaction_limiter.limited(ctx, "rolebutton"):
                 return
 
-            role_id = int(ctx.custom_id.removeprefix("rolebutton|"))
-            role = await ctx.guild.fetch_role(role_id)
-            if not role:
-                await ctx.send(
-                    embeds=utils.error_embed_generate(
-                        "An error occured. Please try again."
-                    ),
-                    ephemeral=True,
-                )
-                return
-
-            if member.has_role(role):
-                await member.remove_role(role)
-                await ctx.send(
-                    embeds=utils.make_embed(f"Removed `{role.name}`."),
-                    ephemeral=True,
-                )
-            else:
-                await member.add_role(role)
-                await ctx.send(
-                    embeds=utils.make_embed(f"Added `{role.name}`."), ephemeral=True
+            async with self.bot.defer_tracker.guard(ctx, "rolebutton", ephemeral=True):
+                member = ctx.author
+                if not isinstance(member, ipy.Member):
+                    await ctx.send(
+                        embeds=utils.error_embed_generate(
+                            "An error occured. Please try again."
+                        ),
+                        ephemeral=True,
+                    )
+                    return
+
+                role_id = int(ctx.custom_id.removeprefix("rolebutton|"))
+                role = await self.bot.retry.run(
+                    "fetch-role",
+                    functools.partial(ctx.guild.fetch_role, role_id),
+                    ctx=ctx,
                 )
+                if not role:
+                    await ctx.send(
+                        embeds=utils.error_embed_generate(
+                            "An error occured. Please try again."
+                        ),
+                        ephemeral=True,
+                    )
+                    return
+
+                if member.has_role(role):
+                    # adding or removing a role twice is harmless
+                    await self.bot.retry.run(
+                        "role-toggle",
+                        functools.partial(member.remove_role, role),
+                        ctx=ctx,
+                    )
+                    await self.bot.audit.record(
+                        "role-remove",
+                        ctx,
+                        channel_id=int(ctx.channel_id),
+                        detail=role.name,
+                    )
+                    await ctx.send(
+                        embeds=utils.make_embed(f"Removed `{role.name}`."),
+                        ephemeral=True,
+                    )
+                else:
+                    await self.bot.retry.run(
+                        "role-toggle", functools.partial(member.add_role, role), ctx=ctx
+                    )
+                    await self.bot.audit.record(
+                        "role-add",
+                        ctx,
+                        channel_id=int(ctx.channel_id),
+                        detail=role.name,
+                    )
+                    await ctx.send(
+                        embeds=utils.make_embed(f"Added `{role.name}`."), ephemeral=True
+                    )
 
 
 def setup(bot: utils.OSCBotBase) -> None:
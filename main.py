@@ -3,16 +3,35 @@ import contextlib
 import logging
 import os
 import sys
+from pathlib import Path
 
 import interactions as ipy
 import typing_extensions as typing
-from interactions.ext import prefixed_commands as prefixed
 
 from load_env import load_env
 
 load_env()
 
+import common.db as db
+import common.tracing as tracing
 import common.utils as utils
+from common.analytics import UsageAnalytics, usage_key
+from common.audit import AuditJournal
+from common.cache_snapshot import CacheSnapshot
+from common.defer import AdaptiveAutoDefer, DeferTracker
+from common.gateway_filter import FilteredProcessors, check_intents
+from common.http_interactions import InteractionServer
+from common.latency import LatencyMonitor
+from common.members import CompactMemberStore
+from common.message_index import MessageIndex
+from common.permissions import PermissionCache
+from common.prefix_filter import FilteredPrefixedManager
+from common.ratelimit import InteractionRateLimiter
+from common.retry import RetryPolicy
+from common.scheduler import Scheduler
+from common.sharding import ShardPlan, ShardStatus, WorkerLauncher
+from common.tasks import TaskSupervisor
+from common.tracing import Tracer
 
 logger = logging.getLogger("oscbot")
 logger.setLevel(logging.INFO)
@@ -38,7 +57,26 @@ class OSCBot(utils.OSCBotBase):
             else f"Reconnected at {time_format}!"
         )
 
-        await self.owner.send(connect_msg)
+        self.latency_monitor.connected("login" if self.init_load else "reconnect")
+        self.cache_snapshot.ready()
+        self.shard_status.start()
+        # only one worker tells the owner, however many there are
+        if self.sharding.leader:
+            await self.owner.send(connect_msg)
+        else:
+            logger.info("Ready with %s.", self.sharding.describe())
+
+        if self.init_load and self.sharding.leader:
+            # listeners from main and the client are only hooked up on login,
+            # so this can't run any earlier
+            check_intents(self)
+
+        # scheduled messages that came due while we were away are sent now -
+        # each worker only loads the ones for guilds on its shards
+        await self.scheduler.load()
+        self.audit.start()
+        self.analytics.start()
+        self.tracer.start()
 
         self.init_load = False
 
@@ -51,6 +89,7 @@ class OSCBot(utils.OSCBotBase):
 
     @ipy.listen("resume")
     async def on_resume_func(self) -> None:
+        self.latency_monitor.connected("resume")
         activity = ipy.Activity(
             name="Status",
             type=ipy.ActivityType.CUSTOM,
@@ -58,24 +97,109 @@ class OSCBot(utils.OSCBotBase):
         )
         await self.change_presence(activity=activity)
 
+    @ipy.listen(ipy.events.ShardConnect)
+    async def on_shard_connect(self, event: ipy.events.ShardConnect) -> None:
+        # shards reconnect on their own once the client is ready, without
+        # another ready event
+        self.latency_monitor.connected(f"shard {event.shard_id}")
+
+    @ipy.listen(ipy.events.CommandCompletion)
+    async def on_command_completion(self, event: ipy.events.CommandCompletion) -> None:
+        self.defer_tracker.finish(event.ctx)
+        self.analytics.record(event.ctx)
+        tracing.end_trace(name=usage_key(event.ctx))
+
+    @ipy.listen(ipy.events.CommandError)
+    async def on_command_error_trace(self, event: ipy.events.CommandError) -> None:
+        # the error handler itself lives in an extension
+        tracing.fail(event.error)
+
+    @ipy.listen(ipy.events.Component)
+    async def on_component(self, event: ipy.events.Component) -> None:
+        self.analytics.record(event.ctx)
+
+    @ipy.listen(ipy.events.MessageUpdate)
+    async def on_message_update(self, event: ipy.events.MessageUpdate) -> None:
+        # the bot's messages can also be edited by other processes or sessions
+        if event.after._author_id == self.user.id:
+            self.message_index.update_message(event.after)
+
+    @ipy.listen(ipy.events.MemberUpdate)
+    async def on_member_update(self, event: ipy.events.MemberUpdate) -> None:
+        self.permission_cache.invalidate_member(
+            int(event.guild_id), int(event.after.id)
+        )
+
+    @ipy.listen(ipy.events.RoleUpdate)
+    async def on_role_update(self, event: ipy.events.RoleUpdate) -> None:
+        self.permission_cache.invalidate_guild(int(event.guild_id))
+
+    @ipy.listen(ipy.events.RoleDelete)
+    async def on_role_delete(self, event: ipy.events.RoleDelete) -> None:
+        self.permission_cache.invalidate_guild(int(event.guild_id))
+
+    @ipy.listen(ipy.events.GuildUpdate)
+    async def on_guild_update(self, event: ipy.events.GuildUpdate) -> None:
+        # the owner implicitly has every permission
+        if not event.before or event.before._owner_id != event.after._owner_id:
+            self.permission_cache.invalidate_guild(int(event.after.id))
+
     @ipy.listen(is_default_listener=True)
     async def on_error(self, event: ipy.events.Error) -> None:
         await utils.error_handle(event.error, ctx=event.ctx)
 
-    def create_task(self, coro: typing.Coroutine) -> asyncio.Task:
-        # see the "important" note below for why we do this (to prevent early gc)
+    async def get_context(self, data: dict) -> ipy.InteractionContext:
+        ctx = await super().get_context(data)
+        # a command's trace starts here and ends once it completes - modals and
+        # components are handled by listeners with no such end, so theirs start
+        # in the defer tracker's guard instead, and autocompletes are answered
+        # too quickly to be worth it
+        if not isinstance(
+            ctx, ipy.AutocompleteContext | ipy.ModalContext | ipy.ComponentContext
+        ):
+            self.tracer.begin(usage_key(ctx) or "interaction", ctx.id)
+        return ctx
+
+    def create_task(
+        self,
+        coro: typing.Coroutine,
+        *,
+        name: str | None = None,
+        group: str = "default",
+        daemon: bool = False,
+    ) -> asyncio.Task:
+        # the supervisor also keeps a reference to the task to prevent early gc
         # https://docs.python.org/3/library/asyncio-task.html#asyncio.create_task
-        task = asyncio.create_task(coro)
-        self.background_tasks.add(task)
-        task.add_done_callback(self.background_tasks.discard)
-        return task
+        return self.tasks.create_task(coro, name=name, group=group, daemon=daemon)
 
     async def stop(self) -> None:
+        # tasks may still need the connection, so they finish up first
+        await self.tasks.shutdown(deadline=10.0)
+        await self.audit.close()
+        await self.analytics.close()
+        await self.tracer.close()
+        if self.interaction_server:
+            await self.interaction_server.close()
         await super().stop()
+        await self.cache_snapshot.save()
+        await self.message_index.save()
+        await self.db.close()
 
 
 intents = ipy.Intents.DEFAULT | ipy.Intents.MESSAGE_CONTENT
 mentions = ipy.AllowedMentions.all()
+sharding = ShardPlan.from_env()
+# one shard uses the usual client, which doesn't take these
+shard_options = (
+    {"total_shards": sharding.total_shards, "shard_ids": sharding.shard_ids}
+    if sharding.sharded
+    else {}
+)
+
+# with ADAPTIVE_DEFER off, every handler is deferred immediately like before
+defer_tracker = DeferTracker(
+    deadline=2.0, enabled=utils.env_flag("ADAPTIVE_DEFER", default=True)
+)
 
 bot = OSCBot(
     activity=ipy.Activity(
@@ -87,15 +211,89 @@ bot = OSCBot(
     disable_dm_commands=True,
     allowed_mentions=mentions,
     intents=intents,
-    auto_defer=ipy.AutoDefer(enabled=True, time_until_defer=0),
+    auto_defer=AdaptiveAutoDefer(defer_tracker),
     logger=logger,
+    **shard_options,
 )
 bot.init_load = True
 bot.color = ipy.Color(int(os.environ["BOT_COLOR"]))  # #d14136 or 13713718
-prefixed.setup(bot)
+bot.defer_tracker = defer_tracker
+bot.permission_cache = PermissionCache()
+bot.interaction_limiter = InteractionRateLimiter()
+bot.retry = RetryPolicy()
+bot.sharding = sharding
+bot.shard_status = ShardStatus(
+    bot, sharding, Path(os.environ["DIRECTORY_OF_FILE"]) / "shards"
+)
+bot.tasks = TaskSupervisor(bot)
+bot.latency_monitor = LatencyMonitor(bot)
+# with CACHE_SNAPSHOT off, cold fetches are still counted for comparison
+bot.cache_snapshot = CacheSnapshot(
+    bot,
+    sharding.worker_path(Path(os.environ["DIRECTORY_OF_FILE"]) / "cache_snapshot.bin"),
+    enabled=utils.env_flag("CACHE_SNAPSHOT", default=True),
+)
+# has to come after the snapshot, which swaps out the cache itself
+if utils.env_flag("COMPACT_MEMBERS", default=True):
+    bot.cache.member_cache = CompactMemberStore(bot)
+bot.tracer = Tracer(
+    bot,
+    sharding.worker_path(Path(os.environ["DIRECTORY_OF_FILE"]) / "traces.jsonl"),
+    sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", 0.05)),
+)
+defer_tracker.tracer = bot.tracer
+bot.scheduler = Scheduler(bot)
+bot.audit = AuditJournal(bot)
+bot.analytics = UsageAnalytics(
+    bot, sharding.worker_path(Path(os.environ["DIRECTORY_OF_FILE"]) / "usage")
+)
+bot.processors = FilteredProcessors(
+    bot, bot.processors, skip_unhandled=utils.env_flag("SKIP_UNHANDLED_EVENTS")
+)
+bot.message_index = MessageIndex(
+    sharding.worker_path(Path(os.environ["DIRECTORY_OF_FILE"]) / "message_index.json"),
+    shared=sharding.shared,
+)
+FilteredPrefixedManager(bot)
+
+# with a public key set, interactions come through the http endpoint - every
+# process that serves it listens on its own port, for a load balancer to use,
+# so it can be sent interactions for guilds on another worker's shards
+bot.interaction_server = None
+if sharding.serves_interactions and (
+    public_key := os.environ.get("INTERACTIONS_PUBLIC_KEY")
+):
+    bot.interaction_server = InteractionServer(
+        bot,
+        public_key,
+        host=os.environ.get("INTERACTIONS_HOST", "127.0.0.1"),
+        port=int(os.environ.get("INTERACTIONS_PORT", 8080))
+        + sharding.interactions_index,
+        fetch_guilds=sharding.shared,
+    )
+
+
+def report_database_error(error: Exception) -> None:
+    # batched writes are flushed in the background, so nothing else sees these
+    bot.dispatch(ipy.events.Error(source="database", error=error))
 
 
 async def start() -> None:
+    # DB_URL is only set up for docker - local runs use an sqlite file, and
+    # workers split the connections one process would have had
+    bot.db = await db.connect(
+        os.environ.get("DB_URL"),
+        Path(os.environ["DIRECTORY_OF_FILE"]) / "oscbot.db",
+        pool_size=max(2, 5 // sharding.processes),
+        on_error=report_database_error,
+    )
+    # the launcher has already migrated for the workers
+    if sharding.worker is None:
+        await bot.db.migrate(Path(os.environ["DIRECTORY_OF_FILE"]) / "migrations")
+    await bot.message_index.load()
+    await bot.analytics.load()
+    await bot.cache_snapshot.load()
+
     ext_list = utils.get_all_extensions(os.environ["DIRECTORY_OF_FILE"])
 
     for ext in ext_list:
@@ -104,9 +302,63 @@ async def start() -> None:
         except ipy.errors.ExtensionLoadException:
             raise
 
+    if bot.interaction_server:
+        await bot.interaction_server.start()
     await bot.astart(os.environ["MAIN_TOKEN"])
 
 
+async def serve() -> None:
+    # interactions workers never connect to the gateway - they log in over
+    # http, and only answer what the endpoint is sent
+    bot.db = await db.connect(
+        os.environ.get("DB_URL"),
+        Path(os.environ["DIRECTORY_OF_FILE"]) / "oscbot.db",
+        pool_size=2,
+        on_error=report_database_error,
+    )
+    await bot.message_index.load()
+    await bot.analytics.load()
+
+    for ext in utils.get_all_extensions(os.environ["DIRECTORY_OF_FILE"]):
+        bot.load_extension(ext)
+
+    await bot.login(os.environ["MAIN_TOKEN"])
+    # without a gateway there's no ready event, so this is what it would do
+    await bot._init_interactions()
+    bot._startup = True
+    bot._ready.set()
+
+    await bot.scheduler.load()
+    bot.audit.start()
+    bot.analytics.start()
+    bot.tracer.start()
+    await bot.interaction_server.start()
+
+    try:
+        # runs until the launcher interrupts it
+        await asyncio.Event().wait()
+    finally:
+        await bot.stop()
+
+
+async def launch() -> None:
+    if sharding.interactions_workers and not os.environ.get("INTERACTIONS_PUBLIC_KEY"):
+        raise RuntimeError("INTERACTIONS_WORKERS needs INTERACTIONS_PUBLIC_KEY set.")
+
+    # migrations run once here, before any worker can use the database
+    database = await db.connect(
+        os.environ.get("DB_URL"), Path(os.environ["DIRECTORY_OF_FILE"]) / "oscbot.db"
+    )
+    try:
+        await database.migrate(Path(os.environ["DIRECTORY_OF_FILE"]) / "migrations")
+    finally:
+        await database.close()
+
+    await WorkerLauncher(
+        sharding, Path(os.environ["DIRECTORY_OF_FILE"]) / "shards"
+    ).run()
+
+
 if __name__ == "__main__":
     run_method = asyncio.run
 
@@ -117,4 +369,9 @@ if __name__ == "__main__":
         run_method = uvloop.run
 
     with contextlib.suppress(KeyboardInterrupt):
-        run_method(start())
+        if sharding.launcher:
+            run_method(launch())
+        elif sharding.interactions_worker is not None:
+            run_method(serve())
+        else:
+            run_method(start())
@@ -0,0 +1,9 @@
+CREATE TABLE IF NOT EXISTS scheduled_messages (
+    id BIGINT PRIMARY KEY,
+    guild_id BIGINT NOT NULL,
+    channel_id BIGINT NOT NULL,
+    author_id BIGINT NOT NULL,
+    due DOUBLE PRECISION NOT NULL,
+    content TEXT,
+    embed TEXT
+);
@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS audit_log (
+    created_at DOUBLE PRECISION NOT NULL,
+    action TEXT NOT NULL,
+    user_id BIGINT NOT NULL,
+    guild_id BIGINT,
+    channel_id BIGINT,
+    message_id BIGINT,
+    detail TEXT
+);
+
+CREATE INDEX IF NOT EXISTS audit_log_created_at ON audit_log (created_at);
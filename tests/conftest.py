@@ -0,0 +1,4 @@
+import os
+
+# common.utils reads this on import, and it's normally set by the bot's .env
+os.environ.setdefault("BOT_COLOR", "13713718")
@@ -0,0 +1,114 @@
+import pytest
+
+import common.embeds as embeds
+
+
+def test_sample_embed_is_valid() -> None:
+    assert embeds.validate_embed(embeds.SAMPLE_EMBED) == []
+
+
+def test_invalid_sample_reports_every_mistake() -> None:
+    errors = embeds.validate_embed(embeds.INVALID_SAMPLE_EMBED)
+    assert len(errors) == 3
+    assert any("`embed.title`" in error for error in errors)
+    assert any("`embed.url`" in error for error in errors)
+    assert any("`embed.color`" in error for error in errors)
+
+
+def test_errors_name_nested_paths() -> None:
+    errors = embeds.validate_embed(
+        {"fields": [{"name": "ok", "value": "ok"}, {"name": "", "value": 1}]}
+    )
+    assert errors == [
+        "`embed.fields[1].name` must not be empty.",
+        "`embed.fields[1].value` must be a string.",
+    ]
+
+
+def test_missing_required_keys() -> None:
+    errors = embeds.validate_embed({"footer": {}, "author": {"url": "https://a.b"}})
+    assert errors == [
+        "`embed.footer.text` is required.",
+        "`embed.author.name` is required.",
+    ]
+
+
+def test_total_size_is_limited() -> None:
+    data = {
+        "description": "x" * 4096,
+        "fields": [{"name": "n", "value": "x" * 1024} for _ in range(2)],
+    }
+    errors = embeds.validate_embed(data)
+    assert len(errors) == 1
+    assert "at most 6000 characters long in total (got 6146)" in errors[0]
+
+
+@pytest.mark.parametrize(
+    ("url", "valid"),
+    [
+        ("https://example.com/a.png", True),
+        ("http://example.com", True),
+        ("attachment://image.png", True),
+        ("ftp://example.com", False),
+        ("https://", False),
+        ("attachment://dir/image.png", False),
+    ],
+)
+def test_image_urls(url: str, valid: bool) -> None:
+    assert (embeds.validate_embed({"image": {"url": url}}) == []) is valid
+
+
+def test_link_urls_cannot_be_attachments() -> None:
+    assert embeds.validate_embed({"url": "attachment://image.png"})
+
+
+@pytest.mark.parametrize("value", [True, -1, 0x1000000, "red"])
+def test_bad_colors(value: object) -> None:
+    assert embeds.validate_embed({"color": value})
+
+
+def test_timestamps() -> None:
+    assert embeds.validate_embed({"timestamp": "2024-01-01T00:00:00Z"}) == []
+    assert embeds.validate_embed({"timestamp": "yesterday"})
+
+
+def test_unknown_keys_are_ignored() -> None:
+    assert embeds.validate_embed({"type": "rich", "title": "hi"}) == []
+
+
+def test_not_an_object() -> None:
+    assert embeds.validate_embed([]) == ["`embed` must be an object."]
+
+
+def test_format_errors_limits_the_list() -> None:
+    formatted = embeds.format_errors([str(i) for i in range(12)], limit=10)
+    assert formatted.count("\n- ") == 10
+    assert formatted.endswith("...and 2 more.")
+
+
+def test_template_renders_variables() -> None:
+    template = embeds.EmbedTemplate(
+        "t", '{"title": "{{ name }}", "description": "Hi {{name}}, {{ when }}!"}'
+    )
+    assert template.variables == ("name", "when")
+    assert template.render({"name": "Sam", "when": "today"}) == {
+        "title": "Sam",
+        "description": "Hi Sam, today!",
+    }
+
+
+def test_template_takes_the_first_of_embeds() -> None:
+    template = embeds.EmbedTemplate("t", '{"embeds": [{"title": "a"}, {}]}')
+    assert template.render({}) == {"title": "a"}
+
+
+def test_template_needs_every_variable() -> None:
+    template = embeds.EmbedTemplate("t", '{"title": "{{ a }}"}')
+    with pytest.raises(ValueError, match="Missing values for: a"):
+        template.render({})
+
+
+@pytest.mark.parametrize("source", ["{", "[]", "1"])
+def test_bad_template_sources(source: str) -> None:
+    with pytest.raises(ValueError):
+        embeds.EmbedTemplate("t", source)
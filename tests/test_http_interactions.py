@@ -0,0 +1,90 @@
+import time
+import types
+
+import nacl.signing
+import pytest
+
+from common.http_interactions import InteractionServer
+
+BODY = b'{"type": 1}'
+
+
+@pytest.fixture(scope="module")
+def signing_key() -> nacl.signing.SigningKey:
+    return nacl.signing.SigningKey.generate()
+
+
+@pytest.fixture
+def server(signing_key: nacl.signing.SigningKey) -> InteractionServer:
+    async def post_initial_response(*args: object, **kwargs: object) -> None:
+        pass
+
+    bot = types.SimpleNamespace(
+        http=types.SimpleNamespace(post_initial_response=post_initial_response)
+    )
+    return InteractionServer(bot, signing_key.verify_key.encode().hex())  # type: ignore
+
+
+def sign(key: nacl.signing.SigningKey, timestamp: str, body: bytes) -> str:
+    return key.sign(timestamp.encode() + body).signature.hex()
+
+
+def test_valid_signature(
+    server: InteractionServer, signing_key: nacl.signing.SigningKey
+) -> None:
+    timestamp = str(int(time.time()))
+    assert server.verify(sign(signing_key, timestamp, BODY), timestamp, BODY)
+
+
+def test_changed_body(
+    server: InteractionServer, signing_key: nacl.signing.SigningKey
+) -> None:
+    timestamp = str(int(time.time()))
+    signature = sign(signing_key, timestamp, BODY)
+    assert not server.verify(signature, timestamp, b'{"type": 2}')
+
+
+def test_changed_timestamp(
+    server: InteractionServer, signing_key: nacl.signing.SigningKey
+) -> None:
+    # the timestamp is signed too, so it can't be bumped to replay a request
+    timestamp = int(time.time())
+    signature = sign(signing_key, str(timestamp - 1), BODY)
+    assert not server.verify(signature, str(timestamp), BODY)
+
+
+def test_other_key(server: InteractionServer) -> None:
+    timestamp = str(int(time.time()))
+    other = nacl.signing.SigningKey.generate()
+    assert not server.verify(sign(other, timestamp, BODY), timestamp, BODY)
+
+
+@pytest.mark.parametrize("skew", [-301, 301])
+def test_old_or_future_timestamps(
+    server: InteractionServer, signing_key: nacl.signing.SigningKey, skew: int
+) -> None:
+    timestamp = str(int(time.time()) + skew)
+    assert not server.verify(sign(signing_key, timestamp, BODY), timestamp, BODY)
+
+
+@pytest.mark.parametrize(
+    ("signature", "timestamp"),
+    [
+        ("", "0"),
+        ("zz", None),
+        ("00" * 64, None),
+        ("ab", None),
+        (None, "soon"),
+        (None, ""),
+    ],
+)
+def test_malformed_headers(
+    server: InteractionServer,
+    signing_key: nacl.signing.SigningKey,
+    signature: str | None,
+    timestamp: str | None,
+) -> None:
+    now = str(int(time.time()))
+    timestamp = now if timestamp is None else timestamp
+    signature = sign(signing_key, now, BODY) if signature is None else signature
+    assert not server.verify(signature, timestamp, BODY)
@@ -0,0 +1,121 @@
+import logging
+import mmap
+import re
+import time
+from pathlib import Path
+
+import pytest
+
+from common.log_search import LogIndex, LogSearch
+
+START = time.mktime((2024, 1, 1, 12, 0, 0, 0, 0, -1))
+
+
+def record(offset: int, level: str, logger: str, message: str) -> str:
+    asctime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(START + offset))
+    return f"{asctime},000:{level}:{logger}: {message}\n"
+
+
+@pytest.fixture
+def log_path(tmp_path: Path) -> Path:
+    path = tmp_path / "discord.log"
+    path.write_text(
+        record(0, "INFO", "oscbot", "started")
+        + record(60, "WARNING", "oscbot.db", "slow query")
+        + record(120, "ERROR", "oscbot", "failed")
+        + "Traceback (most recent call last):\n  ValueError: boom\n"
+        + record(180, "DEBUG", "interactions", "heartbeat")
+        + record(240, "INFO", "oscbotx", "other logger")
+    )
+    return path
+
+
+def update(index: LogIndex, path: Path) -> None:
+    with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        index.update(m, path.stat())
+
+
+def test_index_span(log_path: Path) -> None:
+    index = LogIndex(log_path, stride=1)
+    update(index, log_path)
+
+    size = log_path.stat().st_size
+    assert index.times == [START + offset for offset in (0, 60, 120, 180, 240)]
+    assert index.span(None, None, size) == range(size)
+    # starts one index point early, since records before it may still match
+    assert index.span(START + 90, None, size).start == index.offsets[1]
+    assert index.span(None, START + 90, size).stop == index.offsets[2]
+    assert index.span(START + 1000, None, size).start == index.offsets[-1]
+
+
+def test_index_is_rebuilt_when_truncated(log_path: Path) -> None:
+    index = LogIndex(log_path, stride=1)
+    update(index, log_path)
+
+    log_path.write_text(record(300, "INFO", "oscbot", "new"))
+    update(index, log_path)
+    assert index.times == [START + 300]
+
+
+def messages(records: list) -> list[str]:
+    return [r.text.split(": ", 1)[1].splitlines()[0] for r in records]
+
+
+def test_search_everything(log_path: Path) -> None:
+    records = LogSearch(log_path).search()
+    assert messages(records) == [
+        "started",
+        "slow query",
+        "failed",
+        "heartbeat",
+        "other logger",
+    ]
+    # a record takes in the lines after it, up to the next record
+    assert records[2].text.endswith("ValueError: boom")
+    assert records[2].level == "ERROR"
+
+
+def test_search_by_time(log_path: Path) -> None:
+    records = LogSearch(log_path).search(since=START + 60, until=START + 180)
+    assert messages(records) == ["slow query", "failed", "heartbeat"]
+
+
+def test_search_by_level_and_logger(log_path: Path) -> None:
+    search = LogSearch(log_path)
+    assert messages(search.search(level=logging.WARNING)) == ["slow query", "failed"]
+    # child loggers match, but loggers that only share a prefix don't
+    assert messages(search.search(logger="oscbot")) == [
+        "started",
+        "slow query",
+        "failed",
+    ]
+
+
+def test_search_by_pattern(log_path: Path) -> None:
+    records = LogSearch(log_path).search(pattern=re.compile("boom|slow"))
+    assert messages(records) == ["slow query", "failed"]
+
+
+def test_search_keeps_the_newest(log_path: Path) -> None:
+    assert messages(LogSearch(log_path).search(limit=2)) == [
+        "heartbeat",
+        "other logger",
+    ]
+
+
+def test_rotated_files_are_searched_oldest_first(log_path: Path) -> None:
+    (log_path.parent / "discord.log.2").write_text(
+        record(-120, "INFO", "oscbot", "oldest")
+    )
+    (log_path.parent / "discord.log.1").write_text(
+        record(-60, "INFO", "oscbot", "older")
+    )
+    (log_path.parent / "discord.log.3.gz").write_bytes(b"skipped")
+
+    search = LogSearch(log_path)
+    assert [path.name for path in search.files()] == [
+        "discord.log.2",
+        "discord.log.1",
+        "discord.log",
+    ]
+    assert messages(search.search())[:3] == ["oldest", "older", "started"]
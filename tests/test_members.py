@@ -0,0 +1,93 @@
+import interactions as ipy
+import pytest
+
+from common.members import CompactMember, CompactMemberStore
+
+GUILD_ID = 100000000000000000
+
+
+@pytest.fixture(scope="module")
+def client() -> ipy.Client:
+    return ipy.Client()
+
+
+def make_member(client: ipy.Client, user_id: int, role_ids: list[int]) -> ipy.Member:
+    return ipy.Member(
+        client=client,
+        id=user_id,
+        guild_id=GUILD_ID,
+        role_ids=role_ids,
+        nick="nick",
+        joined_at=1700000000,
+        pending=False,
+        flags=2,
+    )
+
+
+def test_has_role() -> None:
+    record = CompactMember(1, GUILD_ID, [30, 10, 20])
+    assert list(record.role_ids) == [10, 20, 30]
+    assert record.has_role(20)
+    assert record.has_role(10, 30)
+    assert not record.has_role(25)
+    assert not record.has_role(10, 40)
+    assert not record.has_role(5)
+    assert record.has_role()
+    assert not CompactMember(1, GUILD_ID, []).has_role(10)
+
+
+def test_round_trip(client: ipy.Client) -> None:
+    member = make_member(client, 1, [20, 10])
+    rebuilt = CompactMember.from_member(member).to_member(client)
+
+    assert rebuilt.id == member.id
+    assert rebuilt._guild_id == member._guild_id
+    assert sorted(rebuilt._role_ids) == sorted(member._role_ids)
+    assert rebuilt.nick == "nick"
+    assert rebuilt.joined_at == member.joined_at
+    assert rebuilt.pending is False
+    assert rebuilt.flags == member.flags
+    assert rebuilt.bot is False
+
+
+def test_unknown_pending_stays_unknown(client: ipy.Client) -> None:
+    member = ipy.Member(client=client, id=1, guild_id=GUILD_ID, joined_at=0)
+    assert CompactMember.from_member(member).to_member(client).pending is None
+
+
+def test_store_compacts_least_recently_used(client: ipy.Client) -> None:
+    store = CompactMemberStore(client, hot_size=2)
+    for user_id in (1, 2, 3):
+        store[GUILD_ID, user_id] = make_member(client, user_id, [user_id])
+
+    assert list(store.hot) == [(GUILD_ID, 2), (GUILD_ID, 3)]
+    assert list(store.records) == [(GUILD_ID, 1)]
+    assert len(store) == 3
+    assert (GUILD_ID, 1) in store
+
+    # looking one up rebuilds it, compacting the oldest in its place
+    assert store[GUILD_ID, 1].id == 1
+    assert store.rebuilds == 1
+    assert list(store.records) == [(GUILD_ID, 2)]
+
+
+def test_store_has_role_without_rebuilding(client: ipy.Client) -> None:
+    store = CompactMemberStore(client, hot_size=1)
+    store[GUILD_ID, 1] = make_member(client, 1, [10])
+    store[GUILD_ID, 2] = make_member(client, 2, [20])
+
+    assert store.has_role(GUILD_ID, 1, 10) is True
+    assert store.has_role(GUILD_ID, 2, 10) is False
+    assert store.has_role(GUILD_ID, 3, 10) is None
+    assert store.rebuilds == 0
+
+
+def test_store_delete(client: ipy.Client) -> None:
+    store = CompactMemberStore(client, hot_size=1)
+    store[GUILD_ID, 1] = make_member(client, 1, [])
+    store[GUILD_ID, 2] = make_member(client, 2, [])
+    del store[GUILD_ID, 1]
+    del store[GUILD_ID, 2]
+    assert len(store) == 0
+    with pytest.raises(KeyError):
+        del store[GUILD_ID, 1]
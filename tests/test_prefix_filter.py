@@ -0,0 +1,43 @@
+import pytest
+
+from common.prefix_filter import CommandTrie
+
+
+@pytest.fixture
+def trie() -> CommandTrie:
+    return CommandTrie(["!", "!!", "<@1> "], ["say", "say-all", "debug"])
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "!say hello",
+        "!say",
+        "!say-all #general hi",
+        "! debug",
+        "!!debug",
+        "<@1> say hi",
+        "!say\nhi",
+    ],
+)
+def test_commands_match(trie: CommandTrie, content: str) -> None:
+    assert trie.could_be_command(content)
+
+
+@pytest.mark.parametrize(
+    "content",
+    ["", "hello", "say hi", "!sa", "!sayy", "!unknown", "<@2> say", "?say", "!"],
+)
+def test_other_messages_dont(trie: CommandTrie, content: str) -> None:
+    assert not trie.could_be_command(content)
+
+
+def test_longer_prefixes_are_tried_first() -> None:
+    # with "!" tried first, "!!say" would look for a command named "!say"
+    trie = CommandTrie(["!", "!!"], ["say"])
+    assert trie.prefixes == ("!!", "!")
+    assert trie.could_be_command("!!say")
+
+
+def test_no_commands() -> None:
+    assert not CommandTrie(["!"], []).could_be_command("!say")
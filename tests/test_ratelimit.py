@@ -0,0 +1,94 @@
+import types
+
+import pytest
+
+import common.ratelimit as ratelimit
+from common.ratelimit import BucketSpec, InteractionRateLimiter
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(
+        ratelimit, "time", types.SimpleNamespace(monotonic=clock.monotonic)
+    )
+    return clock
+
+
+def test_bucket_spec() -> None:
+    spec = BucketSpec(5, 10)
+    assert spec.interval == 2
+    assert spec.burst == 8
+
+
+@pytest.mark.usefixtures("clock")
+def test_allows_a_burst_then_limits() -> None:
+    limiter = InteractionRateLimiter(user=BucketSpec(3, 3))
+    assert [limiter.acquire("button", 1, None) for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("button", 1, None) == pytest.approx(1)
+    assert limiter.rejected == {"button": 1}
+
+
+def test_refills_over_time(clock: Clock) -> None:
+    limiter = InteractionRateLimiter(user=BucketSpec(2, 2))
+    limiter.acquire("button", 1, None)
+    limiter.acquire("button", 1, None)
+    assert limiter.acquire("button", 1, None) > 0
+
+    clock.now += 1
+    assert limiter.acquire("button", 1, None) == 0
+    assert limiter.acquire("button", 1, None) > 0
+
+
+@pytest.mark.usefixtures("clock")
+def test_users_and_prefixes_are_separate() -> None:
+    limiter = InteractionRateLimiter(user=BucketSpec(1, 10))
+    assert limiter.acquire("button", 1, None) == 0
+    assert limiter.acquire("button", 2, None) == 0
+    assert limiter.acquire("modal", 1, None) == 0
+    assert limiter.acquire("button", 1, None) > 0
+
+
+@pytest.mark.usefixtures("clock")
+def test_guild_bucket_is_shared() -> None:
+    limiter = InteractionRateLimiter(user=BucketSpec(5, 10), guild=BucketSpec(2, 10))
+    assert limiter.acquire("button", 1, 100) == 0
+    assert limiter.acquire("button", 2, 100) == 0
+    assert limiter.acquire("button", 3, 100) > 0
+    assert limiter.acquire("button", 3, 200) == 0
+
+
+@pytest.mark.usefixtures("clock")
+def test_rejections_take_nothing() -> None:
+    limiter = InteractionRateLimiter(user=BucketSpec(1, 10), guild=BucketSpec(5, 10))
+    limiter.acquire("button", 1, 100)
+    guild_bucket = limiter.buckets["button", True, 100]
+    assert limiter.acquire("button", 1, 100) > 0
+    assert limiter.buckets["button", True, 100] == guild_bucket
+
+
+@pytest.mark.usefixtures("clock")
+def test_configured_limits() -> None:
+    limiter = InteractionRateLimiter(user=BucketSpec(1, 10))
+    limiter.configure("modal", user=BucketSpec(2, 10))
+    assert limiter.acquire("modal", 1, None) == 0
+    assert limiter.acquire("modal", 1, None) == 0
+    assert limiter.acquire("modal", 1, None) > 0
+
+
+def test_sweep_drops_full_buckets(clock: Clock) -> None:
+    limiter = InteractionRateLimiter(user=BucketSpec(1, 10), sweep_interval=60)
+    limiter.acquire("button", 1, None)
+    assert limiter.buckets
+
+    clock.now += 61
+    limiter.acquire("button", 2, None)
+    assert list(limiter.buckets) == [("button", False, 2)]
@@ -0,0 +1,109 @@
+from pathlib import Path
+
+import pytest
+
+from common.sharding import ShardPlan, shard_for, split_shards
+
+SHARD_ENV = (
+    "SHARD_COUNT",
+    "SHARD_PROCESSES",
+    "SHARD_WORKER",
+    "INTERACTIONS_WORKERS",
+    "INTERACTIONS_WORKER",
+)
+
+
+@pytest.fixture
+def env(monkeypatch: pytest.MonkeyPatch) -> pytest.MonkeyPatch:
+    for name in SHARD_ENV:
+        monkeypatch.delenv(name, raising=False)
+    return monkeypatch
+
+
+@pytest.mark.parametrize(
+    ("total", "processes", "groups"),
+    [
+        (1, 1, [[0]]),
+        (4, 2, [[0, 1], [2, 3]]),
+        (5, 2, [[0, 1, 2], [3, 4]]),
+        (7, 3, [[0, 1, 2], [3, 4], [5, 6]]),
+        (3, 3, [[0], [1], [2]]),
+    ],
+)
+def test_split_shards(total: int, processes: int, groups: list[list[int]]) -> None:
+    assert split_shards(total, processes) == groups
+
+
+def test_shard_for() -> None:
+    guild_id = (123 << 22) | 456
+    assert shard_for(guild_id, 1) == 0
+    assert shard_for(guild_id, 10) == 3
+    assert shard_for(str(guild_id), 10) == 3
+
+
+@pytest.mark.usefixtures("env")
+def test_default_plan() -> None:
+    plan = ShardPlan.from_env()
+    assert plan.shard_ids == [0]
+    assert not plan.sharded
+    assert not plan.launcher
+    assert not plan.shared
+    assert plan.serves_interactions
+    assert plan.leader
+    assert plan.owns(12345 << 22)
+    assert plan.worker_path(Path("a/b.json")) == Path("a/b.json")
+    assert plan.describe() == "shard 0 of 1"
+
+
+def test_single_process_sharded(env: pytest.MonkeyPatch) -> None:
+    env.setenv("SHARD_COUNT", "4")
+    plan = ShardPlan.from_env()
+    assert plan.shard_ids == [0, 1, 2, 3]
+    assert plan.sharded
+    assert not plan.launcher
+    assert plan.describe() == "shards 0-3 of 4"
+
+
+def test_launcher_and_workers(env: pytest.MonkeyPatch) -> None:
+    env.setenv("SHARD_COUNT", "5")
+    env.setenv("SHARD_PROCESSES", "2")
+    launcher = ShardPlan.from_env()
+    assert launcher.launcher
+    assert launcher.shared
+    assert not launcher.serves_interactions
+
+    env.setenv("SHARD_WORKER", "1")
+    worker = ShardPlan.from_env()
+    assert not worker.launcher
+    assert worker.shard_ids == [3, 4]
+    assert not worker.leader
+    assert worker.owns(3 << 22)
+    assert not worker.owns(0)
+    assert worker.worker_path(Path("a/b.json")) == Path("a/b.worker1.json")
+    assert worker.describe() == "worker 2/2, shards 3-4 of 5"
+
+
+def test_interactions_workers(env: pytest.MonkeyPatch) -> None:
+    env.setenv("SHARD_COUNT", "2")
+    env.setenv("INTERACTIONS_WORKERS", "2")
+    env.setenv("SHARD_WORKER", "0")
+    gateway = ShardPlan.from_env()
+    assert not gateway.serves_interactions
+
+    env.delenv("SHARD_WORKER")
+    env.setenv("INTERACTIONS_WORKER", "1")
+    plan = ShardPlan.from_env()
+    assert plan.shard_ids == []
+    assert plan.serves_interactions
+    assert plan.interactions_index == 1
+    assert not plan.owns(0)
+    assert plan.worker_path(Path("b.json")) == Path("b.interactions1.json")
+    assert plan.describe() == "interactions worker 2/2"
+
+
+@pytest.mark.parametrize(("count", "processes"), [("0", "1"), ("2", "3"), ("2", "0")])
+def test_bad_env(env: pytest.MonkeyPatch, count: str, processes: str) -> None:
+    env.setenv("SHARD_COUNT", count)
+    env.setenv("SHARD_PROCESSES", processes)
+    with pytest.raises(ValueError, match="SHARD_PROCESSES"):
+        ShardPlan.from_env()
@@ -0,0 +1,97 @@
+import pytest
+
+from common.analytics import MAX_TRACKED_KEYS, DailyUsage
+from common.sketches import CountMinSketch, HyperLogLog, hash64
+
+
+def test_hash64_is_stable() -> None:
+    # sketches are saved to disk, so hashes can't change between processes
+    assert hash64("command:say") == hash64("command:say")
+    assert hash64(1) == hash64("1")
+    assert 0 <= hash64("x") < 1 << 64
+
+
+def test_hyperloglog_empty() -> None:
+    assert HyperLogLog().count() == 0
+
+
+def test_hyperloglog_small_counts_are_exact_enough() -> None:
+    hll = HyperLogLog()
+    for value in range(10):
+        hll.add(value)
+        hll.add(value)
+    assert hll.count() == 10
+
+
+@pytest.mark.parametrize("count", [1000, 50000])
+def test_hyperloglog_estimate(count: int) -> None:
+    hll = HyperLogLog(12)
+    for value in range(count):
+        hll.add(value)
+    # well within 4 standard errors
+    assert abs(hll.count() - count) <= 4 * hll.relative_error * count
+
+
+def test_hyperloglog_merge() -> None:
+    first, second, both = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    for value in range(2000):
+        (first if value % 2 else second).add(value)
+        both.add(value)
+    first.merge(second)
+    assert first.registers == both.registers
+
+
+def test_hyperloglog_round_trip() -> None:
+    hll = HyperLogLog(10)
+    for value in range(500):
+        hll.add(value)
+    restored = HyperLogLog.from_dict(hll.to_dict())
+    assert restored.p == 10
+    assert restored.count() == hll.count()
+
+
+def test_count_min_never_undercounts() -> None:
+    cms = CountMinSketch(64, 4)
+    for key in range(500):
+        cms.add(key, key % 7 + 1)
+    assert cms.total == sum(key % 7 + 1 for key in range(500))
+    for key in range(500):
+        assert cms.estimate(key) >= key % 7 + 1
+
+
+def test_count_min_is_exact_without_collisions() -> None:
+    cms = CountMinSketch(1024, 4)
+    cms.add("a", 3)
+    cms.add("b")
+    assert cms.estimate("a") == 3
+    assert cms.estimate("b") == 1
+    assert cms.estimate("c") == 0
+
+
+def test_count_min_round_trip() -> None:
+    cms = CountMinSketch(128, 3)
+    cms.add("a", 5)
+    restored = CountMinSketch.from_dict(cms.to_dict())
+    assert (restored.width, restored.depth, restored.total) == (128, 3, 5)
+    assert restored.estimate("a") == 5
+
+
+def test_daily_usage_caps_tracked_keys() -> None:
+    usage = DailyUsage("2024-01-01")
+    for index in range(MAX_TRACKED_KEYS + 10):
+        usage.add(f"command:{index}", index)
+
+    assert len(usage.keys) == MAX_TRACKED_KEYS
+    # untracked keys are still counted
+    assert usage.counts.estimate(f"command:{MAX_TRACKED_KEYS + 5}") >= 1
+    assert usage.users.count() == pytest.approx(MAX_TRACKED_KEYS + 10, rel=0.1)
+
+
+def test_daily_usage_round_trip() -> None:
+    usage = DailyUsage("2024-01-01")
+    usage.add("role:1", 1)
+    usage.add("role:1", 2)
+    restored = DailyUsage.from_dict(usage.to_dict())
+    assert restored.day == "2024-01-01"
+    assert restored.keys["role:1"].count() == 2
+    assert restored.counts.estimate("role:1") == 2
@@ -0,0 +1,34 @@
+import time
+
+import interactions as ipy
+import pytest
+
+import common.utils as utils
+
+
+def test_discord_timestamps() -> None:
+    assert utils.parse_time("<t:1700000000>") == 1700000000
+    assert utils.parse_time(" <t:1700000000:R> ") == 1700000000
+
+
+@pytest.mark.parametrize(
+    ("text", "seconds"),
+    [("30m", 1800), ("1d12h", 129600), ("2w", 1209600), ("1h 30m", 5400)],
+)
+def test_durations(text: str, seconds: int) -> None:
+    assert utils.parse_time(text) == pytest.approx(time.time() + seconds, abs=5)
+    assert utils.parse_time(text, future=False) == pytest.approx(
+        time.time() - seconds, abs=5
+    )
+
+
+@pytest.mark.parametrize("text", ["30", "1700000000"])
+def test_bare_numbers_need_a_unit(text: str) -> None:
+    with pytest.raises(ipy.errors.BadArgument, match="needs a unit"):
+        utils.parse_time(text)
+
+
+@pytest.mark.parametrize("text", ["", "soon", "1x", "1h soon", "<t:abc>"])
+def test_nonsense(text: str) -> None:
+    with pytest.raises(ipy.errors.BadArgument):
+        utils.parse_time(text)